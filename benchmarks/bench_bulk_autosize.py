@@ -0,0 +1,90 @@
+"""
+Compares the cost of building autosized bulk v1 batches for a synthetic EPC upsert payload,
+measuring every record and serializing every batch again as before, against serializing
+every record once and joining the request bodies from the serialized records.
+
+run from the repository root:  python3 benchmarks/bench_bulk_autosize.py [record count]
+"""
+import json,os,sys,time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.cme_data_migration_tool.simple_salesforce_dmt.bulk import SFBulkType
+
+
+class RecordingBulkType(SFBulkType):
+    # keeps the request bodies instead of sending them
+    def __init__(self):
+        self.bodies = []
+
+    def _add_batch(self, job_id, data, operation, encoded=None):
+        self.bodies.append(encoded if encoded is not None else json.dumps(data, allow_nan=False))
+        return {'id': str(len(self.bodies)), 'jobId': job_id}
+
+
+def legacy_add_autosized_batches(bulktype, data, operation, job):
+    # _add_autosized_batches as it was before serializing once
+    record_limit = 10_000
+    char_limit = 10_000_000
+    batches = []
+    last_break = 0
+    record_count, char_count = 0, 0
+    for i, record in enumerate(data):
+        additional_chars = len(json.dumps(record, default=str)) + 2
+        if any([char_count + additional_chars > char_limit, record_count == record_limit]):
+            batches.append(data[last_break:i])
+            last_break = i
+            record_count, char_count = 0, 0
+        char_count += additional_chars
+        record_count += 1
+    if last_break < len(data) - 1:
+        batches.append(data[last_break:])
+    return [bulktype._add_batch(job_id=job, data=i, operation=operation) for i in batches]
+
+
+def build_records(count):
+    # price list entries and products with the json attribute payloads that make epc records large
+    records = []
+    for index in range(count):
+        records.append({
+            'Id': 'a1X' + str(index).zfill(15),
+            'Name': 'Product ' + str(index),
+            'ProductCode': 'PRD-' + str(index),
+            'IsActive': index % 3 != 0,
+            'vlocity_cmt__GlobalKey__c': 'f3c1e6a0-' + str(index).zfill(12),
+            'vlocity_cmt__EffectiveDate__c': '2024-01-01T00:00:00.000+0000',
+            'vlocity_cmt__SellingStartDate__c': '2024-01-01T00:00:00.000+0000',
+            'vlocity_cmt__IsOrderable__c': True,
+            'vlocity_cmt__Type__c': 'Offer' if index % 10 == 0 else 'Product',
+            'vlocity_cmt__Amount__c': index * 1.25,
+            'vlocity_cmt__JSONAttribute__c': json.dumps({'ATT_CAT_' + str(index % 7): [{'attributeuniquecode__c': 'ATT_' + str(attribute), 'value__c': 'value ' + str(index + attribute)} for attribute in range(index % 12)]}),
+            'Description': 'Synthetic catalog record ' + str(index) + ' ' + 'x' * (index % 200)
+        })
+    return records
+
+
+def measure(function, records):
+    bulktype = RecordingBulkType()
+    started = time.perf_counter()
+    function(bulktype, records)
+    return time.perf_counter() - started, bulktype.bodies
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    records = build_records(count)
+
+    legacy_seconds, legacy_bodies = measure(lambda bulktype, data: legacy_add_autosized_batches(bulktype, data, 'upsert', 'Job-1'), records)
+    serialize_once_seconds, bodies = measure(lambda bulktype, data: bulktype._add_autosized_batches(data=data, operation='upsert', job='Job-1'), records)
+
+    # the previous autosizer dropped a last batch of a single record, the bodies are compared up to it
+    if legacy_bodies != bodies[:len(legacy_bodies)] or [record for body in bodies for record in json.loads(body)] != records:
+        raise AssertionError("serialize once batches differ from the previous autosized batches")
+    print("records: {}, batches: {}, payload: {:.1f} MB".format(count, len(bodies), sum(len(body) for body in bodies) / (1024 * 1024)))
+    print("measure and serialize again: {:.3f}s".format(legacy_seconds))
+    print("serialize once: {:.3f}s".format(serialize_once_seconds))
+    print("speedup: {:.2f}x".format(legacy_seconds / serialize_once_seconds))
+
+
+if __name__ == '__main__':
+    main()
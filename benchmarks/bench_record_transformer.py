@@ -0,0 +1,91 @@
+"""
+Compares the per record cost of the precompiled RecordTransformer with the previous
+processqueryrecord implementation on a wide Product2 like record set.
+
+run from the repository root:  python3 benchmarks/bench_record_transformer.py [record count]
+"""
+import os,sys,time
+from collections import OrderedDict
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.cme_data_migration_tool.utils.nsf import nsf
+from src.cme_data_migration_tool.utils.query_utils import QueryUtils
+from src.cme_data_migration_tool.utils.record_transformer import RecordTransformer
+from src.cme_data_migration_tool.dtos.base_dto import BaseDTO
+from src.cme_data_migration_tool.dtos.runtime_dtos.global_results_dto import GlobalResultsDTO
+
+
+def filter_sobject_fields(pair):
+    return pair[0] not in {'attributes'}
+
+
+def legacy_processqueryrecord(objectname, record, orgconfig, referencefield):
+    # processqueryrecord as it was before the record transformer
+    fieldresult = {}
+    referenceresult = {}
+    recordresult = {"fieldresult" : fieldresult}
+    matchingkeyinfomap = GlobalResultsDTO.globalobjectmatchingkeyinfomap.setdefault(objectname, {})
+    if not referencefield:
+        recordresult["referenceresult"] = referenceresult
+    record_dict = dict(filter(filter_sobject_fields, record.items()))
+    for recordfieldname,recordfielddata in record_dict.items():
+        key = nsf.mask(orgconfig, recordfieldname)
+        if isinstance(recordfielddata, OrderedDict):
+            maskedrefobject = nsf.mask(orgconfig, recordfielddata.get("attributes").get("type"))
+            referenceresult[key] = legacy_processqueryrecord(maskedrefobject, recordfielddata, orgconfig, True)
+        else:
+            fieldresult[key] = recordfielddata
+    matchingkeydetails = QueryUtils.generatematchingkeyinfo(objectname, fieldresult)
+    matchingkeyinfomap[matchingkeydetails['matchingkey']] = matchingkeydetails['matchingkeyqueryfieldswithdata']
+    recordresult["matchingkeyinfo"] = matchingkeydetails
+    return recordresult
+
+
+def build_records(orgconfig, count):
+    objectconfig = BaseDTO.get_json_data('./src/cme_data_migration_tool/configurations/object_configurations/product2.json')
+    fieldnames = objectconfig["datafieldstomigrate"] + objectconfig["readonlyfields"] + objectconfig["createablefields"]
+    fieldnames = [nsf.unmask(orgconfig, fieldname) for fieldname in fieldnames]
+    records = []
+    for index in range(count):
+        record = OrderedDict()
+        record["attributes"] = OrderedDict([("type", "Product2"), ("url", "/services/data/v58.0/sobjects/Product2/" + str(index))])
+        for fieldname in fieldnames:
+            record[fieldname] = "value " + str(index)
+        record["id"] = "01t" + str(index).zfill(15)
+        record[orgconfig.namespace + "__globalkey__c"] = "global-key-" + str(index)
+        record[orgconfig.namespace + "__ObjectTypeId__r"] = OrderedDict([
+            ("attributes", OrderedDict([("type", orgconfig.namespace + "__ObjectClass__c")])),
+            (orgconfig.namespace + "__GlobalKey__c", "object-class-" + str(index % 20)),
+            ("Id", "a0B" + str(index % 20).zfill(15))
+        ])
+        records.append(record)
+    return records
+
+
+def measure(processor, records, orgconfig):
+    started = time.perf_counter()
+    results = [processor("product2", record, orgconfig, False) for record in records]
+    return time.perf_counter() - started, results
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    orgconfig = SimpleNamespace(namespace="vlocity_cmt")
+    records = build_records(orgconfig, count)
+
+    legacy_seconds, legacy_results = measure(legacy_processqueryrecord, records, orgconfig)
+    transformer = lambda objectname, record, orgconfig, referencefield: RecordTransformer.getinstance(objectname, orgconfig).transform(record, referencefield)
+    transformer_seconds, transformer_results = measure(transformer, records, orgconfig)
+
+    if legacy_results != transformer_results:
+        raise AssertionError("record transformer output differs from processqueryrecord")
+    print("records: {}, fields per record: {}".format(count, len(records[0])))
+    print("processqueryrecord: {:.3f}s ({:.1f} us/record)".format(legacy_seconds, legacy_seconds / count * 1000000))
+    print("record transformer: {:.3f}s ({:.1f} us/record)".format(transformer_seconds, transformer_seconds / count * 1000000))
+    print("speedup: {:.2f}x".format(legacy_seconds / transformer_seconds))
+
+
+if __name__ == '__main__':
+    main()
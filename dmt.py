@@ -14,9 +14,22 @@ def main():
 
     export_parser.add_argument("--config", help="This flag will include related child records if config is default , single sobject if config value is sobject, if this option is not provided default value will be default", choices=["default", "sobject"], default = "default")
     export_parser.add_argument("--object", help="Specify the object to export currently we support only Product2 or Promotion for config type default, all EPC objects for config type sobject", type=str, default = None, required=True)
-    export_parser.add_argument("--ids", help=" Ids of the object type to export, currently we support only one id for current release", type=lambda arg: arg.split(','), default = None, required=True)
+    export_parser.add_argument("--ids", help="comma separated ids of the object type to export, all ids are exported together in one pass into one import manifest", type=lambda arg: arg.split(','), default = None)
+    export_parser.add_argument("--idsfile", help="path of a file with the ids to export, one or more comma separated ids per line, combined with --ids when both are given", type=str, default = None)
+    export_parser.add_argument("--concurrency", help="maximum number of discovery and export queries run at the same time, defaults to max_concurrency of the source org configuration (4 if not configured)", type=int, default = None)
+    export_parser.add_argument("--exportformat", help="ndjson writes one append-only file per object and export run with an offset index, legacy writes one json file per record", choices=["ndjson", "legacy"], default = "ndjson")
+    export_parser.add_argument("--incremental", help="only fetch and write records changed since the previous export, watermarks and record hashes are kept in results/export_manifest.json", action="store_true", default = False)
+    export_parser.add_argument("--cache", help="path of an on-disk export cache shared across runs, records whose SystemModstamp and queried fields did not change since they were cached are not queried again", type=str, default = None)
+    export_parser.add_argument("--cachesize", help="maximum size of the export cache in MB, least recently used records are evicted above it", type=int, default = 512)
 
     import_parser.add_argument("-f", "--importfile", help="specify the path where import results are required to be stored and path has to be absolute path in your file system", type=str, default = None)
+    import_parser.add_argument("--dmlmode", help="serial loads one batch at a time, parallel partitions records by the partitionfield of the object configuration into batches loaded in parallel and retries UNABLE_TO_LOCK_ROW failures serially", choices=["serial", "parallel"], default = "serial")
+    import_parser.add_argument("--backend", help="bulkv1 loads json batches through bulk api v1, bulkv2 streams csv into bulk api 2.0 upsert jobs with server side batching, --dmlmode applies to bulkv1 only", choices=["bulkv1", "bulkv2"], default = "bulkv1")
+    import_parser.add_argument("--sequence", help="configured imports one object at a time in the order of import_sequence_configuration.json, computed imports the objects in dependency levels sorted from the referencefields of the object configurations and the implicitreferences of import_sequence_configuration.json with the objects of a level upserted concurrently", choices=["configured", "computed"], default = "configured")
+    import_parser.add_argument("--resume", help="run id of an interrupted import to continue, objects and batches completed according to its journal import_results/journal_<run id>.jsonl are skipped, the import file of the run is used when -f is not given", type=str, default = None)
+    import_parser.add_argument("--streaming", help="read, look up and upsert the records of an object in windows of 10000 records so memory is bounded by the window instead of the object size, the peak memory of the process so far is reported after each object", action="store_true")
+    import_parser.add_argument("--skipunchanged", help="look up the current field values of records that already exist in the destination org with their matching keys, only fields whose values differ are sent and records without any difference are not upserted", action="store_true")
+    import_parser.add_argument("--plan", help="dry run that only looks up matching keys and reports per object the new and existing records, bulk jobs, batches, api calls and time the import would take, checked against the remaining limits of the destination org", action="store_true")
 
     args = parser.parse_args()
 
@@ -6,6 +6,7 @@ from dateutil import parser as date_parser
 from datetime import datetime, timezone
 from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 from src.cme_catalog_change_detection_tool.utils.salesforce_client import SalesforceClient
+from src.cme_data_migration_tool.utils.chunk_planner import ChunkPlanner
 
 
 def derive_history_sobject_name(object_api_name: str) -> str:
@@ -37,16 +38,13 @@ def fetch_history_map(
     hist_sobj: str,
     parent_field: str,
     cutoff_iso: str,
-    chunk_size: int = 200,
 ) -> List[Dict[str, Any]]:
     """
     Fetch History records for the given IDs
     """
     entity_rows = []
-    for chunk in engine._chunked_set(sorted(ids), chunk_size):
-        ids_csv = ",".join([f"'{i}'" for i in chunk])
-        soql = engine.build_history_soql(hist_sobj, parent_field, ids_csv, cutoff_iso)
-        rows = sf_client.query(soql)
+    soql_template = engine.build_history_soql(hist_sobj, parent_field, ChunkPlanner.PLACEHOLDER, cutoff_iso)
+    for rows in ChunkPlanner.execute(soql_template, sorted(ids), lambda soql, chunk: sf_client.query(soql)):
         entity_rows.extend(rows)
 
     return entity_rows
@@ -3,10 +3,11 @@ import json
 from dataclasses import dataclass, field
 import re
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Set
+from typing import Any, Dict, List, Optional, Set, Tuple
 import yaml
 from src.cme_catalog_change_detection_tool.utils.salesforce_client import SalesforceClient
 from src.cme_catalog_change_detection_tool.utils.config import AppConfig
+from src.cme_data_migration_tool.utils.chunk_planner import ChunkPlanner
 
 
 
@@ -61,12 +62,14 @@ class SoqlEngine:
         Run single Query definition
         '''
         node = self.query_defs[entity_name]
-        # Run SOQL
-        soqls = self._prepare_soqls(node)
+        # Run SOQL, IN lists are packed by the shared chunk planner
         all_rows: List[Dict[str, Any]] = []
-        for soql in soqls:
-            rows = self.sf_client.query(soql)
-            all_rows.extend(rows)
+        for soql_template, placeholder, dependency_values in self._prepare_queries(node):
+            if placeholder is None:
+                all_rows.extend(self.sf_client.query(soql_template))
+                continue
+            for rows in ChunkPlanner.execute(soql_template, dependency_values, lambda soql, chunk: self.sf_client.query(soql), placeholder=placeholder):
+                all_rows.extend(rows)
 
         # De-dupe rows
         if all_rows:
@@ -88,23 +91,19 @@ class SoqlEngine:
         return all_rows
 
 
-    def _prepare_soqls(self, node: QueryDefinition) -> List[str]:
+    def _prepare_queries(self, node: QueryDefinition) -> List[Tuple[str, Optional[str], List[str]]]:
         '''
-        Prepare SOQLs for the node, chunk it if it is a large query
+        Prepare SOQL templates for the node together with the dependency placeholder and values
+        to pack into it, the chunk planner splits large dependency sets into several queries
         '''
-        soqls: List[str] = []
-        dynamic_where: str = None
+        queries: List[Tuple[str, Optional[str], List[str]]] = []
         if node.where_any_of:
             for entry in node.where_any_of:
                 dependency_set = entry.get("if_set")
                 dependency_set_values = self.catalog_map.get(dependency_set)
                 if dependency_set_values:
-                    for dependency_chunk in (list(self._chunked_set(dependency_set_values, 200))):
-                        where_clause_tmpl = entry.get("where")
-                        in_list = ",".join([f"'{v}'" for v in dependency_chunk])
-                        where_clause = where_clause_tmpl.replace(f"${{{dependency_set}}}", in_list)
-                        full_soql = self._build_soql(node, where_clause)
-                        soqls.append(full_soql)
+                    soql_template = self._build_soql(node, entry.get("where"))
+                    queries.append((soql_template, f"${{{dependency_set}}}", list(dependency_set_values)))
 
         else:
             if node.where:
@@ -118,31 +117,13 @@ class SoqlEngine:
                 for dependency_set in unique_dep_names:
                     dependency_set_values = self.catalog_map.get(dependency_set)
                     if dependency_set_values:
-                        for dependency_chunk in (list(self._chunked_set(dependency_set_values, 200))):
-                            where_clause_tmpl = node.where
-                            in_list = ",".join([f"'{v}'" for v in dependency_chunk])
-                            where_clause = where_clause_tmpl.replace(f"${{{dependency_set}}}", in_list)
-                            full_soql = self._build_soql(node, where_clause)
-                            soqls.append(full_soql)
+                        soql_template = self._build_soql(node, node.where)
+                        queries.append((soql_template, f"${{{dependency_set}}}", list(dependency_set_values)))
             else:
-                soqls.append(node.base)
+                queries.append((node.base, None, []))
 
-        return soqls
+        return queries
 
-
-    def _chunked_set(self, iterable: Iterable[str], size: int) -> Iterable[List[str]]:
-        '''
-        Split an iterable into chunks of a given size
-        '''
-        chunk: List[str] = []
-        for item in iterable:
-            chunk.append(item)
-            if len(chunk) == size:
-                yield chunk
-                chunk = []
-        if chunk:
-            yield chunk
-            
     def _build_soql(self, node: QueryDefinition, where: str) -> str:
         '''
         Base SOQL + Where clause
@@ -2,6 +2,8 @@ from __future__ import annotations
 
 from typing import Any, Dict, List, Optional, Set
 
+from src.cme_data_migration_tool.utils.chunk_planner import ChunkPlanner
+
 
 def build_product_hierarchy(engine: Any, product_id: str) -> List[Dict[str, Any]]:
     """
@@ -68,10 +70,8 @@ def build_product_hierarchy(engine: Any, product_id: str) -> List[Dict[str, Any]
     # Missing Product2 Names
     missing_name_ids = [product_id for product_id in all_products_ids if not all_products_map.get(product_id) or not all_products_map.get(product_id, {}).get("Name")]
     if missing_name_ids:
-        for missing_name_id_chunk in engine._chunked_set(missing_name_ids, 200):
-            ids_csv = ",".join([f"'{i}'" for i in missing_name_id_chunk])
-            soql = f"SELECT Id, Name, CreatedDate, LastModifiedDate FROM Product2 WHERE Id IN ({ids_csv})"
-            rows = engine.sf_client.query(soql)
+        soql_template = "SELECT Id, Name, CreatedDate, LastModifiedDate FROM Product2 WHERE Id IN ({})"
+        for rows in ChunkPlanner.execute(soql_template, missing_name_ids, lambda soql, chunk: engine.sf_client.query(soql)):
             for r in rows:
                 fetched_product_id = r.get("Id")
                 all_products_map[fetched_product_id] = r
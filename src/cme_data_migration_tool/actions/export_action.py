@@ -1,5 +1,5 @@
 # from src.cme_data_migration_tool.services.export_service import ExportService
-import json,os,uuid
+import json,os
 from src.cme_data_migration_tool.actions.base_action import BaseAction
 from prettytable import PrettyTable
 from alive_progress import alive_bar
@@ -7,35 +7,77 @@ from alive_progress import alive_bar
 from src.cme_data_migration_tool.services.export_service import ExportService
 from src.cme_data_migration_tool.dtos.configurations_dtos.org_config_dto import OrgConfigDTO
 from src.cme_data_migration_tool.dtos.runtime_dtos.global_results_dto import GlobalResultsDTO
+from src.cme_data_migration_tool.dtos.runtime_dtos.export_manifest_dto import ExportManifestDTO
 from src.cme_data_migration_tool.utils.nsf import nsf
 from src.cme_data_migration_tool.services.export_bundle import ExportBundle
+from src.cme_data_migration_tool.utils.export_cache import ExportCache
+from src.cme_data_migration_tool.simple_salesforce_dmt.bulk_orchestrator import BulkOrchestrator
 
 
 class ExportAction(BaseAction):
 
     def __init__(self, args):
         self.orgconfig = OrgConfigDTO.getsourceorg()
-        self.ids = args.ids
+        self.ids = self.getrootids(args.ids, args.idsfile)
         self.config = args.config
         self.resultpath = args.resultpath
+        self.concurrency = args.concurrency
+        self.exportformat = args.exportformat
+        self.incremental = args.incremental
+        self.cache = args.cache
+        self.cachesize = args.cachesize
         self.object = nsf.mask(self.orgconfig, args.object)
         
     def execute_action(self):
+        if self.cache is not None:
+            ExportCache.open(self.cache, self.cachesize)
+        try:
+            self.export()
+        finally:
+            ExportCache.close()
+        self.print_summary()
+        return None
+
+    def export(self):
         if self.config == "sobject":
             self.finalexport(self.ids, self.object)
-            self.savefile('./results/'+ 'epc_import_args_'+str(uuid.uuid4())+'.json' , GlobalResultsDTO.globalobjectimportfileinfomap, 'import configurations')
-        elif self.object == "product2" or self.object == "vlocity_cmt__promotion__c":
-            ExportBundle().export(self.object, self.ids)
+            ExportService.save_ndjson_indexes()
+            if self.incremental:
+                ExportManifestDTO.getinstance(self.orgconfig).save()
+            self.savefile('./results/'+ 'epc_import_args_'+GlobalResultsDTO.export_run_id+'.json' , GlobalResultsDTO.globalobjectimportfileinfomap, 'import configurations')
+        elif self.object == "product2" or self.object == "$namespace$__promotion__c":
+            ExportBundle(self.concurrency, self.exportformat, self.incremental).export(self.object, self.ids)
         else:
             print("Invalid Input, please specify a valid object to export")
 
+    def print_summary(self):
         table = PrettyTable()
-        table.field_names = ["Object Name", "Export Record Count"]
-        for globalobjectname in GlobalResultsDTO.globalobjectmap:
-            table.add_row([globalobjectname, GlobalResultsDTO.globalobjectmap.get(globalobjectname)])
+        if self.incremental:
+            table.field_names = ["Object Name", "Export Record Count", "Unchanged Record Count"]
+            for globalobjectname in GlobalResultsDTO.globalobjectmap:
+                table.add_row([globalobjectname, GlobalResultsDTO.globalobjectmap.get(globalobjectname), GlobalResultsDTO.globalunchangedobjectmap.get(globalobjectname, 0)])
+        else:
+            table.field_names = ["Object Name", "Export Record Count"]
+            for globalobjectname in GlobalResultsDTO.globalobjectmap:
+                table.add_row([globalobjectname, GlobalResultsDTO.globalobjectmap.get(globalobjectname)])
         print(table)
+        GlobalResultsDTO.print_api_call_summary()
+        BulkOrchestrator.print_metrics()
         return None
     
+    @staticmethod
+    def getrootids(ids, idsfile):
+        # ids can be given inline, in a file with one or more comma separated ids per line, or both
+        rootids = list(ids) if ids is not None else []
+        if idsfile is not None:
+            with open(idsfile, 'r') as f:
+                for line in f:
+                    rootids.extend(line.strip().split(','))
+        rootids = list(dict.fromkeys(rootid.strip() for rootid in rootids if rootid.strip()))
+        if len(rootids) == 0:
+            raise ValueError("No ids to export, please specify --ids or --idsfile")
+        return rootids
+
     def savefile(self, fpath, result, resultname):
         with alive_bar(1, bar = 'classic', title="saving results of "+resultname) as bar:
             if os.path.isfile(fpath) :
@@ -45,7 +87,6 @@ class ExportAction(BaseAction):
             bar()
     
     def finalexport(self, objectids, objname):
-        for i in range(0, len(objectids), 200):
-            objectids_to_export_chunk = objectids[i:i + 200]
-            exportservice = ExportService(True, objname, objname, 'id', objectids_to_export_chunk)
-            exportservice.export()
\ No newline at end of file
+        # ids are packed into as few queries as the soql and url limits allow by the query chunk planner
+        exportservice = ExportService(True, objname, objname, 'id', objectids, self.exportformat, self.incremental)
+        exportservice.export()
\ No newline at end of file
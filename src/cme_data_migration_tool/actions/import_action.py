@@ -2,13 +2,25 @@ import argparse,json,os
 from src.cme_data_migration_tool.actions.base_action import BaseAction
 from src.cme_data_migration_tool.dtos.configurations_dtos.org_config_dto import OrgConfigDTO
 from src.cme_data_migration_tool.services.import_service import ImportService
+from src.cme_data_migration_tool.utils.import_journal import ImportJournal
 
 class ImportAction(BaseAction):
 
     def __init__(self, args):
         self.orgconfig = OrgConfigDTO.getdestinationorg()
-        self.importfile = args.importfile
+        self.plan = args.plan
+        # a plan only reads the journal of the run it plans to resume, it does not start a run of its own
+        self.journal = ImportJournal.start(args.importfile, args.resume) if not self.plan or args.resume is not None else None
+        self.importfile = args.importfile if args.importfile is not None or self.journal is None else self.journal.importfile
+        self.dmlmode = args.dmlmode
+        self.backend = args.backend
+        self.sequence = args.sequence
+        self.streaming = args.streaming
+        self.skipunchanged = args.skipunchanged
 
     def execute_action(self):
-        imprortservice = ImportService(False, self.importfile)
-        imprortservice.import_data()
\ No newline at end of file
+        imprortservice = ImportService(False, self.importfile, self.dmlmode, self.backend, self.sequence, self.journal, self.streaming, self.skipunchanged)
+        if self.plan:
+            imprortservice.plan_import()
+        else:
+            imprortservice.import_data()
\ No newline at end of file
@@ -41,6 +41,13 @@ class BaseDTO:
             return None
         return cls(**data)
         
+    @classmethod
+    def get_ndjson_data(cls, ndjson_path):
+        with open(ndjson_path, 'r') as file:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
     @classmethod
     def get_json_data(cls, config_path):
         try:
@@ -1,4 +1,5 @@
 from src.cme_data_migration_tool.dtos.base_dto import BaseDTO
+from src.cme_data_migration_tool.dtos.configurations_dtos.migration_obj_template_dto import MigrationObjTemplateDTO
 
 class ImportSequenceDTO(BaseDTO):
 
@@ -8,4 +9,70 @@ class ImportSequenceDTO(BaseDTO):
 
     def __init__(self, **kwargs):
         self.import_sequence = kwargs['sequence']
-        
\ No newline at end of file
+        # object -> objects it references through fields that are not referencefields of its object configuration,
+        # e.g. the $namespace$__objectid__c of attribute assignments pointing at products or object classes
+        self.implicitreferences = kwargs.get('implicitreferences', {})
+
+    def getreferencedobjects(self, sequenceobject):
+        """
+        Objects the object references, from the referencefields of its object configuration followed by its implicit references.
+        """
+        objectconfig = MigrationObjTemplateDTO.getdestinationinstance(sequenceobject)
+        referencedobjects = [referencefield.fieldobject for referencefield in objectconfig.referencefields]
+        referencedobjects.extend(self.implicitreferences.get(sequenceobject, []))
+        return list(dict.fromkeys(referencedobjects))
+
+    def getlevels(self, objects, sequence="configured"):
+        """
+        Import levels of the given objects of the import sequence. Configured puts every object on a level of its own
+        in the order of the import sequence configuration. Computed sorts the objects topologically by the referencefields
+        of their object configurations and the implicitreferences of the import sequence configuration, the objects of a
+        level only reference objects of earlier levels and are upserted concurrently, listed in the configured order.
+        References of an object to itself do not order anything, a reference cycle is broken at the cycle object that
+        comes first in the import sequence configuration and reported.
+        """
+        objects = [sequenceobject for sequenceobject in self.import_sequence if sequenceobject in objects]
+        if sequence == "configured":
+            return [[sequenceobject] for sequenceobject in objects]
+
+        parents = {}
+        for sequenceobject in objects:
+            referencedobjects = self.getreferencedobjects(sequenceobject)
+            if sequenceobject in referencedobjects:
+                print("import sequence self reference: {} references itself".format(sequenceobject))
+            implicitparents = [parentobject for parentobject in self.implicitreferences.get(sequenceobject, []) if parentobject in objects]
+            if len(implicitparents) > 0:
+                print("import sequence implicit reference: {} follows {}".format(sequenceobject, ", ".join(implicitparents)))
+            parents[sequenceobject] = set(parentobject for parentobject in referencedobjects if parentobject != sequenceobject and parentobject in objects)
+
+        levels = []
+        remaining = list(objects)
+        placed = set()
+        while len(remaining) > 0:
+            level = [sequenceobject for sequenceobject in remaining if parents[sequenceobject] <= placed]
+            if len(level) == 0:
+                cycleobject = next(sequenceobject for sequenceobject in remaining if ImportSequenceDTO.isincycle(sequenceobject, parents, placed))
+                print("import sequence cycle: {} references {}, it is imported before them".format(cycleobject, ", ".join(sorted(parents[cycleobject] - placed))))
+                level = [cycleobject]
+            levels.append(level)
+            placed.update(level)
+            remaining = [sequenceobject for sequenceobject in remaining if sequenceobject not in placed]
+        return levels
+
+    @staticmethod
+    def isincycle(sequenceobject, parents, placed):
+        visited = set()
+        pending = list(parents[sequenceobject] - placed)
+        while len(pending) > 0:
+            parentobject = pending.pop()
+            if parentobject == sequenceobject:
+                return True
+            if parentobject not in visited:
+                visited.add(parentobject)
+                pending.extend(parents[parentobject] - placed)
+        return False
+
+    @staticmethod
+    def print_levels(levels):
+        for index, level in enumerate(levels):
+            print("import level {}: {}".format(index + 1, ", ".join(level)))
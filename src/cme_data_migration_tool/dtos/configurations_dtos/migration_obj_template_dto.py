@@ -23,6 +23,8 @@ class MigrationObjTemplateDTO(BaseDTO):
         self.createablefields = kwargs.get("createablefields")
         self.referencefieldtoobject = {}
         self.referencetofieldmapping = kwargs.get("referencetofieldmapping")
+        # parent reference field parallel dml keeps the children of one parent together on, e.g. the parent product of child items
+        self.partitionfield = kwargs.get("partitionfield", None)
         self.referencefieldtoexportability = {}
         config_referencefields = kwargs.get("referencefields")
         
@@ -55,8 +57,18 @@ class MigrationObjTemplateDTO(BaseDTO):
         fields_to_query = ",".join(field for field in masked_fields_to_query)
         return fields_to_query
     
-    def getmatchingfieldsstring(self, orgconfig):
+    def getmatchingfieldsstring(self, orgconfig, additionalfields=None):
         matchingkeyfields = MatchingKeysDTO.getinstance().matching_keys[self.objectname].copy()
         matchingkeyfields.append('id')
+        if additionalfields is not None:
+            matchingkeyfields.extend(field for field in additionalfields if field not in matchingkeyfields)
         queryfields = ",".join(matchingkeyfields)
-        return nsf.unmask(orgconfig, queryfields)
\ No newline at end of file
+        return nsf.unmask(orgconfig, queryfields)
+
+    def getpartitionreference(self):
+        # records carry their parents under the relationship name of the reference field
+        return nsf.robject(self.partitionfield) if self.partitionfield is not None else None
+
+    def getupdatablefields(self):
+        # fields an upsert sends for a record that already exists in the destination org
+        return [field for field in self.datafieldstomigrate if field != 'id' and field not in self.readonlyfields and field not in self.createablefields]
\ No newline at end of file
@@ -1,4 +1,5 @@
 from src.cme_data_migration_tool.simple_salesforce_dmt.api import Salesforce
+from src.cme_data_migration_tool.simple_salesforce_dmt.bulk_orchestrator import BulkOrchestrator, MAX_OPEN_JOBS, MAX_IN_FLIGHT_BATCHES
 from src.cme_data_migration_tool.dtos.base_dto import BaseDTO
 
 class OrgConfigDTO(BaseDTO):
@@ -26,4 +27,9 @@ class OrgConfigDTO(BaseDTO):
         self.namespace = kwargs.get("namespace")
         self.instance_url = kwargs.get("instance_url")
         self.nsp = self.namespace + "__"
+        self.max_concurrency = int(kwargs.get("max_concurrency", 4))
+        self.bulk_query_threshold = int(kwargs.get("bulk_query_threshold", 20000))
+        self.bulk_max_open_jobs = int(kwargs.get("bulk_max_open_jobs", MAX_OPEN_JOBS))
+        self.bulk_max_in_flight_batches = int(kwargs.get("bulk_max_in_flight_batches", MAX_IN_FLIGHT_BATCHES))
         self.org_connector = Salesforce(username=self.username, password=self.password, consumer_key=self.consumer_key, consumer_secret=self.consumer_secret, instance_url = self.instance_url)
+        BulkOrchestrator.configure(self.org_connector.bulk_url, self.bulk_max_open_jobs, self.bulk_max_in_flight_batches)
@@ -0,0 +1,79 @@
+import hashlib,json,os
+from datetime import datetime, timedelta, timezone
+from src.cme_data_migration_tool.dtos.base_dto import BaseDTO
+
+class ExportManifestDTO(BaseDTO):
+    """
+    Per source org and object watermarks and record hashes of the previous exports, used by incremental
+    exports to fetch and write only changed records. The watermark of an object is the start of the last
+    run that exported it, taken from the org clock before any query and moved back by watermark_margin,
+    so records modified while the run was querying or in transactions that committed late are fetched again.
+    """
+    instance = None
+    manifest_path = './results/export_manifest.json'
+    # fields that change without the record content changing, left out of the record hash
+    volatile_fields = {'systemmodstamp', 'lastmodifieddate', 'lastvieweddate', 'lastreferenceddate'}
+    watermark_margin = timedelta(minutes=15)
+
+    @staticmethod
+    def getinstance(orgconfig):
+        if ExportManifestDTO.instance is None:
+            data = BaseDTO.get_json_data(ExportManifestDTO.manifest_path)
+            ExportManifestDTO.instance = ExportManifestDTO(orgconfig.username, **(data if data is not None else {}))
+        return ExportManifestDTO.instance
+
+    def __init__(self, orgkey, **kwargs):
+        self.orgkey = orgkey
+        self.orgs = kwargs.get("orgs", {})
+        self.objects = self.orgs.setdefault(orgkey, {})
+        self.runwatermark = None
+
+    def startrun(self, runstart):
+        """
+        Sets the watermark saved for the objects exported in this run from the org time before its first query.
+        """
+        self.runwatermark = (runstart.astimezone(timezone.utc) - ExportManifestDTO.watermark_margin).strftime("%Y-%m-%dT%H:%M:%S.000+0000")
+
+    def getobjectmanifest(self, objectname):
+        return self.objects.setdefault(objectname, {'watermark' : None, 'hashes' : {}})
+
+    def splitids(self, objectname, objectids):
+        hashes = self.getobjectmanifest(objectname)['hashes']
+        knownids = [objectid for objectid in objectids if objectid in hashes]
+        newids = [objectid for objectid in objectids if objectid not in hashes]
+        return knownids, newids
+
+    def getmodstampcondition(self, objectname):
+        watermark = self.getobjectmanifest(objectname)['watermark']
+        if watermark is None:
+            return None
+        # salesforce returns 2024-01-31T10:15:30.000+0000, soql datetime literals need 2024-01-31T10:15:30Z
+        modstamp = datetime.strptime(watermark, "%Y-%m-%dT%H:%M:%S.%f%z").astimezone(timezone.utc)
+        return "systemmodstamp >= " + modstamp.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    @staticmethod
+    def hashrecord(recordresult):
+        fieldresult = {key : value for key, value in recordresult["fieldresult"].items() if key not in ExportManifestDTO.volatile_fields}
+        content = {'fieldresult' : fieldresult, 'referenceresult' : recordresult.get("referenceresult", {})}
+        return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+    def haschanged(self, objectname, recordresult):
+        """
+        Returns True when the record is new or its content differs from the previous export and
+        records its hash and the run watermark of the object for the next run.
+        """
+        objectmanifest = self.getobjectmanifest(objectname)
+        fieldresult = recordresult["fieldresult"]
+        recordhash = ExportManifestDTO.hashrecord(recordresult)
+        # the stamps of fetched records are not a watermark, a record fetched later can carry a stamp above
+        # the modification of a record fetched earlier in the run
+        if self.runwatermark is not None:
+            objectmanifest['watermark'] = self.runwatermark
+        changed = objectmanifest['hashes'].get(fieldresult["id"], None) != recordhash
+        objectmanifest['hashes'][fieldresult["id"]] = recordhash
+        return changed
+
+    def save(self):
+        os.makedirs(os.path.dirname(ExportManifestDTO.manifest_path), exist_ok=True)
+        with open(ExportManifestDTO.manifest_path, 'w') as f:
+            json.dump({'orgs' : self.orgs}, f)
@@ -1,6 +1,8 @@
+import threading,uuid
 from collections import OrderedDict
 
 class GlobalResultsDTO():
+    lock = threading.RLock()
     globalids = set()
     globalobjectmap = {}
     globalobjectidsmap = {}
@@ -10,7 +12,18 @@ class GlobalResultsDTO():
     existing_record_count = {}
     new_record_count = {}
     globalobjectimportfileinfomap = {}
+    globalndjsonindexmap = {}
+    globalndjsonlockmap = {}
+    globalunchangedobjectmap = {}
+    query_api_calls = 0
+    saved_api_calls = 0
+    # names the files of one export run, an older run's manifest keeps pointing at the files it wrote
+    export_run_id = uuid.uuid4().hex
     
+    @staticmethod
+    def print_api_call_summary():
+        print("query api calls made: {}, api calls saved by skipping count queries: {}".format(GlobalResultsDTO.query_api_calls, GlobalResultsDTO.saved_api_calls))
+
     @staticmethod
     def get_import_sequence():
         return {'object_import_sequence' : GlobalResultsDTO.file_import_sequence, 'file_import_sequence' : GlobalResultsDTO.file_import_sequence}
@@ -0,0 +1,46 @@
+import json,os
+from src.cme_data_migration_tool.dtos.base_dto import BaseDTO
+
+class ImportThroughputDTO(BaseDTO):
+    """
+    Records upserted and seconds spent upserting them per destination org, object and backend over the previous
+    imports, used by import plans to estimate how long upserts will take.
+    """
+    instance = None
+    throughput_path = './import_results/import_throughput.json'
+    # records per second assumed for objects that were never imported with the backend
+    default_throughput = 100.0
+
+    @staticmethod
+    def getinstance(orgconfig):
+        if ImportThroughputDTO.instance is None:
+            data = BaseDTO.get_json_data(ImportThroughputDTO.throughput_path)
+            ImportThroughputDTO.instance = ImportThroughputDTO(orgconfig.username, **(data if data is not None else {}))
+        return ImportThroughputDTO.instance
+
+    def __init__(self, orgkey, **kwargs):
+        self.orgkey = orgkey
+        self.orgs = kwargs.get("orgs", {})
+        self.objects = self.orgs.setdefault(orgkey, {})
+
+    def record(self, objectname, backend, records, seconds):
+        if records == 0 or seconds <= 0:
+            return None
+        history = self.objects.setdefault(objectname, {}).setdefault(backend, {'records' : 0, 'seconds' : 0.0})
+        history['records'] += records
+        history['seconds'] += seconds
+        return None
+
+    def getthroughput(self, objectname, backend):
+        """
+        Returns the records per second of the object with the backend and whether they come from earlier imports.
+        """
+        history = self.objects.get(objectname, {}).get(backend, None)
+        if history is None or history['seconds'] <= 0:
+            return ImportThroughputDTO.default_throughput, False
+        return history['records'] / history['seconds'], True
+
+    def save(self):
+        os.makedirs(os.path.dirname(ImportThroughputDTO.throughput_path), exist_ok=True)
+        with open(ImportThroughputDTO.throughput_path, 'w') as f:
+            json.dump({'orgs' : self.orgs}, f)
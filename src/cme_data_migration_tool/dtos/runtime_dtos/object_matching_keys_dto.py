@@ -1,3 +1,4 @@
+import hashlib,json
 from src.cme_data_migration_tool.simple_salesforce_dmt.api import Salesforce
 from src.cme_data_migration_tool.dtos.base_dto import BaseDTO
 from src.cme_data_migration_tool.utils.query_utils import QueryUtils
@@ -6,12 +7,18 @@ from src.cme_data_migration_tool.utils.nsf import nsf
 
 class ObjectMatchingKeyDTO(BaseDTO):
 
-    def __init__(self, orgconfig, objectconfig, matchingkeys):
+    def __init__(self, orgconfig, objectconfig, matchingkeys, comparefields=None):
+        """
+        With comparefields the current values of these fields are fetched along with the ids, matching_key_hashes
+        keeps a hash of every value per matching key to tell unchanged fields from changed ones.
+        """
         self.matching_keys = matchingkeys
         self.objectconfig = objectconfig
         self.orgconfig = orgconfig
+        self.comparefields = comparefields
         self.matching_key_results = {}
-        QueryUtils.query_by_matching_keys(self.objectconfig, self.orgconfig, list(self.matching_keys), self.matching_key_pecord_processor)
+        self.matching_key_hashes = {}
+        QueryUtils.query_by_matching_keys(self.objectconfig, self.orgconfig, list(self.matching_keys), self.matching_key_pecord_processor, comparefields)
 
     def matching_key_pecord_processor(self, objectname, record, orgconfig, referencefield):
         results = {}
@@ -24,4 +31,15 @@ class ObjectMatchingKeyDTO(BaseDTO):
                 results[key] = value
         matchingkeymap = QueryUtils.generatematchingkeyinfo(self.objectconfig.objectname, results)    
         self.matching_key_results[matchingkeymap['matchingkey']] = results['id']
+        if self.comparefields is not None:
+            self.matching_key_hashes[matchingkeymap['matchingkey']] = {field: ObjectMatchingKeyDTO.fieldhash(results.get(field, None)) for field in self.comparefields}
         return None
+
+    @staticmethod
+    def fieldhash(value):
+        # exports and lookups agree on json types except numbers, 1 and 1.0 or an empty string and null are the same value
+        if value == '':
+            value = None
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = float(value)
+        return hashlib.blake2b(json.dumps(value, sort_keys=True).encode('utf-8'), digest_size=8).digest()
@@ -10,9 +10,16 @@ from src.cme_data_migration_tool.utils.nsf import nsf
 from src.cme_data_migration_tool.dtos.runtime_dtos.global_results_dto import GlobalResultsDTO
 
 class ObjectResultsDTO(BaseDTO):
+    # records of an object read, classified and upserted together in streaming mode
+    STREAM_WINDOW_SIZE = 10000
 
     @staticmethod
-    def getinstance(results_config, object):
+    def getinstance(results_config, object, completedkeys=None, skipunchanged=False):
+        """
+        completedkeys are the matching keys of records already upserted by an earlier attempt of the import,
+        these records are left out before their matching keys are looked up in the destination org. With
+        skipunchanged the current values of existing records are looked up too and only changed fields are sent.
+        """
         sobject_results = results_config.import_configs.get(object, None)
         results_instance = None
        
@@ -20,30 +27,77 @@ class ObjectResultsDTO(BaseDTO):
             objectconfig = MigrationObjTemplateDTO.getdestinationinstance(object)
             results = []
             matchingkeyinfolist = []
-            for sobject_result in sobject_results:
-                sobject_result_item = BaseDTO.get_json_data('./results/'+object+'/'+sobject_result)
+            for sobject_result_item, matchingkeyinfofielddetails in ObjectResultsDTO.get_matching_key_items(object, sobject_results, completedkeys):
                 results.append(sobject_result_item)
-                matchingkeyinfo = sobject_result_item.get("matchingkeyinfo", None)
-                if(matchingkeyinfo is None):
-                    raise Exception("Invalid Matching Key Info")
-                matchingkeyinfofielddetails = matchingkeyinfo.get("matchingkeyqueryfieldswithdata", None)
-                if(matchingkeyinfofielddetails is None):
-                    raise Exception("Invalid Matching Key Info")
                 matchingkeyinfolist.append(matchingkeyinfofielddetails)    
             print('pre validation')
-            matchingkeyresults = ObjectMatchingKeyDTO(OrgConfigDTO.getdestinationorg(), objectconfig, matchingkeyinfolist)
+            matchingkeyresults = ObjectMatchingKeyDTO(OrgConfigDTO.getdestinationorg(), objectconfig, matchingkeyinfolist, objectconfig.getupdatablefields() if skipunchanged else None)
             print('validation')
             results_instance = ObjectResultsDTO(objectconfig, matchingkeyresults, results)
         return results_instance
 
+    @staticmethod
+    def getwindows(results_config, object, completedkeys=None, windowsize=None, skipunchanged=False):
+        """
+        Streaming counterpart of getinstance, yields one ObjectResultsDTO per window of windowsize records read
+        from the result files, so only one window of records is held in memory at a time.
+        """
+        sobject_results = results_config.import_configs.get(object, None)
+        if sobject_results is None:
+            return None
+        windowsize = windowsize or ObjectResultsDTO.STREAM_WINDOW_SIZE
+        objectconfig = MigrationObjTemplateDTO.getdestinationinstance(object)
+        comparefields = objectconfig.getupdatablefields() if skipunchanged else None
+        results = []
+        matchingkeyinfolist = []
+        for sobject_result_item, matchingkeyinfofielddetails in ObjectResultsDTO.get_matching_key_items(object, sobject_results, completedkeys):
+            results.append(sobject_result_item)
+            matchingkeyinfolist.append(matchingkeyinfofielddetails)
+            if len(results) >= windowsize:
+                yield ObjectResultsDTO(objectconfig, ObjectMatchingKeyDTO(OrgConfigDTO.getdestinationorg(), objectconfig, matchingkeyinfolist, comparefields), results)
+                results = []
+                matchingkeyinfolist = []
+        if len(results) > 0:
+            yield ObjectResultsDTO(objectconfig, ObjectMatchingKeyDTO(OrgConfigDTO.getdestinationorg(), objectconfig, matchingkeyinfolist, comparefields), results)
+
+    @staticmethod
+    def get_matching_key_items(object, sobject_results, completedkeys):
+        for sobject_result_item in ObjectResultsDTO.get_result_items(object, sobject_results):
+            matchingkeyinfo = sobject_result_item.get("matchingkeyinfo", None)
+            if(matchingkeyinfo is None):
+                raise Exception("Invalid Matching Key Info")
+            if completedkeys is not None and matchingkeyinfo.get("matchingkey", None) in completedkeys:
+                continue
+            matchingkeyinfofielddetails = matchingkeyinfo.get("matchingkeyqueryfieldswithdata", None)
+            if(matchingkeyinfofielddetails is None):
+                raise Exception("Invalid Matching Key Info")
+            yield sobject_result_item, matchingkeyinfofielddetails
+
+    @staticmethod
+    def get_result_items(object, sobject_results):
+        for sobject_result in sobject_results:
+            if sobject_result.endswith('.ndjson'):
+                yield from BaseDTO.get_ndjson_data('./results/'+object+'/'+sobject_result)
+            else:
+                # legacy export layout, one json file per record
+                yield BaseDTO.get_json_data('./results/'+object+'/'+sobject_result)
+
     def __init__(self, objectconfig, matchingkeyresults, results):
         self.objectconfig = objectconfig
         self.orgconfig = OrgConfigDTO.getdestinationorg()
         self.object_matching_key_results = matchingkeyresults
         self.existing_records = []
         self.new_records = []
+        # matching keys of the referenced parent records, aligned with existing_records and new_records
+        self.existing_parent_keys = []
+        self.new_parent_keys = []
+        # matching keys of the records, aligned with existing_records and new_records
+        self.existing_matching_keys = []
+        self.new_matching_keys = []
         self.existing_record_count = 0
         self.new_record_count = 0
+        # existing records whose fields are all unchanged in the destination org, they are not upserted
+        self.unchanged_record_count = 0
         self.update_results(results)
 
     def update_results(self, results):
@@ -52,12 +106,19 @@ class ObjectResultsDTO(BaseDTO):
             matchingkey = object_info['matchingkeyinfo']['matchingkey']
             unmasked_result = {}
             existing = False
+            destinationhashes = None
+            parent_keys = {referencefield: referenceresult['matchingkeyinfo']['matchingkey'] for referencefield, referenceresult in object_info.get('referenceresult', {}).items()}
             if matchingkey in self.object_matching_key_results.matching_key_results:
                 unmasked_result["id"] = self.object_matching_key_results.matching_key_results[matchingkey]
+                destinationhashes = self.object_matching_key_results.matching_key_hashes.get(matchingkey, None)
                 self.existing_records.append(unmasked_result)
+                self.existing_parent_keys.append(parent_keys)
+                self.existing_matching_keys.append(matchingkey)
                 existing = True
             else:
                 self.new_records.append(unmasked_result)
+                self.new_parent_keys.append(parent_keys)
+                self.new_matching_keys.append(matchingkey)
             
             for field,value in fieldresult.items():
                 if(field == "id"):
@@ -66,13 +127,33 @@ class ObjectResultsDTO(BaseDTO):
                 if(referencefield != None):
                     field = referencefield
                 if existing and (field not in self.objectconfig.readonlyfields) and (field not in self.objectconfig.createablefields):
+                    if destinationhashes is not None and field in destinationhashes and destinationhashes[field] == ObjectMatchingKeyDTO.fieldhash(value):
+                        continue
                     unmasked_result[nsf.unmask(self.orgconfig, field)] = value
                 elif (not existing) and (field not in self.objectconfig.readonlyfields):
                     unmasked_result[nsf.unmask(self.orgconfig, field)] = value
+
+            if destinationhashes is not None and len(unmasked_result) == 1:
+                self.existing_records.pop()
+                self.existing_parent_keys.pop()
+                self.existing_matching_keys.pop()
+                self.unchanged_record_count += 1
         
         self.existing_record_count = len(self.existing_records)
         self.new_record_count = len(self.new_records)
 
+    def get_parent_keys(self):
+        parent_keys = []
+        parent_keys.extend(self.existing_parent_keys)
+        parent_keys.extend(self.new_parent_keys)
+        return parent_keys
+
+    def get_matching_keys(self):
+        matching_keys = []
+        matching_keys.extend(self.existing_matching_keys)
+        matching_keys.extend(self.new_matching_keys)
+        return matching_keys
+
     def get_results(self):
         results = []
         results.extend(self.existing_records)
@@ -1,16 +1,29 @@
-import json,os,uuid
+import concurrent.futures,json,os
+from functools import partial
 from alive_progress import alive_bar
 from src.cme_data_migration_tool.dtos.configurations_dtos.org_config_dto import OrgConfigDTO
 from src.cme_data_migration_tool.dtos.runtime_dtos.global_results_dto import GlobalResultsDTO
+from src.cme_data_migration_tool.dtos.runtime_dtos.export_manifest_dto import ExportManifestDTO
 from src.cme_data_migration_tool.services.export_service import ExportService
+from src.cme_data_migration_tool.utils.query_utils import QueryUtils
+from src.cme_data_migration_tool.utils.chunk_planner import ChunkPlanner
+from src.cme_data_migration_tool.utils.task_scheduler import TaskScheduler
 
 class ExportBundle():
-    def __init__(self):
+    # frontiers up to this many products are queried through rest, larger ones through bulk
+    REST_FRONTIER_LIMIT = 2000
+
+    def __init__(self, concurrency=None, exportformat="ndjson", incremental=False):
         self.orgconfig = OrgConfigDTO.getsourceorg()
+        self.exportformat = exportformat
+        self.incremental = incremental
+        self.concurrency = concurrency if concurrency is not None else self.orgconfig.max_concurrency
         self.finalobjectclassids = set()
         self.finalrecorditypeds = set()
-        self.finalpciids = []
-        self.finalprodids = []
+        self.finalpciids = set()
+        self.finalprodids = set()
+        self.finalpromotionids = set()
+        self.finalpromotionitemids = set()
         self.finalattrassignids = set()
         self.finalattrids = set()
         self.finalattrcatids = set()
@@ -37,23 +50,46 @@ class ExportBundle():
 
     def finalexport(self, objectids, objname):
         if len(objectids) > 0:
-            for i in range(0, len(objectids), 200):
-                objectids_to_export_chunk = objectids[i:i + 200]
-                exportservice = ExportService(True, objname, objname, 'id', objectids_to_export_chunk)
-                exportservice.export()
+            exportservice = ExportService(True, objname, objname, 'id', objectids, self.exportformat, self.incremental)
+            exportservice.export()
+
+    def bulkquery(self, objectname, querytemplate, objectids):
+        # bulk queries are posted in the request body, only the soql character limit applies to the packed id list
+        for fetch_results in ChunkPlanner.execute(querytemplate, list(objectids), lambda querystring, chunk: self.orgconfig.org_connector.bulk.__getattr__(objectname).query(querystring, lazy_operation=True), url_limit=0):
+            yield from fetch_results
+
+    def frontierquery(self, objectname, querytemplate, objectids):
+        """
+        Query used for every level of the hierarchy traversal. Small frontiers go through rest,
+        a bulk job has a start up floor of several seconds, large frontiers through bulk. The
+        planned chunks of a frontier are queried in parallel, records are returned as one list.
+        """
+        objectids = list(objectids)
+        if len(objectids) > ExportBundle.REST_FRONTIER_LIMIT:
+            executor = lambda querystring, chunk: [result for list_results in self.orgconfig.org_connector.bulk.__getattr__(objectname).query(querystring, lazy_operation=True) for result in list_results]
+            chunks = ChunkPlanner.plan(querytemplate, objectids, url_limit=0)
+            plan = lambda chunk: ChunkPlanner.execute(querytemplate, chunk, executor, url_limit=0)
+        else:
+            executor = lambda querystring, chunk: self.orgconfig.org_connector.query_all(querystring)['records']
+            chunks = ChunkPlanner.plan(querytemplate, objectids)
+            plan = lambda chunk: ChunkPlanner.execute(querytemplate, chunk, executor)
+        records = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(self.concurrency, len(chunks)))) as pool:
+            for chunk_results in pool.map(plan, chunks):
+                for results in chunk_results:
+                    records.extend(results)
+        return records
 
     def getallproductidsinhierarchy(self, productids):
-        if len(productids) == 0:
-            return None
-        product_ids = []
-        
-        objectidsstring =  ",".join("'" + objectid + "'" for objectid in productids)
-        querystring = "SELECT Id, vlocity_cmt__ParentProductId__c, vlocity_cmt__ParentProductId__r.vlocity_cmt__ObjectTypeId__c, vlocity_cmt__ParentProductId__r.RecordTypeId, vlocity_cmt__ChildProductId__c, vlocity_cmt__ChildProductId__r.vlocity_cmt__GlobalKey__c FROM vlocity_cmt__ProductChildItem__c WHERE vlocity_cmt__ParentProductId__c in ({})".format(objectidsstring)
-        # data = orgconfig.org_connector.query_all_iter(querystring)
-        fetch_results = self.orgconfig.org_connector.bulk.__getattr__('vlocity_cmt__ProductChildItem__c').query(querystring, lazy_operation=True)
-        for list_results in fetch_results:
-            for result in list_results :
-                self.finalpciids.append(result['Id'])
+        # level by level traversal, each level queries the child items of the products first reached on the previous level
+        querystring = "SELECT Id, vlocity_cmt__ParentProductId__c, vlocity_cmt__ParentProductId__r.vlocity_cmt__ObjectTypeId__c, vlocity_cmt__ParentProductId__r.RecordTypeId, vlocity_cmt__ChildProductId__c, vlocity_cmt__ChildProductId__r.vlocity_cmt__GlobalKey__c FROM vlocity_cmt__ProductChildItem__c WHERE vlocity_cmt__ParentProductId__c in ({})"
+        frontier = set(productids)
+        level = 0
+        while len(frontier) > 0:
+            level += 1
+            product_ids = set()
+            for result in self.frontierquery('vlocity_cmt__ProductChildItem__c', querystring, frontier):
+                self.finalpciids.add(result['Id'])
                 parent_product = result['vlocity_cmt__ParentProductId__r']
                 if parent_product != None:
                     recordtypeid = parent_product['RecordTypeId']
@@ -61,25 +97,37 @@ class ExportBundle():
                     self.finalobjectclassids.add(objectclassid) if objectclassid is not None else None
                     self.finalrecorditypeds.add(recordtypeid) if recordtypeid is not None else None
                 if result['vlocity_cmt__ChildProductId__c'] != None:
-                    product_ids.append(result['vlocity_cmt__ChildProductId__c'])
+                    product_ids.add(result['vlocity_cmt__ChildProductId__c'])
 
-        product_ids = list(set(product_ids))
-        self.finalprodids.extend(product_ids)
-
-        if(len(product_ids) > 0):
-            self.getallproductidsinhierarchy(product_ids)
+            # children shared between roots or reached through several parents, and cyclic child items, are only traversed once
+            frontier = product_ids - self.finalprodids
+            self.finalprodids.update(frontier)
+            print("hierarchy level {}: {} new products".format(level, len(frontier)))
         return None
 
+    def getallpromotionproducts(self, promotionids):
+        print('prepping data to export for promotions, promotion items, please wait while we start exporting , this may take few seconds')
+        product_ids = set()
+        querystring = "SELECT Id, vlocity_cmt__ProductId__c, vlocity_cmt__OfferId__c, vlocity_cmt__ContextProductId__c FROM vlocity_cmt__PromotionItem__c WHERE vlocity_cmt__PromotionId__c in ({})"
+        fetch_results = self.bulkquery('vlocity_cmt__PromotionItem__c', querystring, promotionids)
+        for list_results in fetch_results:
+            for result in list_results :
+                if result['Id'] != None:
+                    self.finalpromotionitemids.add(result['Id'])
+                for productfield in ['vlocity_cmt__ProductId__c', 'vlocity_cmt__OfferId__c', 'vlocity_cmt__ContextProductId__c']:
+                    if result[productfield] != None:
+                        product_ids.add(result[productfield])
+        return product_ids
+
     def getallattributeassignments(self):
+        print('prepping data to export for attribute assignments, attribtues, categories, please wait while we start exporting , this may take few seconds')
         object_to_query = []
         object_to_query.extend(self.finalprodids)
         object_to_query.extend(self.finalobjectclassids)
         if len(object_to_query) == 0:
             return None
-        objectidsstring =  ",".join("'" + objectid + "'" for objectid in object_to_query)
-        querystring = "SELECT Id,vlocity_cmt__AttributeCategoryId__c,vlocity_cmt__AttributeId__c FROM vlocity_cmt__AttributeAssignment__c WHERE vlocity_cmt__ObjectId__c in ({})".format(objectidsstring)
-        # data = orgconfig.org_connector.query_all_iter(querystring)
-        fetch_results = self.orgconfig.org_connector.bulk.__getattr__('vlocity_cmt__AttributeAssignment__c').query(querystring, lazy_operation=True)
+        querystring = "SELECT Id,vlocity_cmt__AttributeCategoryId__c,vlocity_cmt__AttributeId__c FROM vlocity_cmt__AttributeAssignment__c WHERE vlocity_cmt__ObjectId__c in ({})"
+        fetch_results = self.bulkquery('vlocity_cmt__AttributeAssignment__c', querystring, object_to_query)
         for list_results in fetch_results:
             for result in list_results :
                 if result['Id'] != None:
@@ -91,11 +139,11 @@ class ExportBundle():
         return None
 
     def getallcompiledoverrides(self):
+        print('prepping data to export for compiled overrides, override definitions, please wait while we start exporting , this may take few seconds')
         if len(self.finalprodids) == 0:
             return None
-        objectidsstring =  ",".join("'" + objectid + "'" for objectid in self.finalprodids)
-        querystring = "SELECT vlocity_cmt__CompiledAttributeOverrideId__c, Id FROM vlocity_cmt__OverrideDefinition__c WHERE vlocity_cmt__ProductId__c in ({})".format(objectidsstring)
-        fetch_results = self.orgconfig.org_connector.bulk.__getattr__('vlocity_cmt__OverrideDefinition__c').query(querystring, lazy_operation=True)
+        querystring = "SELECT vlocity_cmt__CompiledAttributeOverrideId__c, Id FROM vlocity_cmt__OverrideDefinition__c WHERE vlocity_cmt__ProductId__c in ({})"
+        fetch_results = self.bulkquery('vlocity_cmt__OverrideDefinition__c', querystring, self.finalprodids)
         for list_results in fetch_results:
             for result in list_results :
                 if result['Id'] != None:
@@ -105,11 +153,11 @@ class ExportBundle():
         return None
 
     def getallples(self):
+        print('prepping data to export for pricing info, please wait while we start exporting , this may take few seconds')
         if len(self.finalprodids) == 0:
             return None
-        objectidsstring =  ",".join("'" + objectid + "'" for objectid in self.finalprodids)
-        querystring = "SELECT Id, vlocity_cmt__PricingElementId__c, vlocity_cmt__PricingElementId__r.vlocity_cmt__PricingVariableId__c, vlocity_cmt__PriceBookEntryId__c, vlocity_cmt__PriceListId__c FROM vlocity_cmt__PriceListEntry__c WHERE vlocity_cmt__ProductId__c in ({})".format(objectidsstring)
-        fetch_results = self.orgconfig.org_connector.bulk.__getattr__('vlocity_cmt__PriceListEntry__c').query(querystring, lazy_operation=True)
+        querystring = "SELECT Id, vlocity_cmt__PricingElementId__c, vlocity_cmt__PricingElementId__r.vlocity_cmt__PricingVariableId__c, vlocity_cmt__PriceBookEntryId__c, vlocity_cmt__PriceListId__c FROM vlocity_cmt__PriceListEntry__c WHERE vlocity_cmt__ProductId__c in ({})"
+        fetch_results = self.bulkquery('vlocity_cmt__PriceListEntry__c', querystring, self.finalprodids)
         for list_results in fetch_results:
             for result in list_results :
                 if result['Id'] != None:
@@ -125,11 +173,11 @@ class ExportBundle():
         return None
     
     def getAllCPR(self):
+        print('prepping data to export for catalog product relationship info, please wait while we start exporting , this may take few seconds')
         if len(self.finalprodids) == 0:
             return None
-        objectidsstring =  ",".join("'" + objectid + "'" for objectid in self.finalprodids)
-        querystring = "SELECT Id, vlocity_cmt__CatalogId__c, vlocity_cmt__EffectiveDate__c, vlocity_cmt__EndDate__c, vlocity_cmt__IsActive__c, vlocity_cmt__ItemType__c, vlocity_cmt__ProductGroupKey__c, vlocity_cmt__PromotionId__c, vlocity_cmt__SequenceNumber__c FROM vlocity_cmt__CatalogProductRelationship__c WHERE vlocity_cmt__Product2Id__c IN ({})".format(objectidsstring)
-        fetch_results = self.orgconfig.org_connector.bulk.__getattr__('vlocity_cmt__CatalogProductRelationship__c').query(querystring, lazy_operation=True)
+        querystring = "SELECT Id, vlocity_cmt__CatalogId__c, vlocity_cmt__EffectiveDate__c, vlocity_cmt__EndDate__c, vlocity_cmt__IsActive__c, vlocity_cmt__ItemType__c, vlocity_cmt__ProductGroupKey__c, vlocity_cmt__PromotionId__c, vlocity_cmt__SequenceNumber__c FROM vlocity_cmt__CatalogProductRelationship__c WHERE vlocity_cmt__Product2Id__c IN ({})"
+        fetch_results = self.bulkquery('vlocity_cmt__CatalogProductRelationship__c', querystring, self.finalprodids)
         for list_results in fetch_results:
             for result in list_results:
                 if result['Id'] != None:
@@ -139,41 +187,60 @@ class ExportBundle():
                 
         return None
     
-    def export(self, object, productid):
-        if len(productid) == 0:
-            return None
+    def finalexportset(self, attributename, objname):
+        self.finalexport(list(getattr(self, attributename)), objname)
+
+    def gethierarchy(self, object, rootids):
+        if object == "$namespace$__promotion__c":
+            self.finalpromotionids.update(rootids)
+            productids = self.getallpromotionproducts(rootids)
+        else:
+            productids = set(rootids)
         print('prepping data to export for pcis, products, please wait while we start exporting , this may take few seconds')
-        self.getallproductidsinhierarchy(productid)
-        self.finalprodids.extend(productid)
-        self.finalexport(self.finalprodids, "product2")
-        
-        print('prepping data to export for catalog product relationship info, please wait while we start exporting , this may take few seconds')
-        self.getAllCPR()
-        self.finalexport(list(self.finalcprids), "$namespace$__catalogproductrelationship__c")
-        
-        self.finalexport(self.finalpciids, "$namespace$__productchilditem__c")
-        self.finalpciids = []
+        self.finalprodids.update(productids)
+        self.getallproductidsinhierarchy(productids)
 
-        print('prepping data to export for attribute assignments, attribtues, categories, please wait while we start exporting , this may take few seconds')
-        self.getallattributeassignments()
+    def export(self, object, rootids):
+        # every root of the release is traversed in the same pass, so shared children and related records are exported once
+        rootids = list(dict.fromkeys(rootids))
+        if len(rootids) == 0:
+            return None
+        scheduler = TaskScheduler(self.concurrency)
+        scheduler.add_task("hierarchy", partial(self.gethierarchy, object, rootids))
+        scheduler.add_task("promotions", partial(self.finalexportset, "finalpromotionids", "$namespace$__promotion__c"), ["hierarchy"])
+        scheduler.add_task("promotionitems", partial(self.finalexportset, "finalpromotionitemids", "$namespace$__promotionitem__c"), ["hierarchy"])
+        scheduler.add_task("product2", partial(self.finalexportset, "finalprodids", "product2"), ["hierarchy"])
+        scheduler.add_task("pcis", partial(self.finalexportset, "finalpciids", "$namespace$__productchilditem__c"), ["hierarchy"])
+        scheduler.add_task("objectclasses", partial(self.finalexportset, "finalobjectclassids", "$namespace$__objectclass__c"), ["hierarchy"])
 
-        self.finalexport(list(self.finalattrcatids), "$namespace$__attributecategory__c")
-        self.finalexport(list(self.finalattrids), "$namespace$__attribute__c")
-        self.finalexport(list(self.finalattrassignids), "$namespace$__attributeassignment__c")
+        scheduler.add_task("cprdiscovery", self.getAllCPR, ["hierarchy"])
+        scheduler.add_task("cprs", partial(self.finalexportset, "finalcprids", "$namespace$__catalogproductrelationship__c"), ["cprdiscovery"])
 
-        print('prepping data to export for compiled overrides, override definitions, please wait while we start exporting , this may take few seconds')
-        self.getallcompiledoverrides()
-        self.finalexport(list(self.finaloverridedefs), "$namespace$__overridedefinition__c")
-        self.finalexport(list(self.finalcompiledattrids), "$namespace$__compiledattributeoverride__c")
+        scheduler.add_task("attributediscovery", self.getallattributeassignments, ["hierarchy"])
+        scheduler.add_task("attributecategories", partial(self.finalexportset, "finalattrcatids", "$namespace$__attributecategory__c"), ["attributediscovery"])
+        scheduler.add_task("attributes", partial(self.finalexportset, "finalattrids", "$namespace$__attribute__c"), ["attributediscovery"])
+        scheduler.add_task("attributeassignments", partial(self.finalexportset, "finalattrassignids", "$namespace$__attributeassignment__c"), ["attributediscovery"])
 
-        print('prepping data to export for pricing info, please wait while we start exporting , this may take few seconds')
-        self.getallples()
-        self.finalexport(list(self.finalplids), "$namespace$__pricelist__c")
-        self.finalexport(list(self.finalpleids), "$namespace$__pricelistentry__c")
-        self.finalexport(list(self.finalpeids), "$namespace$__pricingelement__c")
-        self.finalexport(list(self.finalpvids), "$namespace$__pricingvariable__c")
-        self.finalexport(list(self.finalpbeids), "pricebookentry")
+        scheduler.add_task("overridediscovery", self.getallcompiledoverrides, ["hierarchy"])
+        scheduler.add_task("overridedefinitions", partial(self.finalexportset, "finaloverridedefs", "$namespace$__overridedefinition__c"), ["overridediscovery"])
+        scheduler.add_task("compiledoverrides", partial(self.finalexportset, "finalcompiledattrids", "$namespace$__compiledattributeoverride__c"), ["overridediscovery"])
+
+        scheduler.add_task("pricingdiscovery", self.getallples, ["hierarchy"])
+        scheduler.add_task("pricelists", partial(self.finalexportset, "finalplids", "$namespace$__pricelist__c"), ["pricingdiscovery"])
+        scheduler.add_task("pricelistentries", partial(self.finalexportset, "finalpleids", "$namespace$__pricelistentry__c"), ["pricingdiscovery"])
+        scheduler.add_task("pricingelements", partial(self.finalexportset, "finalpeids", "$namespace$__pricingelement__c"), ["pricingdiscovery"])
+        scheduler.add_task("pricingvariables", partial(self.finalexportset, "finalpvids", "$namespace$__pricingvariable__c"), ["pricingdiscovery"])
+        scheduler.add_task("pricebookentries", partial(self.finalexportset, "finalpbeids", "pricebookentry"), ["pricingdiscovery"])
         # finalexport(list(finalrecorditypeds), "recordtype")
-        self.finalexport(list(self.finalobjectclassids), "$namespace$__objectclass__c")
 
-        self.savefile('./results/'+ 'epc_import_args_'+str(uuid.uuid4())+'.json' , GlobalResultsDTO.globalobjectimportfileinfomap, 'import configurations')
\ No newline at end of file
+        QueryUtils.show_progress = scheduler.max_workers == 1
+        try:
+            scheduler.run()
+        finally:
+            QueryUtils.show_progress = True
+        self.finalpciids = set()
+
+        ExportService.save_ndjson_indexes()
+        if self.incremental:
+            ExportManifestDTO.getinstance(self.orgconfig).save()
+        self.savefile('./results/'+ 'epc_import_args_'+GlobalResultsDTO.export_run_id+'.json' , GlobalResultsDTO.globalobjectimportfileinfomap, 'import configurations')
\ No newline at end of file
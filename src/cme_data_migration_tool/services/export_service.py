@@ -1,18 +1,22 @@
-import json,os,uuid,shutil
+import json,os,uuid,shutil,threading
 from pathlib import Path
 from alive_progress import alive_bar
 from src.cme_data_migration_tool.dtos.configurations_dtos.org_config_dto import OrgConfigDTO
 from src.cme_data_migration_tool.dtos.configurations_dtos.migration_obj_template_dto import MigrationObjTemplateDTO
 from src.cme_data_migration_tool.services.base_service import BaseService
 from src.cme_data_migration_tool.utils.query_utils import QueryUtils
+from src.cme_data_migration_tool.utils.export_cache import ExportCache
 from src.cme_data_migration_tool.dtos.runtime_dtos.global_results_dto import GlobalResultsDTO
+from src.cme_data_migration_tool.dtos.runtime_dtos.export_manifest_dto import ExportManifestDTO
 from src.cme_data_migration_tool.dtos.configurations_dtos.matching_keys_dto import MatchingKeysDTO
 from src.cme_data_migration_tool.utils.nsf import nsf
 
 class ExportService(BaseService):
 
-    def __init__(self, saveresult, result_name, objectnametoquery, fieldnametoquery, idstoquery):
+    def __init__(self, saveresult, result_name, objectnametoquery, fieldnametoquery, idstoquery, exportformat="ndjson", incremental=False):
         MatchingKeysDTO.getinstance()
+        self.exportformat = exportformat
+        self.incremental = incremental
         self.object_result_filename = uuid.uuid4().hex
         self.objectnametoquery = objectnametoquery
         self.import_sequence = []
@@ -23,17 +27,22 @@ class ExportService(BaseService):
         self.saveresult = saveresult
         self.orgconfig = OrgConfigDTO.getsourceorg()
         self.exportobjectconfig = MigrationObjTemplateDTO.getsourceinstance(objectnametoquery)
-        self.object_results = QueryUtils.query_by_field(self.exportobjectconfig, self.orgconfig, fieldnametoquery, idstoquery, BaseService.processqueryrecord)
-        if self.exportobjectconfig.objectname not in GlobalResultsDTO.file_import_sequence:
-            GlobalResultsDTO.file_import_sequence[self.exportobjectconfig.objectname] = []
-        
-        for key in GlobalResultsDTO.globalids:
-            if key in self.object_results:
-                self.object_results.pop(key)
-        
-        if self.exportobjectconfig.objectname not in GlobalResultsDTO.globalobjectmap.keys():
-            GlobalResultsDTO.globalobjectmap[self.exportobjectconfig.objectname] = 0
-        GlobalResultsDTO.globalobjectmap[self.exportobjectconfig.objectname] = GlobalResultsDTO.globalobjectmap[self.exportobjectconfig.objectname] + len(self.object_results)
+        if self.incremental:
+            self.object_results = self.query_changed_records(fieldnametoquery, idstoquery)
+        else:
+            self.object_results = self.query_records(fieldnametoquery, idstoquery)
+        # export services of different objects run concurrently from the export bundle scheduler
+        with GlobalResultsDTO.lock:
+            if self.exportobjectconfig.objectname not in GlobalResultsDTO.file_import_sequence:
+                GlobalResultsDTO.file_import_sequence[self.exportobjectconfig.objectname] = []
+            
+            for key in GlobalResultsDTO.globalids:
+                if key in self.object_results:
+                    self.object_results.pop(key)
+            
+            if self.exportobjectconfig.objectname not in GlobalResultsDTO.globalobjectmap.keys():
+                GlobalResultsDTO.globalobjectmap[self.exportobjectconfig.objectname] = 0
+            GlobalResultsDTO.globalobjectmap[self.exportobjectconfig.objectname] = GlobalResultsDTO.globalobjectmap[self.exportobjectconfig.objectname] + len(self.object_results)
 
         self.results_path = Path('results')
         self.results_root_path = self.results_path / self.result_name
@@ -46,20 +55,55 @@ class ExportService(BaseService):
         self.base_object_name = nsf.cleanup(objectnametoquery)
         self.create_directory()
 
+    def query_records(self, fieldnametoquery, idstoquery, condition=None):
+        # with an export cache open, records whose SystemModstamp did not move since they were cached are served locally
+        if ExportCache.instance is not None and fieldnametoquery == 'id':
+            return ExportCache.instance.query_by_id(self.exportobjectconfig, self.orgconfig, idstoquery, BaseService.processqueryrecord, condition)
+        return QueryUtils.query_by_field(self.exportobjectconfig, self.orgconfig, fieldnametoquery, idstoquery, BaseService.processqueryrecord, condition)
+
+    def query_changed_records(self, fieldnametoquery, idstoquery):
+        # records exported before are only fetched again when their SystemModstamp moved past the object's watermark
+        with GlobalResultsDTO.lock:
+            manifest = ExportManifestDTO.getinstance(self.orgconfig)
+            if manifest.runwatermark is None:
+                manifest.startrun(QueryUtils.get_org_time(self.orgconfig))
+            knownids, newids = manifest.splitids(self.objectnametoquery, idstoquery) if fieldnametoquery == 'id' else ([], list(idstoquery))
+            condition = manifest.getmodstampcondition(self.objectnametoquery)
+        if condition is None:
+            knownids, newids = [], list(idstoquery)
+        object_results = {}
+        known_results = {}
+        if len(newids) > 0:
+            object_results.update(self.query_records(fieldnametoquery, newids))
+        if len(knownids) > 0:
+            known_results = self.query_records(fieldnametoquery, knownids, condition)
+            object_results.update(known_results)
+
+        # a moved SystemModstamp does not always mean changed content, unchanged records are not written again
+        changed_results = {}
+        with GlobalResultsDTO.lock:
+            for key, object_result in object_results.items():
+                if manifest.haschanged(self.objectnametoquery, object_result):
+                    changed_results[key] = object_result
+            unchanged_count = len(knownids) - len(known_results) + len(object_results) - len(changed_results)
+            GlobalResultsDTO.globalunchangedobjectmap[self.objectnametoquery] = GlobalResultsDTO.globalunchangedobjectmap.get(self.objectnametoquery, 0) + unchanged_count
+        return changed_results
+
     def export(self):
         references_to_export = {}
         objectids_to_export = []
         
-        for object_result_key in self.object_results:
-            object_result = self.object_results.get(object_result_key)
-            object_result_id = object_result["fieldresult"]["id"]
-            if(object_result_id in GlobalResultsDTO.globalids):
-                continue
-            GlobalResultsDTO.globalids.add(object_result_id)
-            objectids_to_export.append(object_result_id)
+        with GlobalResultsDTO.lock:
+            for object_result_key in self.object_results:
+                object_result = self.object_results.get(object_result_key)
+                object_result_id = object_result["fieldresult"]["id"]
+                if(object_result_id in GlobalResultsDTO.globalids):
+                    continue
+                GlobalResultsDTO.globalids.add(object_result_id)
+                objectids_to_export.append(object_result_id)
 
-        GlobalResultsDTO.file_import_sequence[self.exportobjectconfig.objectname].append(self.object_result_filename)
-        GlobalResultsDTO.object_import_sequence.append(self.exportobjectconfig.objectname)        
+            GlobalResultsDTO.file_import_sequence[self.exportobjectconfig.objectname].append(self.object_result_filename)
+            GlobalResultsDTO.object_import_sequence.append(self.exportobjectconfig.objectname)        
 
         self.import_sequence.append(self.object_result_filename)
         
@@ -68,21 +112,59 @@ class ExportService(BaseService):
     
     def export_by_chunks(self, object, field, objectids_to_export):
         final_objectids_to_export = list(set(objectids_to_export) - GlobalResultsDTO.globalids) if field == "id" else objectids_to_export
-        for i in range(0, len(final_objectids_to_export), 500):
-            objectids_to_export_chunk = objectids_to_export[i:i + 500]
-            exportservice = ExportService(False, self.result_name, object, field, objectids_to_export_chunk)
+        if len(final_objectids_to_export) > 0:
+            exportservice = ExportService(False, self.result_name, object, field, final_objectids_to_export, self.exportformat, self.incremental)
             object_import_sequence = exportservice.export()
             self.import_sequence.extend(object_import_sequence)
 
     def save_results(self):
         print("saving results of " + self.base_object_name)
+        if self.exportformat == "ndjson":
+            self.save_ndjson_results()
+            return None
         for key in self.object_results:
             matchingkey = self.object_results[key]["matchingkeyinfo"]["matchingkey"]
             filepathtosave = self.base_object_result_filepath.with_name(self.base_object_result_filepath.stem + "_" + matchingkey + ".json")
             self.savefile(filepathtosave, self.object_results[key], self.exportobjectconfig.objectname)
-            if self.objectnametoquery not in GlobalResultsDTO.globalobjectimportfileinfomap.keys():
-                GlobalResultsDTO.globalobjectimportfileinfomap[self.objectnametoquery] = []
-            GlobalResultsDTO.globalobjectimportfileinfomap[self.objectnametoquery].append(self.base_object_name+"_"+matchingkey+'.json')
+            with GlobalResultsDTO.lock:
+                if self.objectnametoquery not in GlobalResultsDTO.globalobjectimportfileinfomap.keys():
+                    GlobalResultsDTO.globalobjectimportfileinfomap[self.objectnametoquery] = []
+                GlobalResultsDTO.globalobjectimportfileinfomap[self.objectnametoquery].append(self.base_object_name+"_"+matchingkey+'.json')
+
+    def save_ndjson_results(self):
+        # one append-only file per object and export run, every record is a single json line and its offset is kept for the index
+        ndjson_filename = self.base_object_name + '_' + GlobalResultsDTO.export_run_id + '.ndjson'
+        ndjson_filepath = self.results_directory_path / ndjson_filename
+        # the global lock only registers the file, appends to it are serialized per object so exports of other objects do not wait on the disk
+        with GlobalResultsDTO.lock:
+            firstwrite = self.objectnametoquery not in GlobalResultsDTO.globalndjsonindexmap
+            ndjsonindex = GlobalResultsDTO.globalndjsonindexmap.setdefault(self.objectnametoquery, {
+                'file' : ndjson_filename,
+                'run_id' : GlobalResultsDTO.export_run_id,
+                'directory' : str(self.results_directory_path),
+                'offsets' : {}
+            })
+            ndjsonlock = GlobalResultsDTO.globalndjsonlockmap.setdefault(self.objectnametoquery, threading.Lock())
+            if firstwrite:
+                GlobalResultsDTO.globalobjectimportfileinfomap.setdefault(self.objectnametoquery, []).append(ndjson_filename)
+        if self.test is False:
+            # the file name is unique to the run, so every writer appends, also the first one
+            with ndjsonlock, open(ndjson_filepath, 'ab') as f:
+                for key in self.object_results:
+                    line = json.dumps(self.object_results[key]).encode('utf-8') + b'\n'
+                    ndjsonindex['offsets'][self.object_results[key]["matchingkeyinfo"]["matchingkey"]] = [f.tell(), len(line)]
+                    f.write(line)
+        elif self.printtest is True:
+            print("Testing mode, files will not be saved")
+            for key in self.object_results:
+                print(json.dumps(self.object_results[key]))
+
+    @staticmethod
+    def save_ndjson_indexes():
+        for objectname, ndjsonindex in GlobalResultsDTO.globalndjsonindexmap.items():
+            indexfilepath = Path(ndjsonindex['directory']) / (ndjsonindex['file'] + '.index.json')
+            with open(indexfilepath, 'w') as f:
+                json.dump({'object' : objectname, 'file' : ndjsonindex['file'], 'run_id' : ndjsonindex['run_id'], 'count' : len(ndjsonindex['offsets']), 'offsets' : ndjsonindex['offsets']}, f)
 
     def save_sequence(self, name):
         self.savefile(self.results_path + name + '.json', GlobalResultsDTO.globalobjectmatchingkeyinfomap, 'import configurations')
@@ -92,8 +174,8 @@ class ExportService(BaseService):
         # if(os.path.isdir(self.results_root_path) is True and self.saveresult is True):
         #     shutil.rmtree(self.results_root_path)
         if os.path.exists(self.results_root_path) is not True and self.test is False:
-            os.makedirs(self.results_root_path)
+            os.makedirs(self.results_root_path, exist_ok=True)
         if os.path.exists(self.results_directory_path) is not True and self.test is False:
-            os.makedirs(self.results_directory_path)
+            os.makedirs(self.results_directory_path, exist_ok=True)
         # if os.path.isdir(self.matching_key_results_directory_path) is not True and self.test is False:
         #     os.mkdir(self.matching_key_results_directory_path)
\ No newline at end of file
@@ -1,4 +1,5 @@
-import uuid
+import json,time,uuid
+from functools import partial
 from prettytable import PrettyTable
 from os import walk
 
@@ -10,16 +11,27 @@ from src.cme_data_migration_tool.dtos.runtime_dtos.object_matching_keys_dto impo
 from src.cme_data_migration_tool.dtos.runtime_dtos.object_results_dto import ObjectResultsDTO
 from src.cme_data_migration_tool.dtos.runtime_dtos.global_results_dto import GlobalResultsDTO
 from src.cme_data_migration_tool.dtos.runtime_dtos.import_results_config_dto import ImportResultsConfigDTO
+from src.cme_data_migration_tool.dtos.runtime_dtos.import_throughput_dto import ImportThroughputDTO
 from src.cme_data_migration_tool.utils.nsf import nsf
 
 from src.cme_data_migration_tool.services.base_service import BaseService
 
 from src.cme_data_migration_tool.utils.dml_utils import DMLUtils
+from src.cme_data_migration_tool.utils.query_utils import QueryUtils
+from src.cme_data_migration_tool.simple_salesforce_dmt.bulk_orchestrator import BulkOrchestrator
+from src.cme_data_migration_tool.utils.task_scheduler import TaskScheduler
+from src.cme_data_migration_tool.utils.memory_utils import MemoryUtils
 
 
 class ImportService(BaseService):
 
-    def __init__(self, saveresult, result_filename):
+    def __init__(self, saveresult, result_filename, dmlmode="serial", backend="bulkv1", sequence="configured", journal=None, streaming=False, skipunchanged=False):
+        self.dmlmode = dmlmode
+        self.skipunchanged = skipunchanged
+        self.streaming = streaming
+        self.journal = journal
+        self.backend = backend
+        self.sequence = sequence
         self.test = False
         self.printtest= False
         self.saveresult = saveresult
@@ -27,19 +39,202 @@ class ImportService(BaseService):
         self.results_config = ImportResultsConfigDTO.getinstance(result_filename)
 
     def import_data(self):
+        """
+        Objects are upserted level by level, the objects of a level at the same time once every object of the previous
+        level has been upserted. While upserts are running, the result files of the following objects are loaded and their
+        matching keys looked up, up to max_concurrency of the destination org objects ahead. An object is only prepared
+        once every object it references has been upserted. With a journal, objects it has as complete are skipped and the
+        records of incomplete objects it has as upserted are left out. In streaming mode the records of an object are read,
+        looked up and upserted one window at a time by its upsert instead of being prepared ahead. With skipunchanged,
+        existing records only send the fields whose values differ in the destination org and are skipped when none do.
+        """
         table = PrettyTable()
-        table.field_names = ["Object Name", "Import Existing Records Count", "Import New Records Count"]
+        table.field_names = ["Object Name", "Import Existing Records Count", "Import New Records Count"] + (["Unchanged Records Skipped"] if self.skipunchanged else [])
         importsequencedto = ImportSequenceDTO.getinstance()
-        for sequenceobject in importsequencedto.import_sequence:
-            print('preparing objects to upsert')
-            objectstoupsertresult = ObjectResultsDTO.getinstance(self.results_config, sequenceobject)
-            if(objectstoupsertresult is None):
-                continue
+        levels = importsequencedto.getlevels(self.results_config.import_configs, self.sequence)
+        ImportSequenceDTO.print_levels(levels)
+        sequence = [sequenceobject for level in levels for sequenceobject in level]
+        lookahead = max(1, self.orgconfig.max_concurrency)
+        scheduler = TaskScheduler(lookahead + max(len(level) for level in levels) if len(levels) > 0 else 1)
+        self.prepared_results = {}
+        self.import_rows = {}
+        previouslevel = []
+        for level in levels:
+            for sequenceobject in level:
+                index = sequence.index(sequenceobject)
+                dependencies = ["upsert:" + parentobject for parentobject in self.get_parent_objects(importsequencedto, sequenceobject, sequence[:index])]
+                if index >= lookahead:
+                    dependencies.append("upsert:" + sequence[index - lookahead])
+                scheduler.add_task("prepare:" + sequenceobject, partial(self.prepare_object, sequenceobject), list(dict.fromkeys(dependencies)))
+                scheduler.add_task("upsert:" + sequenceobject, partial(self.upsert_object, sequenceobject), ["prepare:" + sequenceobject] + ["upsert:" + upstreamobject for upstreamobject in previouslevel])
+            previouslevel = level
+
+        QueryUtils.show_progress = False
+        try:
+            scheduler.run()
+        finally:
+            QueryUtils.show_progress = True
+            ImportThroughputDTO.getinstance(self.orgconfig).save()
+        for sequenceobject in sequence:
+            if sequenceobject in self.import_rows:
+                table.add_row(self.import_rows[sequenceobject])
+        print(table)
+        GlobalResultsDTO.print_api_call_summary()
+        BulkOrchestrator.print_metrics()
+        MemoryUtils.print_peak_memory("import")
+        return None
+
+    @staticmethod
+    def get_parent_objects(importsequencedto, sequenceobject, upstreamobjects):
+        # objects referenced by this object that are imported before it, references to itself do not order anything
+        return [parentobject for parentobject in importsequencedto.getreferencedobjects(sequenceobject) if parentobject != sequenceobject and parentobject in upstreamobjects]
+
+    def prepare_object(self, sequenceobject):
+        if self.journal is not None and sequenceobject in self.journal.completed_objects:
+            print(sequenceobject + ' is complete in the import journal, skipping it')
+            return None
+        if self.streaming:
+            return None
+        print('preparing ' + sequenceobject + ' to upsert')
+        completedkeys = self.journal.get_completed_keys(sequenceobject) if self.journal is not None else None
+        self.prepared_results[sequenceobject] = ObjectResultsDTO.getinstance(self.results_config, sequenceobject, completedkeys, self.skipunchanged)
+
+    def upsert_object(self, sequenceobject):
+        if self.journal is not None and sequenceobject in self.journal.completed_objects:
+            journalrow = self.journal.completed_objects[sequenceobject]
+            self.import_rows[sequenceobject] = self.get_import_row(sequenceobject, journalrow[1], journalrow[2], journalrow[3] if len(journalrow) > 3 else 0)
+            return None
+        if self.streaming:
+            return self.stream_object(sequenceobject)
+        objectstoupsertresult = self.prepared_results.pop(sequenceobject)
+        if(objectstoupsertresult is None):
+            return None
+        if objectstoupsertresult.existing_record_count + objectstoupsertresult.new_record_count > 0:
             print('upserting objects')
-            DMLUtils.upsert(objectstoupsertresult)
-            self.savefile('./import_results/'+sequenceobject+'.json', objectstoupsertresult.get_results(), sequenceobject)
-            table.add_row([sequenceobject, objectstoupsertresult.existing_record_count, objectstoupsertresult.new_record_count])
+            started = time.perf_counter()
+            DMLUtils.upsert(objectstoupsertresult, self.dmlmode, self.backend, self.get_batch_callback(sequenceobject, objectstoupsertresult))
+            self.record_throughput(sequenceobject, objectstoupsertresult.existing_record_count + objectstoupsertresult.new_record_count, time.perf_counter() - started)
+        self.savefile('./import_results/'+sequenceobject+'.json', objectstoupsertresult.get_results(), sequenceobject)
+        self.import_rows[sequenceobject] = self.get_import_row(sequenceobject, objectstoupsertresult.existing_record_count, objectstoupsertresult.new_record_count, objectstoupsertresult.unchanged_record_count)
+        if self.journal is not None:
+            self.journal.record_object(sequenceobject, self.import_rows[sequenceobject])
+        return None
+
+    def stream_object(self, sequenceobject):
+        completedkeys = self.journal.get_completed_keys(sequenceobject) if self.journal is not None else None
+        fpath = './import_results/'+sequenceobject+'.json'
+        existing_record_count = 0
+        new_record_count = 0
+        unchanged_record_count = 0
+        written = 0
+        resultfile = None
+        if self.test is False:
+            # the results are written as the same json list savefile writes, one window at a time
+            resultfile = open(fpath, 'w')
+            resultfile.write('[')
+        try:
+            for windowresult in ObjectResultsDTO.getwindows(self.results_config, sequenceobject, completedkeys, skipunchanged=self.skipunchanged):
+                if windowresult.existing_record_count + windowresult.new_record_count > 0:
+                    print('upserting {} window of {} records'.format(sequenceobject, windowresult.existing_record_count + windowresult.new_record_count))
+                    started = time.perf_counter()
+                    DMLUtils.upsert(windowresult, self.dmlmode, self.backend, self.get_batch_callback(sequenceobject, windowresult))
+                    self.record_throughput(sequenceobject, windowresult.existing_record_count + windowresult.new_record_count, time.perf_counter() - started)
+                if resultfile is not None:
+                    for record in windowresult.get_results():
+                        resultfile.write((', ' if written > 0 else '') + json.dumps(record))
+                        written += 1
+                existing_record_count += windowresult.existing_record_count
+                new_record_count += windowresult.new_record_count
+                unchanged_record_count += windowresult.unchanged_record_count
+        finally:
+            if resultfile is not None:
+                resultfile.write(']')
+                resultfile.close()
+        self.import_rows[sequenceobject] = self.get_import_row(sequenceobject, existing_record_count, new_record_count, unchanged_record_count)
+        if self.journal is not None:
+            self.journal.record_object(sequenceobject, self.import_rows[sequenceobject])
+        MemoryUtils.print_peak_memory("after " + sequenceobject)
+        return None
+
+    def record_throughput(self, sequenceobject, records, seconds):
+        with GlobalResultsDTO.lock:
+            ImportThroughputDTO.getinstance(self.orgconfig).record(sequenceobject, self.backend, records, seconds)
+
+    def plan_import(self):
+        """
+        Dry run of the import, looks up the matching keys of every object and reports the bulk jobs, batches, api calls
+        and time its upsert would take without running any DML. Times come from the throughput of earlier imports of
+        the object with the backend, the objects of a level are upserted together so a level takes as long as its
+        slowest object. The totals are checked against the remaining limits of the destination org.
+        """
+        table = PrettyTable()
+        table.field_names = ["Object Name", "Level", "Import Existing Records Count", "Import New Records Count"] + (["Unchanged Records Skipped"] if self.skipunchanged else []) + ["Bulk Jobs", "Batches", "Estimated API Calls", "Estimated Seconds"]
+        importsequencedto = ImportSequenceDTO.getinstance()
+        levels = importsequencedto.getlevels(self.results_config.import_configs, self.sequence)
+        ImportSequenceDTO.print_levels(levels)
+        throughput = ImportThroughputDTO.getinstance(self.orgconfig)
+        lookup_api_calls = GlobalResultsDTO.query_api_calls
+        self.plan_rows = {}
+        scheduler = TaskScheduler(max(1, self.orgconfig.max_concurrency))
+        for level in levels:
+            for sequenceobject in level:
+                scheduler.add_task("plan:" + sequenceobject, partial(self.plan_object, sequenceobject, throughput))
+        QueryUtils.show_progress = False
+        try:
+            scheduler.run()
+        finally:
+            QueryUtils.show_progress = True
+        lookup_api_calls = GlobalResultsDTO.query_api_calls - lookup_api_calls
+
+        total_seconds = 0
+        total_batches = 0
+        total_api_calls = lookup_api_calls
+        for levelindex, level in enumerate(levels):
+            level_seconds = 0
+            for sequenceobject in level:
+                if sequenceobject not in self.plan_rows:
+                    continue
+                objectrow, jobs, batches, api_calls, seconds, historical = self.plan_rows[sequenceobject]
+                table.add_row(objectrow[:1] + [levelindex + 1] + objectrow[1:] + [jobs, batches, api_calls, "{:.0f}{}".format(seconds, "" if historical else " (default throughput)")])
+                level_seconds = max(level_seconds, seconds)
+                total_batches += batches
+                total_api_calls += api_calls
+            total_seconds += level_seconds
         print(table)
+        print("matching key lookups: {} api calls, the import makes them again".format(lookup_api_calls))
+        print("estimated total: {} api calls, {} batches, {:.0f} seconds".format(total_api_calls, total_batches, total_seconds))
+        self.check_limits(total_api_calls, total_batches)
+        return None
+
+    def plan_object(self, sequenceobject, throughput):
+        if self.journal is not None and sequenceobject in self.journal.completed_objects:
+            return None
+        completedkeys = self.journal.get_completed_keys(sequenceobject) if self.journal is not None else None
+        objectresult = ObjectResultsDTO.getinstance(self.results_config, sequenceobject, completedkeys, self.skipunchanged)
+        if objectresult is None:
+            return None
+        jobs, batches, api_calls = DMLUtils.plan_upsert(objectresult, self.dmlmode, self.backend)
+        records_per_second, historical = throughput.getthroughput(sequenceobject, self.backend)
+        seconds = (objectresult.existing_record_count + objectresult.new_record_count) / records_per_second
+        objectrow = self.get_import_row(sequenceobject, objectresult.existing_record_count, objectresult.new_record_count, objectresult.unchanged_record_count)
+        self.plan_rows[sequenceobject] = (objectrow, jobs, batches, api_calls, seconds, historical)
         return None
-    
-    
\ No newline at end of file
+
+    def check_limits(self, api_calls, batches):
+        limits = self.orgconfig.org_connector.limits()
+        for limitname, needed in [("DailyApiRequests", api_calls), ("DailyBulkApiBatches", batches)]:
+            limit = limits.get(limitname, None)
+            if limit is None:
+                continue
+            print("{}: {} needed, {} of {} remaining{}".format(limitname, needed, limit['Remaining'], limit['Max'], "" if needed <= limit['Remaining'] else ", the import exceeds the remaining limit"))
+        return None
+
+    def get_import_row(self, sequenceobject, existing_record_count, new_record_count, unchanged_record_count):
+        return [sequenceobject, existing_record_count, new_record_count] + ([unchanged_record_count] if self.skipunchanged else [])
+
+    def get_batch_callback(self, sequenceobject, objectstoupsertresult):
+        if self.journal is None:
+            return None
+        # batches hold the record dicts of the results, their identity leads back to the matching key of each record
+        matchingkeys = {id(record): matchingkey for record, matchingkey in zip(objectstoupsertresult.get_results(), objectstoupsertresult.get_matching_keys())}
+        return lambda records, results: self.journal.record_batch(sequenceobject, [matchingkeys[id(record)] for record in records], results)
@@ -2,18 +2,34 @@
 
 import concurrent.futures
 import json
+import queue
+import threading
 from collections import OrderedDict
 from functools import partial
 from time import sleep
-from typing import Any, Dict, Iterable, List, Optional, Union, cast
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union, cast
 
 import requests
 
+from .bulk_orchestrator import BulkOrchestrator
 from .exceptions import SalesforceGeneralError
 from .util import BulkDataAny, BulkDataStr, Headers, Proxies, \
     call_salesforce, \
+    iter_json_array, \
     list_from_generator
 
+# status checks of a job's batches start fast and back off for long jobs
+BATCH_POLL_MIN_WAIT = 0.5
+BATCH_POLL_MAX_WAIT = 30
+BATCH_POLL_BACKOFF = 1.5
+# query result sets are parsed while they download and yielded in pages,
+# a batch downloads up to QUERY_RESULT_CONCURRENCY of its result sets at
+# once, each holding at most QUERY_RESULT_PREFETCH_PAGES parsed pages
+QUERY_RESULT_PAGE_SIZE = 2000
+QUERY_RESULT_CONCURRENCY = 4
+QUERY_RESULT_PREFETCH_PAGES = 2
+QUERY_RESULT_CHUNK_SIZE = 64 * 1024
+
 
 class SFBulkHandler:
     """ Bulk API request handler
@@ -55,6 +71,8 @@ class SFBulkHandler:
             'X-SFDC-Session': self.session_id,
             'X-PrettyPrint': '1'
             }
+        # shared by every handler of the org
+        self.orchestrator = BulkOrchestrator.getinstance(bulk_url)
 
     def __getattr__(self,
                     name: str
@@ -62,7 +80,8 @@ class SFBulkHandler:
         return SFBulkType(object_name=name,
                           bulk_url=self.bulk_url,
                           headers=self.headers,
-                          session=self.session
+                          session=self.session,
+                          orchestrator=self.orchestrator
                           )
 
 
@@ -74,7 +93,8 @@ class SFBulkType:
             object_name: str,
             bulk_url: str,
             headers: Headers,
-            session: requests.Session
+            session: requests.Session,
+            orchestrator: Optional[BulkOrchestrator] = None
             ):
         """Initialize the instance with the given parameters.
 
@@ -87,16 +107,22 @@ class SFBulkType:
         * session -- Custom requests session, created in calling code. This
                      enables the use of requests Session features not otherwise
                      exposed by simple_salesforce.
+        * orchestrator -- caps the open jobs and in-flight batches of the
+                          org, the org's shared orchestrator by default
         """
         self.object_name = object_name
         self.bulk_url = bulk_url
         self.session = session
         self.headers = headers
+        self.orchestrator = orchestrator or \
+            BulkOrchestrator.getinstance(bulk_url)
 
     def _create_job(self,
                     operation: str,
                     use_serial: bool,
-                    external_id_field: Optional[str] = None
+                    external_id_field: Optional[str] = None,
+                    pk_chunking: Union[bool, int] = False,
+                    pk_chunking_parent: Optional[str] = None
                     ) -> Any:
         """ Create a bulk job
 
@@ -105,6 +131,11 @@ class SFBulkType:
         * operation -- Bulk operation to be performed by job
         * use_serial -- Process batches in order
         * external_id_field -- unique identifier field for upsert operations
+        * pk_chunking -- split a query into batches by Id ranges, True for
+                         the default chunk size or the number of records
+                         per chunk
+        * pk_chunking_parent -- parent object of a sharing or history
+                                object to chunk on
         """
 
         payload = {
@@ -119,10 +150,20 @@ class SFBulkType:
 
         url = f'{self.bulk_url}job'
 
+        headers = self.headers
+        if pk_chunking:
+            options = ['true'] if pk_chunking is True else \
+                [f'chunkSize={int(pk_chunking)}']
+            if pk_chunking_parent is not None:
+                options.append(f'parent={pk_chunking_parent}')
+            # a copy, the header only applies to the creation of this job
+            headers = dict(self.headers)
+            headers['Sforce-Enable-PKChunking'] = '; '.join(options)
+
         result = call_salesforce(url=url,
                                  method='POST',
                                  session=self.session,
-                                 headers=self.headers,
+                                 headers=headers,
                                  data=json.dumps(payload,
                                                  allow_nan=False
                                                  )
@@ -166,17 +207,21 @@ class SFBulkType:
             self,
             job_id: str,
             data: BulkDataAny,
-            operation: str
+            operation: str,
+            encoded: Optional[str] = None
             ) -> Any:
         """ Add a set of data as a batch to an existing job
         Separating this out in case of later
         implementations involving multiple batches
+        encoded -- the data already serialized as the json request body
         """
 
         url = f'{self.bulk_url}job/{job_id}/batch'
 
         data_: Union[BulkDataAny, str]
-        if operation not in ('query', 'queryAll'):
+        if encoded is not None:
+            data_ = encoded
+        elif operation not in ('query', 'queryAll'):
             data_ = json.dumps(data,
                                allow_nan=False
                                )
@@ -191,6 +236,20 @@ class SFBulkType:
                                  )
         return result.json(object_pairs_hook=OrderedDict)
 
+    def _get_job_batches(self,
+                         job_id: str
+                         ) -> List[Any]:
+        """ Get the status of every batch of an existing job """
+
+        url = f'{self.bulk_url}job/{job_id}/batch'
+
+        result = call_salesforce(url=url,
+                                 method='GET',
+                                 session=self.session,
+                                 headers=self.headers
+                                 )
+        return result.json(object_pairs_hook=OrderedDict)['batchInfo']
+
     def _get_batch(self,
                    job_id: str,
                    batch_id: str
@@ -223,17 +282,167 @@ class SFBulkType:
                                  )
 
         if operation in ('query', 'queryAll'):
-            for batch_result in result.json():
-                url_query_results = f'{url}/{batch_result}'
-                batch_query_result = call_salesforce(url=url_query_results,
-                                                     method='GET',
-                                                     session=self.session,
-                                                     headers=self.headers
-                                                     ).json()
-                yield batch_query_result
+            yield from self._stream_query_results(url, result.json())
         else:
             yield result.json()
 
+    def _stream_result_set(self,
+                           url: str
+                           ) -> Iterable[List[Any]]:
+        """ Yields the records of a query result set in pages while it
+        downloads """
+        result = call_salesforce(url=url,
+                                 method='GET',
+                                 session=self.session,
+                                 headers=self.headers,
+                                 stream=True
+                                 )
+        try:
+            yield from iter_json_array(
+                result.iter_content(chunk_size=QUERY_RESULT_CHUNK_SIZE),
+                page_size=QUERY_RESULT_PAGE_SIZE
+                )
+        finally:
+            result.close()
+
+    def _stream_query_results(self,
+                              url: str,
+                              result_ids: List[str]
+                              ) -> Iterable[List[Any]]:
+        """ Yields the pages of every result set of a query batch in
+        result set order. Up to QUERY_RESULT_CONCURRENCY result sets
+        download at once into bounded page queues.
+        """
+        if len(result_ids) <= 1:
+            for result_id in result_ids:
+                yield from self._stream_result_set(f'{url}/{result_id}')
+            return
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=min(QUERY_RESULT_CONCURRENCY, len(result_ids))
+                ) as pool:
+            stop = threading.Event()
+            try:
+                page_queues = [
+                    self._download_pages(
+                        pool,
+                        stop,
+                        partial(self._stream_result_set, f'{url}/{result_id}'))
+                    for result_id in result_ids]
+                for page_queue in page_queues:
+                    yield from self._drain_pages(page_queue)
+            finally:
+                # a consumer that stops early releases the downloads
+                stop.set()
+
+    def _stream_chunked_query_results(self,
+                                      job_id: str,
+                                      original_batch_id: str,
+                                      operation: str
+                                      ) -> Iterable[List[Any]]:
+        """ Yields the pages of the chunk batches of a PK chunked query as
+        the chunks complete. The job's batch list is checked with a backoff
+        from BATCH_POLL_MIN_WAIT to BATCH_POLL_MAX_WAIT seconds and up to
+        QUERY_RESULT_CONCURRENCY completed chunks download at once.
+        """
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=QUERY_RESULT_CONCURRENCY) as pool:
+            stop = threading.Event()
+            try:
+                finished = set()
+                wait = BATCH_POLL_MIN_WAIT
+                while True:
+                    page_queues = []
+                    pending = False
+                    for batch_info in self._get_job_batches(job_id=job_id):
+                        if batch_info['id'] == original_batch_id or \
+                                batch_info['id'] in finished:
+                            continue
+                        if batch_info['state'] in ['Failed', 'NotProcessed']:
+                            raise SalesforceGeneralError(
+                                '',
+                                batch_info['state'],
+                                batch_info['jobId'],
+                                batch_info.get('stateMessage', '')
+                                )
+                        if batch_info['state'] != 'Completed':
+                            pending = True
+                            continue
+                        finished.add(batch_info['id'])
+                        page_queues.append(self._download_pages(
+                            pool,
+                            stop,
+                            partial(self._get_batch_results,
+                                    job_id=job_id,
+                                    batch_id=batch_info['id'],
+                                    operation=operation
+                                    )))
+                    for page_queue in page_queues:
+                        yield from self._drain_pages(page_queue)
+                    if not pending:
+                        return
+                    if page_queues:
+                        wait = BATCH_POLL_MIN_WAIT
+                    else:
+                        sleep(wait)
+                        wait = min(wait * BATCH_POLL_BACKOFF,
+                                   BATCH_POLL_MAX_WAIT)
+            finally:
+                stop.set()
+
+    @staticmethod
+    def _download_pages(pool: concurrent.futures.Executor,
+                        stop: threading.Event,
+                        pages: Callable[[], Iterable[List[Any]]]
+                        ) -> queue.Queue:
+        """ Runs the page generator on the pool into a queue of at most
+        QUERY_RESULT_PREFETCH_PAGES pages, followed by None once it is
+        exhausted or by the exception it raised. Downloads give up once
+        stop is set.
+        """
+        page_queue: queue.Queue = queue.Queue(
+            maxsize=QUERY_RESULT_PREFETCH_PAGES)
+
+        def put(item: Any) -> bool:
+            while not stop.is_set():
+                try:
+                    page_queue.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def download() -> None:
+            if stop.is_set():
+                return
+            try:
+                for page in pages():
+                    if not put(page):
+                        return
+                put(None)
+            except Exception as exc:  # pylint: disable=broad-except
+                put(exc)
+
+        pool.submit(download)
+        return page_queue
+
+    @staticmethod
+    def _drain_pages(page_queue: queue.Queue,
+                     timeout: Optional[float] = None
+                     ) -> Iterable[List[Any]]:
+        """ Yields the pages of a download queue until its end, with a
+        timeout it returns when no page arrived in time """
+        while True:
+            try:
+                page = page_queue.get(timeout=timeout)
+            except queue.Empty:
+                return
+            if page is None:
+                page_queue.put(None)
+                return
+            if isinstance(page, Exception):
+                raise page
+            yield page
+
     def _get_batch_request_with_batch_results(self,
                                               job_id: str,
                                               batch_id: str,
@@ -311,6 +520,102 @@ class SFBulkType:
                 }]
         return result
 
+    def _monitor_batches(
+            self,
+            pool: concurrent.futures.Executor,
+            job_id: str,
+            batch_data: List[BulkDataAny],
+            operation: str,
+            include_detailed_results: bool = False,
+            encoded_data: Optional[List[str]] = None,
+            batch_callback: Optional[Callable[[BulkDataAny, List[Any]], None]] = None
+            ) -> List[List[Any]]:
+        """ Adds the batches of a job as the org's orchestrator grants
+        in-flight batch slots and waits for them with one status check of
+        the job's batch list per tick, the wait between ticks starts at
+        BATCH_POLL_MIN_WAIT and backs off to BATCH_POLL_MAX_WAIT. A batch
+        frees its slot once it is done and its results are fetched on the
+        pool. Returns the results of every batch in the order of the
+        batches.
+        """
+        batches: List[Dict[str, Any]] = []
+        pending: Dict[str, int] = {}
+        fetches: List[Any] = [None] * len(batch_data)
+        wait = BATCH_POLL_MIN_WAIT
+        granted = False
+        try:
+            while len(batches) < len(batch_data) or pending:
+                # without batches in flight the job waits for a slot, with
+                # batches in flight it only takes the slots that are free
+                while len(batches) < len(batch_data) and (
+                        granted or self.orchestrator.acquire_batch(
+                            self.object_name,
+                            timeout=0 if pending else None)):
+                    granted = False
+                    index = len(batches)
+                    batch = self._add_batch(
+                        job_id=job_id,
+                        data=batch_data[index],
+                        operation=operation,
+                        encoded=encoded_data[index]
+                        if encoded_data is not None else None
+                        )
+                    batches.append(batch)
+                    pending[batch['id']] = index
+                for batch_info in self._get_job_batches(job_id=job_id):
+                    index = pending.get(batch_info['id'])
+                    if index is None or batch_info['state'] not in ['Completed', 'Failed', 'NotProcessed']:
+                        continue
+                    del pending[batch_info['id']]
+                    self.orchestrator.release_batch()
+                    fetches[index] = pool.submit(
+                        self._fetch_batch_results,
+                        batch=batches[index],
+                        operation=operation,
+                        include_detailed_results=include_detailed_results,
+                        data=batch_data[index],
+                        batch_callback=batch_callback
+                        )
+                if pending:
+                    if len(batches) < len(batch_data):
+                        # waits a tick at most for a slot to free up
+                        granted = self.orchestrator.acquire_batch(
+                            self.object_name,
+                            timeout=wait
+                            )
+                    else:
+                        sleep(wait)
+                    wait = min(wait * BATCH_POLL_BACKOFF, BATCH_POLL_MAX_WAIT)
+        finally:
+            self.orchestrator.release_batch(len(pending) + int(granted))
+        return [fetch.result() for fetch in fetches]
+
+    def _fetch_batch_results(
+            self,
+            batch: Dict[str, Any],
+            operation: str,
+            include_detailed_results: bool = False,
+            data: Optional[BulkDataAny] = None,
+            batch_callback: Optional[Callable[[BulkDataAny, List[Any]], None]] = None
+            ) -> List[Any]:
+        """ Fetches the results of a finished batch and hands the records
+        of the batch with their results to the callback
+        """
+        if include_detailed_results:
+            result = self._get_batch_request_with_batch_results(
+                job_id=batch['jobId'],
+                batch_id=batch['id']
+                )
+        else:
+            result = self._get_batch_results(job_id=batch['jobId'],
+                                             batch_id=batch['id'],
+                                             operation=operation
+                                             )
+        result = [list(i) for i in result]
+        if batch_callback is not None and data is not None:
+            batch_callback(data, [x for i in result for x in i])
+        return result
+
     def _add_autosized_batches(
             self,
             data: BulkDataAny,
@@ -319,6 +624,21 @@ class SFBulkType:
             ) -> List[Any]:
         """
         Auto-create batches that respect bulk api V1 limits.
+        """
+        return [self._add_batch(job_id=job,
+                                data=records,
+                                operation=operation,
+                                encoded=encoded
+                                ) for records, encoded in
+                self._autosize_batches(data)]
+
+    @staticmethod
+    def _autosize_batches(
+            data: BulkDataAny
+            ) -> List[Any]:
+        """
+        Splits the records into batches that respect bulk api V1 limits,
+        returns the records of every batch with its json request body.
 
         bulk v1 api has following limits
         number of records <= 10000
@@ -350,33 +670,33 @@ class SFBulkType:
         record_limit = 10_000
         char_limit = 10_000_000
 
+        # every record is serialized once, the request body of a batch is
+        # joined from the serialized records the way json.dumps joins a list
         batches = []
         last_break = 0
-        record_count, char_count = 0, 0
+        fragments: List[str] = []
+        char_count = 0
         for i, record in enumerate(data):
+            fragment = json.dumps(record,
+                                  allow_nan=False
+                                  )
             # 2 is added to account for the enclosing `[]` for the first record
             # and the separator `, ` between records for subsequent records.
-            additional_chars = len(json.dumps(record,
-                                              default=str
-                                              )
-                                   ) + 2
+            additional_chars = len(fragment) + 2
             if any([
                 char_count + additional_chars > char_limit,
-                record_count == record_limit
+                len(fragments) == record_limit
                 ]
-                    ):
-                batches.append(data[last_break:i])
+                    ) and fragments:
+                batches.append((data[last_break:i], '[' + ', '.join(fragments) + ']'))
                 last_break = i
-                record_count, char_count = 0, 0
+                fragments, char_count = [], 0
+            fragments.append(fragment)
             char_count += additional_chars
-            record_count += 1
-        if last_break < len(data) - 1:
-            batches.append(data[last_break:])
+        if fragments:
+            batches.append((data[last_break:], '[' + ', '.join(fragments) + ']'))
 
-        return [self._add_batch(job_id=job,
-                                data=i,
-                                operation=operation
-                                ) for i in batches]
+        return batches
 
     # pylint: disable=R0913,line-too-long
     def _bulk_operation(
@@ -388,7 +708,11 @@ class SFBulkType:
             batch_size: Union[int, str] = 10000,
             wait: int = 5,
             bypass_results: bool = False,
-            include_detailed_results: bool = False
+            include_detailed_results: bool = False,
+            batches: Optional[List[BulkDataAny]] = None,
+            batch_callback: Optional[Callable[[BulkDataAny, List[Any]], None]] = None,
+            pk_chunking: Union[bool, int] = False,
+            pk_chunking_parent: Optional[str] = None
             ) -> Iterable[Iterable[Any]]:
         """ String together helper functions to create a complete
         end-to-end bulk API request
@@ -397,9 +721,25 @@ class SFBulkType:
         * data -- list of dict to be passed as a batch
         * use_serial -- Process batches in serial mode
         * external_id_field -- unique identifier field for upsert operations
-        * wait -- seconds to sleep between checking batch status
+        * wait -- seconds to sleep between checking the status of a query
+                  batch, the batches of data loading jobs are checked all
+                  at once with a backoff from BATCH_POLL_MIN_WAIT to
+                  BATCH_POLL_MAX_WAIT seconds
         * batch_size -- number of records to assign for each batch in the job
                         or `auto`
+        * batches -- records already partitioned into batches by the caller,
+                     each list is added as one batch and batch_size is
+                     ignored. Results are returned in the order of the
+                     batches.
+        * batch_callback -- called with the records and the results of
+                            every batch as soon as the batch is done
+        * pk_chunking -- queries only, let Salesforce split the query into
+                         batches by Id ranges, True for the default chunk
+                         size or the number of records per chunk. The
+                         results of the chunks are downloaded as they
+                         complete.
+        * pk_chunking_parent -- queries only, parent object to chunk a
+                                sharing or history object on
         """
         # check for batch size type since now it accepts both integers
         # & the string `auto`
@@ -420,39 +760,59 @@ class SFBulkType:
                                  10000
                                  )
 
-            with concurrent.futures.ThreadPoolExecutor() as pool:
+            with self.orchestrator.job(self.object_name):
 
                 job = self._create_job(operation=operation,
                                        use_serial=use_serial,
                                        external_id_field=external_id_field
                                        )
-                if batch_size == 'auto':
-                    batches = self._add_autosized_batches(job=job['id'],
-                                                          data=data,
-                                                          operation=operation
-                                                          )
+                encoded_data: Optional[List[str]] = None
+                if batch_size == 'auto' and batches is None:
+                    autosized = self._autosize_batches(data)
+                    batch_data = [records for records, _ in autosized]
+                    encoded_data = [encoded for _, encoded in autosized]
+                elif batches is not None:
+                    batch_data = [i for i in batches if i]
                 else:
                     batch_size = cast(int,
                                       batch_size
                                       )
+                    batch_data = [
+                        i for i in
+                        [data[i * batch_size:(i + 1) * batch_size]
+                         for i in range(len(data) // batch_size + 1)] if i]
+
+                if bypass_results:
+                    # batches whose results are bypassed are not followed,
+                    # they do not take in-flight batch slots
                     batches = [
                         self._add_batch(job_id=job['id'],
                                         data=i,
-                                        operation=operation
+                                        operation=operation,
+                                        encoded=encoded_data[index]
+                                        if encoded_data is not None else None
                                         )
-                        for i in
-                        [data[i * batch_size:(i + 1) * batch_size]
-                         for i in range(len(data) // batch_size + 1)] if i]
-
-                multi_thread_worker = partial(self.worker,
-                                              operation=operation,
-                                              wait=wait,
-                                              bypass_results=bypass_results,
-                                              include_detailed_results=include_detailed_results
-                                              )
-                list_of_results = pool.map(multi_thread_worker,
-                                           batches
-                                           )
+                        for index, i in enumerate(batch_data)]
+                    multi_thread_worker = partial(self.worker,
+                                                  operation=operation,
+                                                  wait=wait,
+                                                  bypass_results=bypass_results,
+                                                  include_detailed_results=include_detailed_results
+                                                  )
+                    list_of_results = self.orchestrator.pool.map(
+                        multi_thread_worker,
+                        batches
+                        )
+                else:
+                    list_of_results = self._monitor_batches(
+                        pool=self.orchestrator.pool,
+                        job_id=job['id'],
+                        batch_data=batch_data,
+                        operation=operation,
+                        include_detailed_results=include_detailed_results,
+                        encoded_data=encoded_data,
+                        batch_callback=batch_callback
+                        )
 
                 results = [x for sublist in list_of_results for i in
                            sublist for x in i] if not bypass_results else \
@@ -464,29 +824,44 @@ class SFBulkType:
                 self._close_job(job_id=job['id'])
 
         elif operation in ('query', 'queryAll'):
-            job = self._create_job(operation=operation,
-                                   use_serial=use_serial,
-                                   external_id_field=external_id_field
-                                   )
-
-            batch = self._add_batch(job_id=job['id'],
-                                    data=data,
-                                    operation=operation
-                                    )
-
-            self._close_job(job_id=job['id'])
-
-            batch_status = self._get_batch(job_id=batch['jobId'],
-                                           batch_id=batch['id']
-                                           )
+            with self.orchestrator.job(self.object_name):
+                job = self._create_job(operation=operation,
+                                       use_serial=use_serial,
+                                       external_id_field=external_id_field,
+                                       pk_chunking=pk_chunking,
+                                       pk_chunking_parent=pk_chunking_parent
+                                       )
 
-            while batch_status['state'] not in [
-                'Completed', 'Failed', 'NotProcessed'
-                ]:
-                sleep(wait)
-                batch_status = self._get_batch(job_id=batch['jobId'],
-                                               batch_id=batch['id']
-                                               )
+                self.orchestrator.acquire_batch(self.object_name)
+                try:
+                    batch = self._add_batch(job_id=job['id'],
+                                            data=data,
+                                            operation=operation
+                                            )
+
+                    if not pk_chunking:
+                        self._close_job(job_id=job['id'])
+
+                    # with pk chunking the original batch is set to
+                    # NotProcessed once Salesforce has added the batches
+                    # of every chunk to the job
+                    batch_status = self._get_batch(job_id=batch['jobId'],
+                                                   batch_id=batch['id']
+                                                   )
+
+                    while batch_status['state'] not in [
+                        'Completed', 'Failed', 'NotProcessed'
+                        ]:
+                        sleep(wait)
+                        batch_status = self._get_batch(
+                            job_id=batch['jobId'],
+                            batch_id=batch['id']
+                            )
+                finally:
+                    self.orchestrator.release_batch()
+
+                if pk_chunking:
+                    self._close_job(job_id=job['id'])
 
             if batch_status['state'] == 'Failed':
                 raise SalesforceGeneralError('',
@@ -494,10 +869,19 @@ class SFBulkType:
                                              batch_status['jobId'],
                                              batch_status['stateMessage']
                                              )
-            results = self._get_batch_results(job_id=batch['jobId'],
-                                              batch_id=batch['id'],
-                                              operation=operation
-                                              )
+            if pk_chunking and batch_status['state'] == 'NotProcessed':
+                # the job slot is released once the chunks are created,
+                # their results are downloaded lazily
+                results = self._stream_chunked_query_results(
+                    job_id=batch['jobId'],
+                    original_batch_id=batch['id'],
+                    operation=operation
+                    )
+            else:
+                results = self._get_batch_results(job_id=batch['jobId'],
+                                                  batch_id=batch['id'],
+                                                  operation=operation
+                                                  )
         return results
 
     # _bulk_operation wrappers to expose supported Salesforce bulk operations
@@ -507,13 +891,16 @@ class SFBulkType:
             batch_size: int = 10000,
             use_serial: bool = False,
             bypass_results: bool = False,
-            include_detailed_results: bool = False
+            include_detailed_results: bool = False,
+            batches: Optional[List[BulkDataAny]] = None
             ) -> Iterable[Any]:
         """ soft delete records
 
         Data is batched by 10,000 records by default. To pick a lower size
         pass smaller integer to `batch_size`. to let simple-salesforce pick
-        the appropriate limit dynamically, enter `batch_size='auto'`
+        the appropriate limit dynamically, enter `batch_size='auto'`.
+        Records already partitioned by the caller can be passed as `batches`,
+        a list of record lists with one batch per list.
         """
         results = self._bulk_operation(use_serial=use_serial,
                                        operation='delete',
@@ -521,7 +908,8 @@ class SFBulkType:
                                        batch_size=batch_size,
                                        bypass_results=bypass_results,
                                        include_detailed_results=
-                                       include_detailed_results
+                                       include_detailed_results,
+                                       batches=batches
                                        )
         return results
 
@@ -556,13 +944,18 @@ class SFBulkType:
             batch_size: int = 10000,
             use_serial: bool = False,
             bypass_results: bool = False,
-            include_detailed_results: bool = False
+            include_detailed_results: bool = False,
+            batches: Optional[List[BulkDataAny]] = None,
+            batch_callback: Optional[Callable[[BulkDataAny, List[Any]], None]] = None
             ) -> Iterable[Any]:
         """ upsert records based on a unique identifier
 
         Data is batched by 10,000 records by default. To pick a lower size
         pass smaller integer to `batch_size`. to let simple-salesforce pick
-        the appropriate limit dynamically, enter `batch_size='auto'`
+        the appropriate limit dynamically, enter `batch_size='auto'`.
+        Records already partitioned by the caller can be passed as `batches`,
+        a list of record lists with one batch per list. `batch_callback` is
+        called with the records and results of each batch once it is done.
         """
         results = self._bulk_operation(use_serial=use_serial,
                                        operation='upsert',
@@ -571,7 +964,9 @@ class SFBulkType:
                                        batch_size=batch_size,
                                        bypass_results=bypass_results,
                                        include_detailed_results=
-                                       include_detailed_results
+                                       include_detailed_results,
+                                       batches=batches,
+                                       batch_callback=batch_callback
                                        )
         return results
 
@@ -627,12 +1022,24 @@ class SFBulkType:
             self,
             data: BulkDataStr,
             lazy_operation: bool = False,
-            wait: int = 5
+            wait: int = 5,
+            pk_chunking: Union[bool, int] = False,
+            pk_chunking_parent: Optional[str] = None
             ) -> Iterable[Any]:
-        """ bulk query """
+        """ bulk query
+
+        With `pk_chunking` Salesforce splits the query into batches by
+        Id ranges, True for the default chunk size of 100,000 records or
+        the number of records per chunk, up to 250,000.
+        `pk_chunking_parent` names the parent object to chunk a sharing or
+        history object on. The chunks are downloaded concurrently as they
+        complete and their pages are yielded in completion order.
+        """
         results = self._bulk_operation(operation='query',
                                        data=data,
-                                       wait=wait
+                                       wait=wait,
+                                       pk_chunking=pk_chunking,
+                                       pk_chunking_parent=pk_chunking_parent
                                        )
 
         if lazy_operation:
@@ -644,12 +1051,24 @@ class SFBulkType:
             self,
             data: BulkDataStr,
             lazy_operation: bool = False,
-            wait: int = 5
+            wait: int = 5,
+            pk_chunking: Union[bool, int] = False,
+            pk_chunking_parent: Optional[str] = None
             ) -> Iterable[Any]:
-        """ bulk queryAll """
+        """ bulk queryAll
+
+        With `pk_chunking` Salesforce splits the query into batches by
+        Id ranges, True for the default chunk size of 100,000 records or
+        the number of records per chunk, up to 250,000.
+        `pk_chunking_parent` names the parent object to chunk a sharing or
+        history object on. The chunks are downloaded concurrently as they
+        complete and their pages are yielded in completion order.
+        """
         results = self._bulk_operation(operation='queryAll',
                                        data=data,
-                                       wait=wait
+                                       wait=wait,
+                                       pk_chunking=pk_chunking,
+                                       pk_chunking_parent=pk_chunking_parent
                                        )
 
         if lazy_operation:
@@ -0,0 +1,270 @@
+""" Process-wide coordination of Bulk API v1 jobs """
+
+import concurrent.futures
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from time import monotonic
+from typing import Any, Deque, Dict, Iterator, List, Optional
+from urllib.parse import urlparse
+
+# an org processes a limited number of bulk batches at once, jobs beyond
+# these caps wait in the orchestrator instead of queueing in the org. These
+# are the defaults, an org's caps are set with BulkOrchestrator.configure
+MAX_OPEN_JOBS = 10
+MAX_IN_FLIGHT_BATCHES = 50
+
+
+class FairSlots:
+    """ Counting semaphore whose waiters are granted slots round robin
+    across keys, first come first served within a key """
+
+    def __init__(self,
+                 limit: int,
+                 condition: threading.Condition
+                 ):
+        self.limit = limit
+        self.used = 0
+        self.condition = condition
+        # key -> tickets of the waiters of the key, the key granted next
+        # comes first
+        self.waiters: Dict[str, Deque[List[bool]]] = OrderedDict()
+
+    def acquire(self,
+                key: str,
+                timeout: Optional[float] = None
+                ) -> bool:
+        """ Waits up to timeout seconds, forever with None, for a slot.
+        Returns whether the slot was granted. """
+        with self.condition:
+            ticket = [False]
+            self.waiters.setdefault(key, deque()).append(ticket)
+            self._grant()
+            deadline = None if timeout is None else monotonic() + timeout
+            while not ticket[0]:
+                remaining = None if deadline is None else \
+                    deadline - monotonic()
+                if remaining is not None and remaining <= 0:
+                    tickets = self.waiters[key]
+                    tickets.remove(ticket)
+                    if not tickets:
+                        del self.waiters[key]
+                    return False
+                self.condition.wait(remaining)
+            return True
+
+    def release(self,
+                count: int = 1
+                ) -> None:
+        if count <= 0:
+            return
+        with self.condition:
+            self.used -= count
+            self._grant()
+
+    def resize(self,
+               limit: int
+               ) -> None:
+        """ Changes the number of slots, slots in use beyond a lower limit
+        are kept until they are released """
+        with self.condition:
+            self.limit = limit
+            self._grant()
+
+    def depth(self) -> Dict[str, int]:
+        """ Number of waiters per key """
+        with self.condition:
+            return {key: len(tickets) for key, tickets in
+                    self.waiters.items()}
+
+    def _grant(self) -> None:
+        granted = False
+        while self.used < self.limit and self.waiters:
+            key = next(iter(self.waiters))
+            tickets = self.waiters.pop(key)
+            tickets.popleft()[0] = True
+            self.used += 1
+            granted = True
+            if tickets:
+                # the key waits behind every other key for its next slot
+                self.waiters[key] = tickets
+        if granted:
+            self.condition.notify_all()
+
+
+class BulkOrchestrator:
+    """ Caps the open jobs and the in-flight batches of every SFBulkType of
+    one org, whichever SFBulkHandler created it. Jobs and batches waiting
+    for a slot are served round robin across objects. Also runs the result
+    downloads of the org's jobs on one shared pool and keeps queue depth
+    and job timing metrics per object.
+    """
+    _instances: Dict[str, "BulkOrchestrator"] = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def getinstance(cls,
+                    bulk_url: Optional[str]
+                    ) -> "BulkOrchestrator":
+        """ The orchestrator of the org the bulk url belongs to """
+        org = urlparse(bulk_url).netloc if bulk_url else ''
+        with cls._instances_lock:
+            if org not in cls._instances:
+                cls._instances[org] = BulkOrchestrator(org)
+            return cls._instances[org]
+
+    @classmethod
+    def configure(cls,
+                  bulk_url: Optional[str],
+                  max_open_jobs: int = MAX_OPEN_JOBS,
+                  max_in_flight_batches: int = MAX_IN_FLIGHT_BATCHES
+                  ) -> "BulkOrchestrator":
+        """ Sets the caps of the org the bulk url belongs to and returns its
+        orchestrator """
+        org = urlparse(bulk_url).netloc if bulk_url else ''
+        with cls._instances_lock:
+            if org not in cls._instances:
+                cls._instances[org] = BulkOrchestrator(org,
+                                                       max_open_jobs,
+                                                       max_in_flight_batches)
+            else:
+                cls._instances[org].set_limits(max_open_jobs,
+                                               max_in_flight_batches)
+            return cls._instances[org]
+
+    @classmethod
+    def instances(cls) -> List["BulkOrchestrator"]:
+        with cls._instances_lock:
+            return list(cls._instances.values())
+
+    def __init__(self,
+                 org: str,
+                 max_open_jobs: int = MAX_OPEN_JOBS,
+                 max_in_flight_batches: int = MAX_IN_FLIGHT_BATCHES
+                 ):
+        self._check_limits(max_open_jobs, max_in_flight_batches)
+        self.org = org
+        self.condition = threading.Condition()
+        self.jobs = FairSlots(max_open_jobs, self.condition)
+        self.batches = FairSlots(max_in_flight_batches, self.condition)
+        self.pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_in_flight_batches,
+            thread_name_prefix='bulk-' + org
+            )
+        # object -> jobs, batches, seconds waited for a job slot, seconds
+        # the jobs held it and the deepest queue seen
+        self.object_metrics: Dict[str, Dict[str, Any]] = {}
+
+    def set_limits(self,
+                   max_open_jobs: int,
+                   max_in_flight_batches: int
+                   ) -> None:
+        """ Changes the caps, the result download pool keeps its size """
+        self._check_limits(max_open_jobs, max_in_flight_batches)
+        self.jobs.resize(max_open_jobs)
+        self.batches.resize(max_in_flight_batches)
+
+    @staticmethod
+    def _check_limits(max_open_jobs: int,
+                      max_in_flight_batches: int
+                      ) -> None:
+        if max_open_jobs < 1 or max_in_flight_batches < 1:
+            raise ValueError('bulk job and batch caps should be at least 1')
+
+    @contextmanager
+    def job(self,
+            object_name: str
+            ) -> Iterator[None]:
+        """ Holds one of the org's job slots for the duration of the block
+        """
+        queued = monotonic()
+        self._observe_depth(object_name)
+        self.jobs.acquire(object_name)
+        started = monotonic()
+        try:
+            yield
+        finally:
+            self.jobs.release()
+            with self.condition:
+                metrics = self._metrics_of(object_name)
+                metrics['jobs'] += 1
+                metrics['queued_seconds'] += started - queued
+                metrics['max_queued_seconds'] = max(
+                    metrics['max_queued_seconds'], started - queued)
+                metrics['job_seconds'] += monotonic() - started
+
+    def acquire_batch(self,
+                      object_name: str,
+                      timeout: Optional[float] = None
+                      ) -> bool:
+        """ Waits up to timeout seconds, forever with None, for an
+        in-flight batch slot """
+        self._observe_depth(object_name)
+        if not self.batches.acquire(object_name, timeout):
+            return False
+        with self.condition:
+            self._metrics_of(object_name)['batches'] += 1
+        return True
+
+    def release_batch(self,
+                      count: int = 1
+                      ) -> None:
+        self.batches.release(count)
+
+    def metrics(self) -> Dict[str, Any]:
+        """ Current slot usage and queue depth of the org and the job
+        timings per object """
+        with self.condition:
+            return {
+                'org': self.org,
+                'open_jobs': self.jobs.used,
+                'max_open_jobs': self.jobs.limit,
+                'in_flight_batches': self.batches.used,
+                'max_in_flight_batches': self.batches.limit,
+                'queued_jobs': self.jobs.depth(),
+                'queued_batches': self.batches.depth(),
+                'objects': {object_name: dict(metrics) for
+                            object_name, metrics in
+                            self.object_metrics.items()}
+                }
+
+    @classmethod
+    def print_metrics(cls) -> None:
+        for orchestrator in cls.instances():
+            metrics = orchestrator.metrics()
+            for object_name, object_metrics in metrics['objects'].items():
+                if object_metrics['jobs'] == 0:
+                    continue
+                print('bulk jobs of {}: {} jobs, {} batches, '
+                      'waited {:.1f}s for a job slot (longest {:.1f}s), '
+                      'deepest queue {}, jobs ran {:.1f}s'.format(
+                          object_name,
+                          object_metrics['jobs'],
+                          object_metrics['batches'],
+                          object_metrics['queued_seconds'],
+                          object_metrics['max_queued_seconds'],
+                          object_metrics['max_queue_depth'],
+                          object_metrics['job_seconds']
+                          ))
+
+    def _metrics_of(self,
+                    object_name: str
+                    ) -> Dict[str, Any]:
+        return self.object_metrics.setdefault(object_name, {
+            'jobs': 0,
+            'batches': 0,
+            'queued_seconds': 0.0,
+            'max_queued_seconds': 0.0,
+            'job_seconds': 0.0,
+            'max_queue_depth': 0
+            })
+
+    def _observe_depth(self,
+                       object_name: str
+                       ) -> None:
+        with self.condition:
+            metrics = self._metrics_of(object_name)
+            depth = sum(self.jobs.depth().values()) + \
+                sum(self.batches.depth().values())
+            metrics['max_queue_depth'] = max(metrics['max_queue_depth'],
+                                             depth)
@@ -5,16 +5,19 @@ import json
 import itertools
 import random
 import re
+import threading
 import unittest
 from unittest import mock
 from unittest.mock import patch
 
 import requests
 import responses
-from simple_salesforce import tests
-from simple_salesforce.api import Salesforce
-from simple_salesforce.bulk import SFBulkType
-from simple_salesforce.exceptions import SalesforceGeneralError
+from src.cme_data_migration_tool.simple_salesforce_dmt import tests
+from src.cme_data_migration_tool.simple_salesforce_dmt.api import Salesforce
+from src.cme_data_migration_tool.simple_salesforce_dmt.bulk import \
+    QUERY_RESULT_CONCURRENCY, QUERY_RESULT_PREFETCH_PAGES, SFBulkType
+from src.cme_data_migration_tool.simple_salesforce_dmt.exceptions import \
+    SalesforceGeneralError
 
 
 class TestSFBulkHandler(unittest.TestCase):
@@ -37,7 +40,7 @@ class TestSFBulkType(unittest.TestCase):
     """Test SFBulkType"""
 
     def setUp(self):
-        request_patcher = patch('simple_salesforce.api.requests')
+        request_patcher = patch('src.cme_data_migration_tool.simple_salesforce_dmt.api.requests')
         self.mockrequest = request_patcher.start()
         self.addCleanup(request_patcher.stop)
         self.expected = [
@@ -107,14 +110,9 @@ class TestSFBulkType(unittest.TestCase):
         )
         responses.add(
             responses.GET,
-            re.compile(r'^https://[^/job].*/job/Job-1/batch/Batch-1$'),
-            body='{"id": "Batch-1","jobId": "Job-1","state": "InProgress"}',
-            status=http.OK
-        )
-        responses.add(
-            responses.GET,
-            re.compile(r'^https://[^/job].*/job/Job-1/batch/Batch-1$'),
-            body='{"id": "Batch-1","jobId": "Job-1","state": "Completed"}',
+            re.compile(r'^https://[^/job].*/job/Job-1/batch$'),
+            body='{"batchInfo": [{"id": "Batch-1","jobId": "Job-1",'
+            '"state": "Completed"}]}',
             status=http.OK
         )
         responses.add(
@@ -165,14 +163,9 @@ class TestSFBulkType(unittest.TestCase):
         )
         responses.add(
             responses.GET,
-            re.compile(r'^https://[^/job].*/job/Job-1/batch/Batch-1$'),
-            body='{"id": "Batch-1","jobId": "Job-1","state": "InProgress"}',
-            status=http.OK
-        )
-        responses.add(
-            responses.GET,
-            re.compile(r'^https://[^/job].*/job/Job-1/batch/Batch-1$'),
-            body='{"id": "Batch-1","jobId": "Job-1","state": "Completed"}',
+            re.compile(r'^https://[^/job].*/job/Job-1/batch$'),
+            body='{"batchInfo": [{"id": "Batch-1","jobId": "Job-1",'
+            '"state": "Completed"}]}',
             status=http.OK
         )
         responses.add(
@@ -230,14 +223,9 @@ class TestSFBulkType(unittest.TestCase):
         )
         responses.add(
             responses.GET,
-            re.compile(r'^https://[^/job].*/job/Job-1/batch/Batch-1$'),
-            body='{"id": "Batch-1","jobId": "Job-1","state": "InProgress"}',
-            status=http.OK
-        )
-        responses.add(
-            responses.GET,
-            re.compile(r'^https://[^/job].*/job/Job-1/batch/Batch-1$'),
-            body='{"id": "Batch-1","jobId": "Job-1","state": "Completed"}',
+            re.compile(r'^https://[^/job].*/job/Job-1/batch$'),
+            body='{"batchInfo": [{"id": "Batch-1","jobId": "Job-1",'
+            '"state": "Completed"}]}',
             status=http.OK
         )
         responses.add(
@@ -297,14 +285,9 @@ class TestSFBulkType(unittest.TestCase):
         )
         responses.add(
             responses.GET,
-            re.compile(r'^https://[^/job].*/job/Job-1/batch/Batch-1$'),
-            body='{"id": "Batch-1","jobId": "Job-1","state": "InProgress"}',
-            status=http.OK
-        )
-        responses.add(
-            responses.GET,
-            re.compile(r'^https://[^/job].*/job/Job-1/batch/Batch-1$'),
-            body='{"id": "Batch-1","jobId": "Job-1","state": "Completed"}',
+            re.compile(r'^https://[^/job].*/job/Job-1/batch$'),
+            body='{"batchInfo": [{"id": "Batch-1","jobId": "Job-1",'
+            '"state": "Completed"}]}',
             status=http.OK
         )
         responses.add(
@@ -620,9 +603,9 @@ class TestSFBulkType(unittest.TestCase):
         self.assertEqual(self.expected_query, contact)
 
     @responses.activate
-    @mock.patch('simple_salesforce.bulk.SFBulkType._add_autosized_batches')
-    def test_bulk_operation_auto_batch_size(self, add_autosized_batches):
-        """Test that batch_size="auto" leads to using _add_autosized_batches"""
+    @mock.patch('src.cme_data_migration_tool.simple_salesforce_dmt.bulk.SFBulkType._autosize_batches')
+    def test_bulk_operation_auto_batch_size(self, autosize_batches):
+        """Test that batch_size="auto" leads to using _autosize_batches"""
         session = requests.Session()
         client = Salesforce(session_id=tests.SESSION_ID,
                             instance_url=tests.SERVER_URL,
@@ -651,20 +634,24 @@ class TestSFBulkType(unittest.TestCase):
             'FirstName': 'Bob',
             'LastName': 'x'
         }]
-        add_autosized_batches.return_value = []
-        client.bulk.Contact._bulk_operation(  # pylint: disable=protected-access
-            operation, data, batch_size="auto"
-        )
-        add_autosized_batches.assert_called_once_with(
-            job='Job-1', data=data, operation=operation
-        )
+        autosize_batches.return_value = [(data, 'encoded')]
+        with mock.patch.object(SFBulkType, '_monitor_batches',
+                               return_value=[]) as monitor_batches:
+            client.bulk.Contact._bulk_operation(  # pylint: disable=protected-access
+                operation, data, batch_size="auto"
+            )
+        autosize_batches.assert_called_once_with(data)
+        # the autosized batches are added with their serialized bodies
+        self.assertEqual([data], monitor_batches.call_args.kwargs['batch_data'])
+        self.assertEqual(['encoded'],
+                         monitor_batches.call_args.kwargs['encoded_data'])
 
-    @mock.patch('simple_salesforce.bulk.SFBulkType._add_batch')
+    @mock.patch('src.cme_data_migration_tool.simple_salesforce_dmt.bulk.SFBulkType._add_batch')
     def test_add_autosized_batches(self, add_batch):
         """Test that _add_autosized_batches batches all records correctly"""
         # _add_autosized_batches passes the return values from add_batch, so we
         # can pass the data it was given back so that we can test it
-        add_batch.side_effect = lambda job_id, data, operation: data
+        add_batch.side_effect = lambda job_id, data, operation, encoded: data
         sf_bulk_type = SFBulkType(None, None, None, None)
         data = [
             # Expected serialized record size of 13 to 1513. Idea is that
@@ -681,6 +668,11 @@ class TestSFBulkType(unittest.TestCase):
         self.assertEqual(len(data), len(reconstructed_data))
         self.assertEqual(data, list(itertools.chain(*result)))
 
+        # the request bodies are the batches serialized as one json list
+        for call in add_batch.call_args_list:
+            self.assertEqual(json.dumps(call.kwargs['data']),
+                             call.kwargs['encoded'])
+
         for i, batch in enumerate(result):
             record_count = len(batch)
             size_in_bytes = len(json.dumps(batch))
@@ -696,3 +688,391 @@ class TestSFBulkType(unittest.TestCase):
                 (size_in_bytes + len(json.dumps(result[i + 1][0])) + 2
                     > 10_000_000)
             )
+
+    def test_autosize_batches_keeps_a_last_single_record(self):
+        """A last batch of one record is not dropped"""
+        data = [{'key': i} for i in range(10_001)]
+        batches = SFBulkType._autosize_batches(data)  # pylint: disable=protected-access
+        self.assertEqual([10_000, 1], [len(records) for records, _ in batches])
+        self.assertEqual([{'key': 10_000}], batches[-1][0])
+        for records, encoded in batches:
+            self.assertEqual(json.dumps(records), encoded)
+
+    def test_autosize_batches_single_record(self):
+        batches = SFBulkType._autosize_batches([{'key': 'value'}])  # pylint: disable=protected-access
+        self.assertEqual([([{'key': 'value'}], '[{"key": "value"}]')], batches)
+
+    @patch('src.cme_data_migration_tool.simple_salesforce_dmt.bulk.json.dumps',
+           wraps=json.dumps)
+    def test_autosize_batches_serializes_once(self, dumps):
+        """Every record is serialized once, the batch bodies are joined from
+        the serialized records"""
+        data = [{'key': 'value' * 1000} for _ in range(3000)]
+        batches = SFBulkType._autosize_batches(data)  # pylint: disable=protected-access
+        self.assertEqual(len(data), dumps.call_count)
+        self.assertGreater(len(batches), 1)
+        self.assertEqual(data, [record for records, _ in batches
+                                for record in records])
+        for records, encoded in batches:
+            self.assertEqual(json.dumps(records), encoded)
+            self.assertLessEqual(len(encoded), 10_000_000)
+
+
+class TestStreamQueryResults(unittest.TestCase):
+    """Test the concurrent download of the result sets of a query batch"""
+
+    url = 'https://na15.salesforce.com/services/async/52.0/job/Job-1/batch/' \
+          'Batch-1/result'
+
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.started = []
+        self.closed = []
+        self.pages = 0
+        self.sf_bulk_type = SFBulkType('Contact', None, None, None)
+
+    def result_set(self, pages=None, error=None):
+        """_stream_result_set replacement yielding pages [url, page] and
+        recording which result sets started and were closed"""
+        def stream_result_set(sf_bulk_type, url):  # pylint: disable=unused-argument
+            with self.lock:
+                self.started.append(url)
+            try:
+                page = 0
+                while pages is None or page < pages:
+                    with self.lock:
+                        self.pages += 1
+                    yield [(url.rsplit('/', 1)[1], page)]
+                    page += 1
+                if error is not None:
+                    raise error
+            finally:
+                with self.lock:
+                    self.closed.append(url)
+        return patch.object(SFBulkType, '_stream_result_set',
+                            stream_result_set)
+
+    def test_result_set_order(self):
+        """Pages are yielded in result set order while the result sets
+        download concurrently"""
+        result_ids = [f'752x00000000{i}' for i in range(6)]
+        with self.result_set(pages=3):
+            pages = list(self.sf_bulk_type._stream_query_results(  # pylint: disable=protected-access
+                self.url, result_ids))
+        self.assertEqual([[(result_id, page)] for result_id in result_ids
+                          for page in range(3)], pages)
+        self.assertCountEqual(self.started, self.closed)
+
+    def test_single_result_set(self):
+        with self.result_set(pages=2):
+            pages = list(self.sf_bulk_type._stream_query_results(  # pylint: disable=protected-access
+                self.url, ['752x000000001']))
+        self.assertEqual([[('752x000000001', 0)], [('752x000000001', 1)]],
+                         pages)
+
+    def test_error_is_raised_to_the_consumer(self):
+        with self.result_set(pages=1,
+                             error=ValueError('incomplete json array')):
+            results = self.sf_bulk_type._stream_query_results(  # pylint: disable=protected-access
+                self.url, ['752x000000001', '752x000000002'])
+            self.assertEqual([('752x000000001', 0)], next(results))
+            with self.assertRaises(ValueError):
+                next(results)
+
+    def test_early_stopping_consumer(self):
+        """A consumer that stops early shuts the downloads down, result sets
+        hold a bounded number of pages meanwhile"""
+        threads = set(threading.enumerate())
+        result_ids = [f'752x00000000{i}' for i in range(8)]
+        with self.result_set():
+            results = self.sf_bulk_type._stream_query_results(  # pylint: disable=protected-access
+                self.url, result_ids)
+            self.assertEqual([(result_ids[0], 0)], next(results))
+            results.close()
+        self.assertEqual(set(), set(threading.enumerate()) - threads)
+        self.assertLessEqual(len(self.started), QUERY_RESULT_CONCURRENCY)
+        self.assertCountEqual(self.started, self.closed)
+        self.assertLessEqual(
+            self.pages, len(self.started) * (QUERY_RESULT_PREFETCH_PAGES + 2))
+
+
+class TestPKChunking(unittest.TestCase):
+    """Test PK chunked queries, the original batch is set to NotProcessed
+    and the chunk batches are downloaded as they complete"""
+
+    def setUp(self):
+        request_patcher = patch(
+            'src.cme_data_migration_tool.simple_salesforce_dmt.api.requests')
+        request_patcher.start()
+        self.addCleanup(request_patcher.stop)
+        sleep_patcher = patch(
+            'src.cme_data_migration_tool.simple_salesforce_dmt.bulk.sleep')
+        self.sleep = sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
+        self.client = Salesforce(session_id=tests.SESSION_ID,
+                                 instance_url=tests.SERVER_URL,
+                                 session=requests.Session())
+
+    @staticmethod
+    def add_job(original_states, chunk_ids):
+        responses.add(
+            responses.POST,
+            re.compile(r'^https://[^/job].*/job$'),
+            body='{"apiVersion": 42.0, "concurrencyMode": "Parallel",'
+            '"contentType": "JSON","id": "Job-1","object": "Contact",'
+            '"operation": "query","state": "Open"}',
+            status=http.OK)
+        responses.add(
+            responses.POST,
+            re.compile(r'^https://[^/job].*/job/Job-1/batch$'),
+            body='{"id": "Batch-1","jobId": "Job-1","state": "Queued"}',
+            status=http.OK
+        )
+        for state in original_states:
+            responses.add(
+                responses.GET,
+                re.compile(r'^https://[^/job].*/job/Job-1/batch/Batch-1$'),
+                body=f'{{"id": "Batch-1","jobId": "Job-1","state": "{state}"}}',
+                status=http.OK
+            )
+        responses.add(
+            responses.POST,
+            re.compile(r'^https://[^/job].*/job/Job-1$'),
+            body='{"apiVersion" : 42.0, "concurrencyMode" : "Parallel",'
+            '"contentType" : "JSON","id" : "Job-1","object" : "Contact",'
+            '"operation" : "query","state" : "Closed"}',
+            status=http.OK
+        )
+        for chunk_id in chunk_ids:
+            responses.add(
+                responses.GET,
+                re.compile(
+                    rf'^https://[^/job].*/job/Job-1/batch/{chunk_id}/result$'),
+                body=f'["752{chunk_id}"]',
+                status=http.OK
+            )
+            responses.add(
+                responses.GET,
+                re.compile(rf'^https://[^/job].*/job/Job-1/batch/{chunk_id}'
+                           rf'/result/752{chunk_id}$'),
+                body=f'[{{"Id": "{chunk_id}-1"}},{{"Id": "{chunk_id}-2"}}]',
+                status=http.OK
+            )
+
+    @staticmethod
+    def add_batch_list(states):
+        """The batch list answers once for every dict of chunk states, the
+        original batch is listed as NotProcessed"""
+        for chunk_states in states:
+            responses.add(
+                responses.GET,
+                re.compile(r'^https://[^/job].*/job/Job-1/batch$'),
+                body=json.dumps({'batchInfo': [
+                    {'id': batch_id, 'jobId': 'Job-1', 'state': state}
+                    for batch_id, state in
+                    dict({'Batch-1': 'NotProcessed'}, **chunk_states).items()
+                    ]}),
+                status=http.OK
+            )
+
+    def requests_to(self, method, pattern):
+        return [call.request for call in responses.calls
+                if call.request.method == method and
+                re.search(pattern, call.request.url)]
+
+    @responses.activate
+    def test_chunks_complete_over_several_polls(self):
+        """The original batch goes NotProcessed, the chunks are downloaded
+        as they complete and the results of the original batch are never
+        fetched"""
+        self.add_job(['Queued', 'NotProcessed'], ['Chunk-1', 'Chunk-2'])
+        self.add_batch_list([
+            {'Chunk-1': 'Queued', 'Chunk-2': 'InProgress'},
+            {'Chunk-1': 'Completed', 'Chunk-2': 'InProgress'},
+            {'Chunk-1': 'Completed', 'Chunk-2': 'Completed'}])
+        result = self.client.bulk.Contact.query(
+            'SELECT Id FROM Contact', pk_chunking=True)
+        self.assertEqual(['Chunk-1-1', 'Chunk-1-2', 'Chunk-2-1', 'Chunk-2-2'],
+                         [record['Id'] for record in result])
+        self.assertEqual(3, len(self.requests_to('GET', r'/job/Job-1/batch$')))
+        self.assertEqual(1, len(self.requests_to('POST', r'/job/Job-1$')))
+        self.assertFalse(self.requests_to('GET', r'/batch/Batch-1/result'))
+        # one wait for the original batch, one while no chunk completed
+        self.assertEqual([5, 0.5],
+                         [call.args[0] for call in self.sleep.call_args_list])
+
+    @responses.activate
+    def test_failed_chunk(self):
+        self.add_job(['NotProcessed'], ['Chunk-1'])
+        self.add_batch_list([{'Chunk-1': 'Completed', 'Chunk-2': 'Failed'}])
+        with self.assertRaises(SalesforceGeneralError):
+            self.client.bulk.Contact.query('SELECT Id FROM Contact',
+                                           pk_chunking=True)
+
+    @responses.activate
+    def test_pk_chunking_header(self):
+        """The header is only sent when the job is created"""
+        for pk_chunking, pk_chunking_parent, header in [
+                (True, None, 'true'),
+                (50000, None, 'chunkSize=50000'),
+                (50000, 'Account', 'chunkSize=50000; parent=Account')]:
+            responses.reset()
+            self.add_job(['NotProcessed'], ['Chunk-1'])
+            self.add_batch_list([{'Chunk-1': 'Completed'}])
+            self.client.bulk.AccountShare.query(
+                'SELECT Id FROM AccountShare', pk_chunking=pk_chunking,
+                pk_chunking_parent=pk_chunking_parent)
+            self.assertEqual(
+                header, self.requests_to('POST', r'/job$')[0]
+                .headers['Sforce-Enable-PKChunking'])
+            for request in self.requests_to('GET', r'/batch'):
+                self.assertNotIn('Sforce-Enable-PKChunking', request.headers)
+
+    @responses.activate
+    def test_without_pk_chunking(self):
+        self.add_job(['Completed'], [])
+        responses.add(
+            responses.GET,
+            re.compile(r'^https://[^/job].*/job/Job-1/batch/Batch-1/result$'),
+            body='[]',
+            status=http.OK
+        )
+        self.assertEqual([], self.client.bulk.Contact.query(
+            'SELECT Id FROM Contact'))
+        self.assertNotIn('Sforce-Enable-PKChunking',
+                         self.requests_to('POST', r'/job$')[0].headers)
+
+
+class TestMonitorBatches(unittest.TestCase):
+    """Test the status checks of the batches of data loading jobs"""
+
+    def setUp(self):
+        request_patcher = patch(
+            'src.cme_data_migration_tool.simple_salesforce_dmt.api.requests')
+        request_patcher.start()
+        self.addCleanup(request_patcher.stop)
+        sleep_patcher = patch(
+            'src.cme_data_migration_tool.simple_salesforce_dmt.bulk.sleep')
+        self.sleep = sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
+        self.client = Salesforce(session_id=tests.SESSION_ID,
+                                 instance_url=tests.SERVER_URL,
+                                 session=requests.Session())
+
+    @staticmethod
+    def add_job(batch_ids):
+        responses.add(
+            responses.POST,
+            re.compile(r'^https://[^/job].*/job$'),
+            body='{"apiVersion": 42.0, "concurrencyMode": "Parallel",'
+            '"contentType": "JSON","id": "Job-1","object": "Contact",'
+            '"operation": "insert","state": "Open"}',
+            status=http.OK)
+        for batch_id in batch_ids:
+            responses.add(
+                responses.POST,
+                re.compile(r'^https://[^/job].*/job/Job-1/batch$'),
+                body=f'{{"id": "{batch_id}","jobId": "Job-1",'
+                '"state": "Queued"}',
+                status=http.OK
+            )
+            responses.add(
+                responses.GET,
+                re.compile(
+                    rf'^https://[^/job].*/job/Job-1/batch/{batch_id}/result$'),
+                body=f'[{{"success": true,"created": true,"id": "{batch_id}",'
+                '"errors": []}]',
+                status=http.OK
+            )
+        responses.add(
+            responses.POST,
+            re.compile(r'^https://[^/job].*/job/Job-1$'),
+            body='{"apiVersion" : 42.0, "concurrencyMode" : "Parallel",'
+            '"contentType" : "JSON","id" : "Job-1","object" : "Contact",'
+            '"operation" : "insert","state" : "Closed"}',
+            status=http.OK
+        )
+
+    @staticmethod
+    def add_batch_list(states):
+        """The batch list answers once for every dict of batch states"""
+        for batch_states in states:
+            responses.add(
+                responses.GET,
+                re.compile(r'^https://[^/job].*/job/Job-1/batch$'),
+                body=json.dumps({'batchInfo': [
+                    {'id': batch_id, 'jobId': 'Job-1', 'state': state}
+                    for batch_id, state in batch_states.items()]}),
+                status=http.OK
+            )
+
+    def batch_list_calls(self):
+        return [call for call in responses.calls
+                if call.request.method == 'GET' and
+                call.request.url.endswith('/job/Job-1/batch')]
+
+    @responses.activate
+    def test_backoff(self):
+        """The job's batch list is checked once per tick with a growing
+        wait"""
+        self.add_job(['Batch-1'])
+        self.add_batch_list([{'Batch-1': 'Queued'}] +
+                            [{'Batch-1': 'InProgress'}] * 3 +
+                            [{'Batch-1': 'Completed'}])
+        result = self.client.bulk.Contact.insert([{'LastName': 'x'}])
+        self.assertEqual(['Batch-1'], [i['id'] for i in result])
+        self.assertEqual(5, len(self.batch_list_calls()))
+        self.assertEqual([0.5, 0.75, 1.125, 1.6875],
+                         [call.args[0] for call in self.sleep.call_args_list])
+
+    @responses.activate
+    @patch('src.cme_data_migration_tool.simple_salesforce_dmt.bulk.'
+           'BATCH_POLL_MAX_WAIT', 1)
+    def test_backoff_is_capped(self):
+        self.add_job(['Batch-1'])
+        self.add_batch_list([{'Batch-1': 'InProgress'}] * 5 +
+                            [{'Batch-1': 'Completed'}])
+        self.client.bulk.Contact.insert([{'LastName': 'x'}])
+        self.assertEqual([0.5, 0.75, 1, 1, 1],
+                         [call.args[0] for call in self.sleep.call_args_list])
+
+    @responses.activate
+    def test_one_status_check_for_all_batches(self):
+        """The batches of a job are checked with one request per tick, not
+        one per batch"""
+        self.add_job(['Batch-1', 'Batch-2', 'Batch-3'])
+        self.add_batch_list([
+            {'Batch-1': 'Completed', 'Batch-2': 'InProgress',
+             'Batch-3': 'Queued'},
+            {'Batch-1': 'Completed', 'Batch-2': 'Completed',
+             'Batch-3': 'Completed'}])
+        result = self.client.bulk.Contact.insert(
+            [{'LastName': 'x'}, {'LastName': 'y'}, {'LastName': 'z'}],
+            batch_size=1)
+        self.assertEqual(['Batch-1', 'Batch-2', 'Batch-3'],
+                         [i['id'] for i in result])
+        self.assertEqual(2, len(self.batch_list_calls()))
+        self.assertFalse([call for call in responses.calls
+                          if re.search(r'/batch/Batch-\d$',
+                                       call.request.url)])
+
+    @responses.activate
+    def test_failed_and_not_processed_batches(self):
+        """Failed and not processed batches are done, their slots are freed
+        and the results of every batch are returned in batch order"""
+        self.add_job(['Batch-1', 'Batch-2', 'Batch-3'])
+        self.add_batch_list([
+            {'Batch-1': 'InProgress', 'Batch-2': 'Failed',
+             'Batch-3': 'NotProcessed'},
+            {'Batch-1': 'Completed', 'Batch-2': 'Failed',
+             'Batch-3': 'NotProcessed'}])
+        callback = mock.Mock()
+        result = self.client.bulk.Contact._bulk_operation(  # pylint: disable=protected-access
+            'insert', [{'LastName': 'x'}], batches=[
+                [{'LastName': 'x'}], [{'LastName': 'y'}], [{'LastName': 'z'}]],
+            batch_callback=callback)
+        self.assertEqual(['Batch-1', 'Batch-2', 'Batch-3'],
+                         [i['id'] for i in result])
+        self.assertEqual(3, callback.call_count)
+        self.assertEqual(0, self.client.bulk.orchestrator.batches.used)
+        self.assertEqual(1, self.sleep.call_count)
@@ -0,0 +1,240 @@
+"""Test for bulk_orchestrator.py"""
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from src.cme_data_migration_tool.simple_salesforce_dmt.bulk import \
+    SFBulkHandler
+from src.cme_data_migration_tool.simple_salesforce_dmt.bulk_orchestrator \
+    import MAX_IN_FLIGHT_BATCHES, MAX_OPEN_JOBS, BulkOrchestrator, FairSlots
+
+
+def wait_until(predicate, timeout=5):
+    """Waits for another thread to reach a state"""
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError('timed out')
+        time.sleep(0.01)
+
+
+class TestFairSlots(unittest.TestCase):
+    """Test FairSlots"""
+
+    def setUp(self):
+        self.slots = FairSlots(1, threading.Condition())
+        self.granted = []
+        self.threads = []
+
+    def tearDown(self):
+        for thread in self.threads:
+            thread.join(5)
+
+    def waiter(self, key, name):
+        """Starts a thread waiting for a slot of the key and waits until it
+        queued"""
+        depth = self.slots.depth().get(key, 0)
+
+        def acquire():
+            self.slots.acquire(key)
+            self.granted.append(name)
+        thread = threading.Thread(target=acquire, daemon=True)
+        thread.start()
+        self.threads.append(thread)
+        wait_until(lambda: self.slots.depth().get(key, 0) == depth + 1)
+
+    def test_limit(self):
+        self.assertTrue(self.slots.acquire('a', timeout=0))
+        self.assertFalse(self.slots.acquire('a', timeout=0))
+        self.assertFalse(self.slots.acquire('b', timeout=0.01))
+        # waiters that time out leave the queue
+        self.assertEqual({}, self.slots.depth())
+        self.slots.release()
+        self.assertTrue(self.slots.acquire('b', timeout=0))
+        self.assertEqual(1, self.slots.used)
+
+    def test_round_robin_across_keys(self):
+        """A key with many waiters does not starve the other keys"""
+        self.slots.acquire('a')
+        self.waiter('a', 'a1')
+        self.waiter('a', 'a2')
+        self.waiter('a', 'a3')
+        self.waiter('b', 'b1')
+        self.assertEqual({'a': 3, 'b': 1}, self.slots.depth())
+        for count in range(1, 5):
+            self.slots.release()
+            wait_until(lambda count=count: len(self.granted) == count)
+        self.assertEqual(['a1', 'b1', 'a2', 'a3'], self.granted)
+
+    def test_release_several(self):
+        self.slots.acquire('a')
+        self.slots.resize(3)
+        self.slots.acquire('a')
+        self.slots.acquire('b')
+        self.waiter('a', 'a1')
+        self.waiter('b', 'b1')
+        self.slots.release(2)
+        wait_until(lambda: len(self.granted) == 2)
+        self.assertEqual(3, self.slots.used)
+
+    def test_resize(self):
+        """Waiters are granted the slots a larger limit adds, slots in use
+        beyond a smaller limit are kept"""
+        self.slots.acquire('a')
+        self.waiter('a', 'a1')
+        self.waiter('b', 'b1')
+        self.slots.resize(3)
+        wait_until(lambda: len(self.granted) == 2)
+        self.slots.resize(1)
+        self.assertEqual(3, self.slots.used)
+        self.slots.release(2)
+        self.assertFalse(self.slots.acquire('a', timeout=0))
+        self.slots.release()
+        self.assertTrue(self.slots.acquire('a', timeout=0))
+
+
+class TestBulkOrchestrator(unittest.TestCase):
+    """Test BulkOrchestrator"""
+
+    def setUp(self):
+        instances_patcher = patch.object(BulkOrchestrator, '_instances', {})
+        instances_patcher.start()
+        self.addCleanup(instances_patcher.stop)
+
+    def orchestrator(self, max_open_jobs, max_in_flight_batches):
+        orchestrator = BulkOrchestrator('na15.salesforce.com', max_open_jobs,
+                                        max_in_flight_batches)
+        self.addCleanup(orchestrator.pool.shutdown)
+        return orchestrator
+
+    def test_one_orchestrator_per_org(self):
+        orchestrator = BulkOrchestrator.getinstance(
+            'https://na15.salesforce.com/services/async/52.0/')
+        self.addCleanup(orchestrator.pool.shutdown)
+        self.assertIs(orchestrator, BulkOrchestrator.getinstance(
+            'https://na15.salesforce.com/services/async/59.0/'))
+        self.assertIs(orchestrator, SFBulkHandler(
+            '12345', 'https://na15.salesforce.com/services/async/52.0/'
+            ).Contact.orchestrator)
+        other = BulkOrchestrator.getinstance(
+            'https://na16.salesforce.com/services/async/52.0/')
+        self.addCleanup(other.pool.shutdown)
+        self.assertIsNot(orchestrator, other)
+        self.assertEqual((MAX_OPEN_JOBS, MAX_IN_FLIGHT_BATCHES),
+                         (orchestrator.jobs.limit, orchestrator.batches.limit))
+
+    def test_configure(self):
+        """The caps of an org come from its configuration, also when its
+        orchestrator already exists"""
+        bulk_url = 'https://na15.salesforce.com/services/async/52.0/'
+        orchestrator = BulkOrchestrator.configure(bulk_url, 2, 5)
+        self.addCleanup(orchestrator.pool.shutdown)
+        self.assertIs(orchestrator, BulkOrchestrator.getinstance(bulk_url))
+        self.assertEqual((2, 5), (orchestrator.jobs.limit,
+                                  orchestrator.batches.limit))
+        self.assertIs(orchestrator,
+                      BulkOrchestrator.configure(bulk_url, 3, 7))
+        self.assertEqual((3, 7), (orchestrator.jobs.limit,
+                                  orchestrator.batches.limit))
+        with self.assertRaises(ValueError):
+            BulkOrchestrator.configure(bulk_url, 0, 7)
+
+    def test_open_job_cap(self):
+        orchestrator = self.orchestrator(1, 5)
+        started = threading.Event()
+
+        def second_job():
+            with orchestrator.job('Pricebook2'):
+                started.set()
+        with orchestrator.job('Product2'):
+            thread = threading.Thread(target=second_job, daemon=True)
+            thread.start()
+            wait_until(lambda: orchestrator.jobs.depth() == {'Pricebook2': 1})
+            self.assertFalse(started.is_set())
+        thread.join(5)
+        self.assertTrue(started.is_set())
+        metrics = orchestrator.metrics()
+        self.assertEqual(0, metrics['open_jobs'])
+        self.assertEqual(1, metrics['objects']['Product2']['jobs'])
+        self.assertEqual(1, metrics['objects']['Pricebook2']['jobs'])
+        self.assertGreaterEqual(
+            metrics['objects']['Pricebook2']['max_queued_seconds'], 0)
+
+    def test_in_flight_batch_cap(self):
+        orchestrator = self.orchestrator(5, 2)
+        self.assertTrue(orchestrator.acquire_batch('Product2'))
+        self.assertTrue(orchestrator.acquire_batch('Pricebook2'))
+        self.assertFalse(orchestrator.acquire_batch('Product2', timeout=0))
+        orchestrator.release_batch(2)
+        self.assertTrue(orchestrator.acquire_batch('Product2', timeout=0))
+        metrics = orchestrator.metrics()
+        self.assertEqual(1, metrics['in_flight_batches'])
+        self.assertEqual(2, metrics['objects']['Product2']['batches'])
+        self.assertEqual(1, metrics['objects']['Pricebook2']['batches'])
+
+    def test_jobs_of_several_objects_share_the_batch_cap(self):
+        """Concurrent jobs of different objects never have more batches in
+        flight than the org's cap and all of their batches complete"""
+        orchestrator = self.orchestrator(5, 3)
+        handler = SFBulkHandler(
+            '12345', 'https://na15.salesforce.com/services/async/52.0/')
+        lock = threading.Lock()
+        in_flight = {}
+        peaks = []
+
+        def fake_org(sf_bulk_type):
+            sf_bulk_type.orchestrator = orchestrator
+
+            def add_batch(job_id, data, operation, encoded=None):  # pylint: disable=unused-argument
+                with lock:
+                    batch_id = f'{job_id}-{len(in_flight)}'
+                    in_flight[batch_id] = job_id
+                    peaks.append(orchestrator.batches.used)
+                return {'id': batch_id, 'jobId': job_id}
+
+            def get_job_batches(job_id):
+                with lock:
+                    # batches complete on the status check after they were
+                    # added
+                    return [{'id': batch_id, 'jobId': job_id,
+                             'state': 'Completed'}
+                            for batch_id, batch_job in list(in_flight.items())
+                            if batch_job == job_id]
+
+            def fetch_batch_results(batch, **kwargs):  # pylint: disable=unused-argument
+                return [[batch['id']]]
+            sf_bulk_type._add_batch = add_batch  # pylint: disable=protected-access
+            sf_bulk_type._get_job_batches = get_job_batches  # pylint: disable=protected-access
+            sf_bulk_type._fetch_batch_results = fetch_batch_results  # pylint: disable=protected-access
+            return sf_bulk_type
+
+        results = {}
+
+        def run(object_name):
+            sf_bulk_type = fake_org(getattr(handler, object_name))
+            with orchestrator.job(object_name):
+                results[object_name] = sf_bulk_type._monitor_batches(  # pylint: disable=protected-access
+                    pool=orchestrator.pool,
+                    job_id=object_name,
+                    batch_data=[[i] for i in range(8)],
+                    operation='insert'
+                    )
+        threads = [threading.Thread(target=run, args=(object_name,),
+                                    daemon=True)
+                   for object_name in ('Product2', 'Pricebook2')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+        self.assertEqual(16, len(peaks))
+        self.assertLessEqual(max(peaks), 3)
+        self.assertEqual(0, orchestrator.batches.used)
+        for object_name in ('Product2', 'Pricebook2'):
+            self.assertEqual(8, len(results[object_name]))
+            self.assertEqual(
+                8, orchestrator.metrics()['objects'][object_name]['batches'])
+
+
+if __name__ == '__main__':
+    unittest.main()
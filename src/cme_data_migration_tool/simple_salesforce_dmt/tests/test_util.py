@@ -1,17 +1,17 @@
 """Tests for simple-salesforce utility functions"""
 import datetime
+import json
 import unittest
 from unittest.mock import Mock
 
 import pytz
-from simple_salesforce.exceptions import (SalesforceExpiredSession,
-                                          SalesforceGeneralError,
-                                          SalesforceMalformedRequest,
-                                          SalesforceMoreThanOneRecord,
-                                          SalesforceRefusedRequest,
-                                          SalesforceResourceNotFound)
-from simple_salesforce.util import (date_to_iso8601, exception_handler,
-                                    getUniqueElementValueFromXmlString)
+from src.cme_data_migration_tool.simple_salesforce_dmt.exceptions import (
+    SalesforceExpiredSession, SalesforceGeneralError,
+    SalesforceMalformedRequest, SalesforceMoreThanOneRecord,
+    SalesforceRefusedRequest, SalesforceResourceNotFound)
+from src.cme_data_migration_tool.simple_salesforce_dmt.util import (
+    date_to_iso8601, exception_handler, getUniqueElementValueFromXmlString,
+    iter_json_array)
 
 
 class TestXMLParser(unittest.TestCase):
@@ -105,3 +105,62 @@ class TestExceptionHandler(unittest.TestCase):
         self.assertEqual(str(cm.exception), (
             'Error Code 500. Response content'
             ': Example Content'))
+
+
+class TestIterJsonArray(unittest.TestCase):
+    """Test the incremental json array parser"""
+
+    records = [
+        {'Id': '001xx000003DHP0AAO', 'Name': 'a, "quoted" ] name',
+         'Description': 'back\\slash \\" and \\n, ],[ {}',
+         'Unicode': '\u00e9\u4e2d\U0001f600', 'Amount': 12345.678,
+         'Count': 1000, 'Active': True, 'Parent': None},
+        {'Id': '001xx000003DHP1AAO', 'Nested': {'List': [1, [2, 3], {}]},
+         'Escapes': '\\u0041 \\t \\\\ \\/',
+         'Lines': 'one\ntwo\ttab \x01'},
+        12,
+        'text with ] and ,',
+        []
+    ]
+
+    def parse(self, chunks, page_size=2000):
+        return [item for page in iter_json_array(chunks, page_size)
+                for item in page]
+
+    def test_every_chunk_boundary(self):
+        """Items split anywhere, also inside strings, escape sequences,
+        numbers and multi byte characters, are parsed"""
+        for ensure_ascii in (True, False):
+            data = json.dumps(self.records,
+                              ensure_ascii=ensure_ascii).encode('utf-8')
+            for split in range(len(data) + 1):
+                self.assertEqual(
+                    self.records, self.parse([data[:split], data[split:]]),
+                    f'split at {split}')
+
+    def test_byte_chunks(self):
+        data = json.dumps(self.records, ensure_ascii=False,
+                          indent=2).encode('utf-8')
+        self.assertEqual(self.records,
+                         self.parse(data[i:i + 1] for i in range(len(data))))
+
+    def test_pages(self):
+        data = json.dumps(list(range(5))).encode('utf-8')
+        self.assertEqual([[0, 1], [2, 3], [4]],
+                         list(iter_json_array([data], page_size=2)))
+
+    def test_empty_array(self):
+        self.assertEqual([], list(iter_json_array([b' [ ', b'] '])))
+
+    def test_truncated_input(self):
+        """Input that ends before the array is closed is an error, even
+        when it ends between items"""
+        data = json.dumps(self.records).encode('utf-8')
+        for end in range(len(data)):
+            with self.assertRaises(ValueError, msg=f'end at {end}'):
+                self.parse([data[:end]])
+
+    def test_not_an_array(self):
+        for data in (b'{"a": 1}', b',[1]', b'"text"'):
+            with self.assertRaises(ValueError):
+                self.parse([data])
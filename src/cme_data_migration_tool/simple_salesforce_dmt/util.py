@@ -1,6 +1,8 @@
 """Utility functions for simple-salesforce"""
 
+import codecs
 import datetime
+import json
 import xml.dom.minidom
 from typing import Any, Iterable, List, Mapping, MutableMapping, NamedTuple, \
     NoReturn, \
@@ -109,6 +111,64 @@ def call_salesforce(
 
     return result
 
+def iter_json_array(
+        chunks: Iterable[bytes],
+        page_size: int = 2000
+) -> Iterable[List[Any]]:
+    """Parses a utf-8 json array arriving in byte chunks, yields its items
+    in lists of up to page_size items while the chunks are still arriving,
+    so only one page and the unparsed tail are held in memory.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    position = 0
+    started = False
+    finished = False
+    page: List[Any] = []
+    for chunk in chunks:
+        buffer = buffer[position:] + text_decoder.decode(chunk)
+        position = 0
+        while not finished:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                if buffer[position] == ',' and not started:
+                    raise ValueError('json array expected')
+                position += 1
+            if position == len(buffer):
+                break
+            if not started:
+                if buffer[position] != '[':
+                    raise ValueError('json array expected')
+                started = True
+                position += 1
+                continue
+            if buffer[position] == ']':
+                finished = True
+                break
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # the item continues in the next chunk
+                break
+            # a number at the end of the buffer may continue in the next chunk
+            # too, an item only counts once the separator after it has arrived
+            following = end
+            while following < len(buffer) and buffer[following] in ' \t\r\n':
+                following += 1
+            if following == len(buffer) or buffer[following] not in ',]':
+                break
+            page.append(item)
+            position = following
+            if len(page) >= page_size:
+                yield page
+                page = []
+    text_decoder.decode(b'', final=True)
+    if not finished:
+        raise ValueError('incomplete json array')
+    if page:
+        yield page
+
+
 def list_from_generator(
         generator_function: Iterable[Iterable[T]]
 ) -> List[T]:
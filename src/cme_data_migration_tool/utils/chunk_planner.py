@@ -0,0 +1,111 @@
+from urllib.parse import quote_plus
+
+
+class ChunkPlanner:
+    """
+    Packs the values of an IN list (or any list of predicates) into as few SOQL
+    statements as the SOQL character limit and, for REST GET queries, the request
+    URL limit allow. Shared by the export, import and change detection queries.
+    """
+    SOQL_CHARACTER_LIMIT = 100000
+    URL_LENGTH_LIMIT = 16384
+    # room kept for scheme, host, api version path and the q= parameter name of the request url
+    URL_HEADROOM = 512
+    PLACEHOLDER = "{}"
+
+    @staticmethod
+    def quote_value(value):
+        return "'" + value + "'"
+
+    @classmethod
+    def plan(cls, template, values, render=None, separator=",", soql_limit=None, url_limit=None, max_items=None, placeholder=None):
+        """
+        Split values into chunks so that the template with every placeholder replaced by
+        the rendered chunk stays within soql_limit characters and, unless url_limit is 0,
+        within url_limit characters once url encoded. Bulk queries are posted in the request
+        body and pass url_limit=0.
+        """
+        render = render or ChunkPlanner.quote_value
+        placeholder = placeholder or ChunkPlanner.PLACEHOLDER
+        soql_limit = soql_limit or ChunkPlanner.SOQL_CHARACTER_LIMIT
+        url_limit = ChunkPlanner.URL_LENGTH_LIMIT - ChunkPlanner.URL_HEADROOM if url_limit is None else url_limit
+        parts = template.split(placeholder)
+        occurrences = len(parts) - 1
+        base_soql_length = sum(len(part) for part in parts)
+        base_url_length = sum(len(quote_plus(part)) for part in parts)
+        separator_url_length = len(quote_plus(separator))
+
+        chunks = []
+        chunk = []
+        soql_length = base_soql_length
+        url_length = base_url_length
+        for value in values:
+            rendered = render(value)
+            additional_soql_length = occurrences * (len(rendered) + (len(separator) if chunk else 0))
+            additional_url_length = occurrences * (len(quote_plus(rendered)) + (separator_url_length if chunk else 0))
+            full = chunk and (soql_length + additional_soql_length > soql_limit
+                              or (url_limit and url_length + additional_url_length > url_limit)
+                              or (max_items and len(chunk) >= max_items))
+            if full:
+                chunks.append(chunk)
+                chunk = []
+                soql_length = base_soql_length
+                url_length = base_url_length
+                additional_soql_length = occurrences * len(rendered)
+                additional_url_length = occurrences * len(quote_plus(rendered))
+            chunk.append(value)
+            soql_length += additional_soql_length
+            url_length += additional_url_length
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    @classmethod
+    def build(cls, template, chunk, render=None, separator=",", placeholder=None):
+        render = render or ChunkPlanner.quote_value
+        placeholder = placeholder or ChunkPlanner.PLACEHOLDER
+        return template.replace(placeholder, separator.join(render(value) for value in chunk))
+
+    @classmethod
+    def execute(cls, template, values, executor, render=None, separator=",", soql_limit=None, url_limit=None, max_items=None, placeholder=None):
+        """
+        Run executor(soql, chunk) for every planned chunk and return the list of executor
+        results. A chunk the server still rejects as too long is split in half and retried.
+        """
+        results = []
+        pending = ChunkPlanner.plan(template, values, render, separator, soql_limit, url_limit, max_items, placeholder)
+        pending.reverse()
+        while pending:
+            chunk = pending.pop()
+            soql = ChunkPlanner.build(template, chunk, render, separator, placeholder)
+            try:
+                results.append(executor(soql, chunk))
+            except Exception as exception:
+                if len(chunk) < 2 or not ChunkPlanner.is_query_too_long(exception):
+                    raise
+                print("query with {} values was rejected as too long, retrying in smaller chunks".format(len(chunk)))
+                middle = len(chunk) // 2
+                pending.append(chunk[middle:])
+                pending.append(chunk[:middle])
+        return results
+
+    @staticmethod
+    def is_query_too_long(exception):
+        # clients retried with tenacity surface the last salesforce error wrapped in a RetryError
+        last_attempt = getattr(exception, "last_attempt", None)
+        if last_attempt is not None and last_attempt.exception() is not None:
+            exception = last_attempt.exception()
+        if getattr(exception, "status", None) == 414:
+            return True
+        content = getattr(exception, "content", None)
+        errors = content if isinstance(content, list) else [content]
+        for error in errors:
+            if not isinstance(error, dict):
+                continue
+            error_code = error.get("errorCode", "")
+            message = (error.get("message") or "").lower()
+            if error_code == "QUERY_TOO_COMPLICATED":
+                return True
+            if error_code == "MALFORMED_QUERY" and ("too long" in message or "exceeds" in message):
+                return True
+        return False
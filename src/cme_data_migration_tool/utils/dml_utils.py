@@ -1,20 +1,225 @@
+import csv,io,math
 from alive_progress import alive_bar
 from src.cme_data_migration_tool.utils.nsf import nsf
+from src.cme_data_migration_tool.simple_salesforce_dmt.bulk2 import Operation, MAX_INGEST_JOB_FILE_SIZE
 class DMLUtils:
+    BATCH_SIZE = 1000
+    LOCK_ERROR = 'UNABLE_TO_LOCK_ROW'
+    # bulk 2.0 ingest jobs take up to 100 MB of csv, 1 MB is kept free like the vendored csv splitter does
+    BULKV2_JOB_SIZE = MAX_INGEST_JOB_FILE_SIZE - 1 * 1024 * 1024
+    # bulk 2.0 ingest jobs count one batch against the daily batch limit per 10000 records
+    BULKV2_BATCH_RECORDS = 10000
+    # requests of a bulk v1 job, create and close, and of each of its batches, add, at least one status check and results
+    BULKV1_CALLS_PER_JOB = 2
+    BULKV1_CALLS_PER_BATCH = 3
+    # requests of a bulk 2.0 job, create, upload, close, at least one status check and the three result sets
+    BULKV2_CALLS_PER_JOB = 7
 
     @classmethod
-    def upsert(cls, objectstoupsertresult):
+    def upsert(cls, objectstoupsertresult, dmlmode="serial", backend="bulkv1", batch_callback=None):
+        """
+        batch_callback is called with the records and the results of every batch, or of every job with bulkv2,
+        as soon as it is done.
+        """
         objname = objectstoupsertresult.objectconfig.objectname
         print(objname)
         records_to_upsert = objectstoupsertresult.existing_records.copy()
         records_to_upsert.extend(objectstoupsertresult.new_records)
-        result = objectstoupsertresult.orgconfig.org_connector.bulk.__getattr__(objname).upsert(records_to_upsert,'id',batch_size=1000,use_serial=True)
+        if backend == "bulkv2":
+            result = DMLUtils.upsert_bulkv2(objectstoupsertresult.orgconfig, nsf.unmask(objectstoupsertresult.orgconfig, objname), records_to_upsert, batch_callback)
+            DMLUtils.print_bulkv2_result(result)
+            return None
+        bulkhandler = objectstoupsertresult.orgconfig.org_connector.bulk.__getattr__(objname)
+        if dmlmode == "parallel":
+            batches = DMLUtils.partition_by_parent(records_to_upsert, objectstoupsertresult.get_parent_keys(), objectstoupsertresult.objectconfig.getpartitionreference())
+            result = DMLUtils.parallel_operation(batches, lambda records, **kwargs: bulkhandler.upsert(records, 'id', batch_callback=batch_callback, **kwargs))
+        else:
+            result = bulkhandler.upsert(records_to_upsert,'id',batch_size=DMLUtils.BATCH_SIZE,use_serial=True,batch_callback=batch_callback)
         print(result)
         return None
-    
+
+    @staticmethod
+    def plan_upsert(objectstoupsertresult, dmlmode="serial", backend="bulkv1"):
+        """
+        Returns the bulk jobs, batches and api calls an upsert of the records would take without running it.
+        """
+        records_to_upsert = objectstoupsertresult.existing_records.copy()
+        records_to_upsert.extend(objectstoupsertresult.new_records)
+        if len(records_to_upsert) == 0:
+            return 0, 0, 0
+        if backend == "bulkv2":
+            jobs = sum(1 for _ in DMLUtils.records_to_csv(records_to_upsert, DMLUtils.BULKV2_JOB_SIZE))
+            return jobs, math.ceil(len(records_to_upsert) / DMLUtils.BULKV2_BATCH_RECORDS), jobs * DMLUtils.BULKV2_CALLS_PER_JOB
+        if dmlmode == "parallel":
+            batches = len(DMLUtils.partition_by_parent(records_to_upsert, objectstoupsertresult.get_parent_keys(), objectstoupsertresult.objectconfig.getpartitionreference()))
+        else:
+            batches = math.ceil(len(records_to_upsert) / DMLUtils.BATCH_SIZE)
+        return 1, batches, DMLUtils.BULKV1_CALLS_PER_JOB + batches * DMLUtils.BULKV1_CALLS_PER_BATCH
+
+    @staticmethod
+    def upsert_bulkv2(orgconfig, objectname, records, job_callback=None):
+        """
+        Streams the records as csv into as many bulk 2.0 upsert jobs on Id as the job size limit needs,
+        records without an id are created. Returns the successful, failed and unprocessed records of all jobs.
+        Bulk 2.0 does not return results in upload order, so job_callback is called for every job with its records
+        and a result per record, the successful and failed rows of the job are matched to the records by the csv
+        values they echo and successful ones carry the sf__Id of the created or updated record.
+        """
+        result = {'successfulRecords': [], 'failedRecords': [], 'unprocessedRecords': []}
+        if len(records) == 0:
+            return result
+        bulkhandler = orgconfig.org_connector.bulk2.__getattr__(objectname)
+        fieldnames = DMLUtils.csv_fieldnames(records)
+        job_start = 0
+        for record_count, csv_data in DMLUtils.records_to_csv(records, DMLUtils.BULKV2_JOB_SIZE):
+            job = bulkhandler._upload_data(Operation.upsert, (record_count, csv_data), external_id_field='Id')
+            print("bulk 2.0 job {}: {} records processed, {} failed".format(job['job_id'], job['numberRecordsProcessed'], job['numberRecordsFailed']))
+            job_records = bulkhandler.get_all_ingest_records(job['job_id'])
+            for results_type in result:
+                result[results_type].extend(job_records[results_type])
+            job_data = records[job_start:job_start + record_count]
+            job_start += record_count
+            if job_callback is not None:
+                job_callback(job_data, DMLUtils.match_bulkv2_results(job_data, fieldnames, job_records))
+        return result
+
+    @staticmethod
+    def match_bulkv2_results(records, fieldnames, job_records):
+        """
+        Returns a result per record from the result rows of its bulk 2.0 job. Rows echo the uploaded csv columns
+        as strings and are matched to the records by them, records with identical columns are matched in turn.
+        Records without a successful row get a failed result.
+        """
+        positions = {}
+        for position, record in enumerate(records):
+            positions.setdefault(tuple(DMLUtils.csv_row(record, fieldnames)), []).append(position)
+        results = [{'success': False, 'id': None} for _ in records]
+        for row in job_records['successfulRecords']:
+            matching = positions.get(tuple(row.get(fieldname, '') for fieldname in fieldnames))
+            if matching:
+                results[matching.pop(0)] = {'success': True, 'id': row['sf__Id']}
+        return results
+
+    @staticmethod
+    def records_to_csv(records, max_size):
+        """
+        Yields (record count, csv) chunks of at most max_size bytes. The header is the union of the fields
+        of all records, None is written as #N/A so bulk 2.0 clears the field like a null in bulk v1 json.
+        """
+        fieldnames = DMLUtils.csv_fieldnames(records)
+        header = DMLUtils.csv_line(fieldnames)
+        lines = []
+        size = len(header.encode('utf-8'))
+        for record in records:
+            line = DMLUtils.csv_line(DMLUtils.csv_row(record, fieldnames))
+            line_size = len(line.encode('utf-8'))
+            if len(lines) > 0 and size + line_size > max_size:
+                yield len(lines), header + ''.join(lines)
+                lines = []
+                size = len(header.encode('utf-8'))
+            lines.append(line)
+            size += line_size
+        if len(lines) > 0:
+            yield len(lines), header + ''.join(lines)
+
+    @staticmethod
+    def csv_fieldnames(records):
+        return list(dict.fromkeys(fieldname for record in records for fieldname in record))
+
+    @staticmethod
+    def csv_row(record, fieldnames):
+        """
+        Returns the csv values of the record as the strings bulk 2.0 reads and echoes back in its results.
+        """
+        return [str(DMLUtils.csv_value(record.get(fieldname, ''))) for fieldname in fieldnames]
+
+    @staticmethod
+    def csv_line(values):
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator='\n').writerow(values)
+        return buffer.getvalue()
+
+    @staticmethod
+    def csv_value(value):
+        if value is None:
+            return '#N/A'
+        if value is True:
+            return 'true'
+        if value is False:
+            return 'false'
+        return value
+
+    @staticmethod
+    def print_bulkv2_result(result):
+        print("successful records: {}, failed records: {}, unprocessed records: {}".format(len(result['successfulRecords']), len(result['failedRecords']), len(result['unprocessedRecords'])))
+        for failed_record in result['failedRecords']:
+            print("failed record {}: {}".format(failed_record.get('sf__Id', ''), failed_record.get('sf__Error', '')))
+
     @classmethod
-    def delete(cls, objectstodeleteresult):
+    def delete(cls, objectstodeleteresult, dmlmode="serial"):
         objname = objectstodeleteresult.objectconfig.objectname
-        result = objectstodeleteresult.orgconfig.org_connector.bulk.__getattr__(objname).delete(objectstodeleteresult.existing_records,'id',batch_size=1000,use_serial=True)
+        bulkhandler = objectstodeleteresult.orgconfig.org_connector.bulk.__getattr__(objname)
+        if dmlmode == "parallel":
+            batches = DMLUtils.partition_by_parent(objectstodeleteresult.existing_records, objectstodeleteresult.existing_parent_keys, objectstodeleteresult.objectconfig.getpartitionreference())
+            return DMLUtils.parallel_operation(batches, lambda records, **kwargs: bulkhandler.delete(records, **kwargs))
+        result = bulkhandler.delete(objectstodeleteresult.existing_records,batch_size=DMLUtils.BATCH_SIZE,use_serial=True)
         return result
-    
+
+    @staticmethod
+    def partition_by_parent(records, parent_keys, partition_field):
+        """
+        Packs records into batches of up to BATCH_SIZE records, keeping the children of the same parent
+        in the same batch so concurrently processed batches do not wait on each other's parent row locks.
+        partition_field is the relationship of the parent reference configured for the object as its
+        partitionfield, e.g. the parent product of child items or the price list of price list entries.
+        Objects without one are cut into batches in record order.
+        """
+        if partition_field is None:
+            return [records[i:i + DMLUtils.BATCH_SIZE] for i in range(0, len(records), DMLUtils.BATCH_SIZE)]
+
+        groups = {}
+        for index, record in enumerate(records):
+            parent_key = parent_keys[index].get(partition_field, None)
+            # records without a parent do not contend for a parent lock, each is a group of its own
+            groups.setdefault(parent_key if parent_key is not None else ('no parent', index), []).append(record)
+
+        # first fit decreasing, a parent with more children than a batch holds is spread over full batches
+        batches = []
+        for group in sorted(groups.values(), key=len, reverse=True):
+            while len(group) >= DMLUtils.BATCH_SIZE:
+                batches.append(group[:DMLUtils.BATCH_SIZE])
+                group = group[DMLUtils.BATCH_SIZE:]
+            if len(group) == 0:
+                continue
+            for batch in batches:
+                if len(batch) + len(group) <= DMLUtils.BATCH_SIZE:
+                    batch.extend(group)
+                    break
+            else:
+                batches.append(list(group))
+        print("partitioned {} records by {} into {} batches".format(len(records), partition_field, len(batches)))
+        return batches
+
+    @staticmethod
+    def parallel_operation(batches, operation):
+        """
+        Runs the batches of one job in parallel mode, records that failed with UNABLE_TO_LOCK_ROW are
+        submitted once more in serial mode and their results replace the failed ones.
+        """
+        if len(batches) == 0:
+            return []
+        records = [record for batch in batches for record in batch]
+        results = list(operation(records, batches=batches, use_serial=False))
+        lock_failures = [index for index, result in enumerate(results) if DMLUtils.is_lock_failure(result)]
+        if len(lock_failures) > 0:
+            print("retrying {} records that failed with {} in serial mode".format(len(lock_failures), DMLUtils.LOCK_ERROR))
+            retry_results = list(operation([records[index] for index in lock_failures], batch_size=DMLUtils.BATCH_SIZE, use_serial=True))
+            for index, retry_result in zip(lock_failures, retry_results):
+                results[index] = retry_result
+        return results
+
+    @staticmethod
+    def is_lock_failure(result):
+        if not isinstance(result, dict) or result.get('success', True):
+            return False
+        return any(isinstance(error, dict) and error.get('statusCode') == DMLUtils.LOCK_ERROR for error in result.get('errors', []) or [])
@@ -0,0 +1,130 @@
+import hashlib,json,os,sqlite3,threading,time
+from src.cme_data_migration_tool.utils.nsf import nsf
+from src.cme_data_migration_tool.utils.chunk_planner import ChunkPlanner
+from src.cme_data_migration_tool.utils.query_utils import QueryUtils
+from src.cme_data_migration_tool.dtos.runtime_dtos.global_results_dto import GlobalResultsDTO
+
+class ExportCache:
+    """
+    On disk cache of processed export records keyed by (org, object, id), shared by every export run.
+    A record is served from the cache while its SystemModstamp in the org is the one it was cached
+    with and it was cached from the same queried fields, the cache is kept under max_size_mb by
+    evicting the least recently used records.
+    """
+    instance = None
+
+    @staticmethod
+    def open(cache_path, max_size_mb):
+        if ExportCache.instance is None:
+            ExportCache.instance = ExportCache(cache_path, max_size_mb)
+        return ExportCache.instance
+
+    @staticmethod
+    def close():
+        if ExportCache.instance is not None:
+            print("export cache hits: {}, misses: {}".format(ExportCache.instance.hits, ExportCache.instance.misses))
+            ExportCache.instance.evict()
+            ExportCache.instance.connection.close()
+            ExportCache.instance = None
+
+    def __init__(self, cache_path, max_size_mb):
+        if os.path.dirname(cache_path) != '':
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # export services of different objects use the cache concurrently, every access goes through the lock
+        self.connection = sqlite3.connect(cache_path, check_same_thread=False)
+        # caches written before the queried fields were part of a record start over
+        columns = [column[1] for column in self.connection.execute("PRAGMA table_info(records)")]
+        if len(columns) > 0 and 'fields' not in columns:
+            self.connection.execute("DROP TABLE records")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS records (org TEXT, object TEXT, id TEXT, fields TEXT, systemmodstamp TEXT, record TEXT, size INTEGER, last_used REAL, PRIMARY KEY (org, object, id))")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS records_last_used ON records (last_used)")
+        self.connection.commit()
+        self.evict()
+
+    def query_by_id(self, objconfig, orgconfig, objectids, queryrecordprocessor, condition=None):
+        objectname = nsf.unmask(orgconfig, objconfig.objectname)
+        querytemplate = "SELECT id, systemmodstamp FROM " + objectname + " where id in ({})"
+        if condition is not None:
+            querytemplate = querytemplate + " and " + condition
+        modstamps = {}
+        for records in ChunkPlanner.execute(querytemplate, list(objectids), lambda querystring, chunk: orgconfig.org_connector.query_all(querystring)['records']):
+            for record in records:
+                modstamps[record['Id']] = record['SystemModstamp']
+
+        results = {}
+        fields = ExportCache.fieldsfingerprint(objconfig, orgconfig)
+        with self.lock:
+            cached = self.get(orgconfig.username, objconfig.objectname, fields, list(modstamps.keys()))
+        for recordid, (systemmodstamp, record) in cached.items():
+            if systemmodstamp == modstamps[recordid]:
+                results[recordid] = json.loads(record)
+        staleids = [recordid for recordid in modstamps if recordid not in results]
+        hits = len(results)
+
+        with GlobalResultsDTO.lock:
+            for record in results.values():
+                ExportCache.register_matching_keys(record)
+        if len(staleids) > 0:
+            fetched = QueryUtils.query_by_field(objconfig, orgconfig, 'id', staleids, queryrecordprocessor)
+            with self.lock:
+                self.put(orgconfig.username, objconfig.objectname, fields, fetched)
+            results.update(fetched)
+        with self.lock:
+            self.hits += hits
+            self.misses += len(staleids)
+        print("{} {} records served from the export cache, {} queried".format(hits, objectname, len(staleids)))
+        return results
+
+    @staticmethod
+    def fieldsfingerprint(objconfig, orgconfig):
+        # records processed from another field list, e.g. after describe regenerated the configurations, are stale
+        return hashlib.sha256(objconfig.get_fields_to_query(orgconfig).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def register_matching_keys(record):
+        # records served from the cache skip processqueryrecord, which registers the matching keys of the record and its references
+        matchingkeyinfo = record["matchingkeyinfo"]
+        GlobalResultsDTO.globalobjectmatchingkeyinfomap.setdefault(matchingkeyinfo['object'], {})[matchingkeyinfo['matchingkey']] = matchingkeyinfo['matchingkeyqueryfieldswithdata']
+        for referencerecord in record.get("referenceresult", {}).values():
+            ExportCache.register_matching_keys(referencerecord)
+
+    def get(self, org, objectname, fields, objectids):
+        cached = {}
+        now = time.time()
+        for chunkstart in range(0, len(objectids), 500):
+            chunk = objectids[chunkstart:chunkstart + 500]
+            parameters = [org, objectname, fields] + chunk
+            placeholders = ",".join("?" for _ in chunk)
+            for recordid, systemmodstamp, record in self.connection.execute("SELECT id, systemmodstamp, record FROM records WHERE org = ? AND object = ? AND fields = ? AND id IN (" + placeholders + ")", parameters):
+                cached[recordid] = (systemmodstamp, record)
+            self.connection.execute("UPDATE records SET last_used = ? WHERE org = ? AND object = ? AND fields = ? AND id IN (" + placeholders + ")", [now] + parameters)
+        self.connection.commit()
+        return cached
+
+    def put(self, org, objectname, fields, records):
+        now = time.time()
+        rows = []
+        for recordid, record in records.items():
+            serialized = json.dumps(record)
+            rows.append((org, objectname, recordid, fields, record["fieldresult"].get("systemmodstamp", None), serialized, len(serialized), now))
+        self.connection.executemany("INSERT OR REPLACE INTO records (org, object, id, fields, systemmodstamp, record, size, last_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        self.connection.commit()
+
+    def evict(self):
+        total_size = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM records").fetchone()[0]
+        if total_size <= self.max_size:
+            return None
+        evicted = 0
+        for org, objectname, recordid, size in self.connection.execute("SELECT org, object, id, size FROM records ORDER BY last_used").fetchall():
+            if total_size <= self.max_size:
+                break
+            self.connection.execute("DELETE FROM records WHERE org = ? AND object = ? AND id = ?", (org, objectname, recordid))
+            total_size -= size
+            evicted += 1
+        self.connection.commit()
+        print("export cache evicted {} records to stay within {} MB".format(evicted, self.max_size // (1024 * 1024)))
+        return None
@@ -0,0 +1,80 @@
+import json,os,threading,uuid
+
+class ImportJournal:
+    """
+    Append-only checkpoint journal of an import run in ./import_results/journal_<run id>.jsonl. Every line is one event,
+    the start of the run, the records of a batch upserted successfully with their destination ids, or an object whose
+    upsert is complete. Lines are flushed to disk as they are written so a run that dies keeps everything before it.
+    """
+    JOURNAL_PATH = './import_results/journal_{}.jsonl'
+
+    @staticmethod
+    def start(importfile, run_id=None):
+        """
+        Opens the journal of a new run, or of the run to resume when its run id is given.
+        """
+        if run_id is None:
+            journal = ImportJournal(uuid.uuid4().hex[:12])
+            journal.write({"event": "start", "importfile": importfile})
+            print("import run id: {}, an interrupted run continues with --resume {}".format(journal.run_id, journal.run_id))
+            return journal
+        journal = ImportJournal(run_id)
+        if not os.path.isfile(journal.path):
+            raise FileNotFoundError("No import journal found for run id {} at {}".format(run_id, journal.path))
+        journal.load()
+        print("resuming import run {}: {} objects complete, {} records of incomplete objects already upserted".format(run_id, len(journal.completed_objects), sum(len(records) for objectname, records in journal.completed_records.items() if objectname not in journal.completed_objects)))
+        return journal
+
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self.path = ImportJournal.JOURNAL_PATH.format(run_id)
+        self.lock = threading.Lock()
+        self.importfile = None
+        # object -> summary row of the objects whose upsert is complete
+        self.completed_objects = {}
+        # object -> {matching key: destination id} of the records upserted by completed batches
+        self.completed_records = {}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+    def load(self):
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    # the last line of a run killed while writing it
+                    continue
+                if event["event"] == "start":
+                    self.importfile = event["importfile"]
+                elif event["event"] == "batch":
+                    self.completed_records.setdefault(event["object"], {}).update(event["records"])
+                elif event["event"] == "object":
+                    self.completed_objects[event["object"]] = event["row"]
+
+    def write(self, event):
+        with self.lock:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(event) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+    def record_batch(self, objectname, matchingkeys, results):
+        """
+        Journals the records of a batch that were upserted successfully, matchingkeys is aligned with results.
+        """
+        records = {matchingkey: result.get('id', None) for matchingkey, result in zip(matchingkeys, results) if isinstance(result, dict) and result.get('success', False)}
+        if len(records) == 0:
+            return None
+        with self.lock:
+            self.completed_records.setdefault(objectname, {}).update(records)
+        self.write({"event": "batch", "object": objectname, "records": records})
+        return None
+
+    def record_object(self, objectname, row):
+        with self.lock:
+            self.completed_objects[objectname] = row
+        self.write({"event": "object", "object": objectname, "row": row})
+
+    def get_completed_keys(self, objectname):
+        with self.lock:
+            return set(self.completed_records.get(objectname, {}))
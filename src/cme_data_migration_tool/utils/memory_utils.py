@@ -0,0 +1,29 @@
+import sys
+
+try:
+    import resource
+except ImportError:
+    # not available on windows, the high-water mark is not reported there
+    resource = None
+
+class MemoryUtils:
+
+    @staticmethod
+    def peak_memory_mb():
+        """
+        High-water mark of the resident memory of the process in MB since it started, None where it cannot be read.
+        It never goes down and covers every thread, it is not the memory of a single object.
+        """
+        if resource is None:
+            return None
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on linux, bytes on macos
+        if sys.platform == 'darwin':
+            return maxrss / (1024 * 1024)
+        return maxrss / 1024
+
+    @staticmethod
+    def print_peak_memory(title):
+        peak_memory = MemoryUtils.peak_memory_mb()
+        if peak_memory is not None:
+            print("{}: process peak memory so far {:.1f} MB".format(title, peak_memory))
@@ -1,56 +1,237 @@
 from alive_progress import alive_bar
-import json
+import concurrent.futures,csv,io,json,time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from src.cme_data_migration_tool.utils.nsf import nsf
-from src.cme_data_migration_tool.simple_salesforce_dmt.format import format_soql
+from src.cme_data_migration_tool.utils.chunk_planner import ChunkPlanner
+from src.cme_data_migration_tool.simple_salesforce_dmt.format import format_soql, quote_soql_value
 from src.cme_data_migration_tool.dtos.configurations_dtos.matching_keys_dto import MatchingKeysDTO
+from src.cme_data_migration_tool.dtos.runtime_dtos.global_results_dto import GlobalResultsDTO
 class QueryUtils:
+    # progress bars can not be drawn from concurrently running queries, parallel exports switch them off
+    show_progress = True
+    # describe results per org and object, used to give bulk csv values the types rest queries return
+    fieldtypes = {}
     
     @classmethod
     def query_by_id(cls, objconfig, objectids, orgconfig, queryrecordprocessor):
-        objectidsstring =  ",".join("'" + objectid + "'" for objectid in objectids)
-        countquery = "SELECT count() FROM {} where id in ({})".format(nsf.unmask(orgconfig, objconfig.objectname), objectidsstring)
-        dataquery = "SELECT "+ objconfig.get_fields_to_query(orgconfig) +" FROM {} where id in ({})".format(nsf.unmask(orgconfig, objconfig.objectname), objectidsstring)
-        return QueryUtils.query(objconfig, orgconfig, countquery, dataquery, queryrecordprocessor)
+        return QueryUtils.query_by_field(objconfig, orgconfig, 'id', objectids, queryrecordprocessor)
     
     @classmethod
-    def query_by_field(cls, objconfig, orgconfig, masked_field_name, field_ids, queryrecordprocessor):
+    def query_by_field(cls, objconfig, orgconfig, masked_field_name, field_ids, queryrecordprocessor, condition=None):
         field_name = nsf.unmask(orgconfig, masked_field_name)
-        objectidsstring =  ",".join("'" + objectid + "'" for objectid in field_ids)
-        countquery = "SELECT count() FROM {} where {} in ({})".format(nsf.unmask(orgconfig, objconfig.objectname), field_name, objectidsstring)
-        dataquery = "SELECT "+ objconfig.get_fields_to_query(orgconfig) +" FROM {} where {} in ({})".format(nsf.unmask(orgconfig, objconfig.objectname), field_name, objectidsstring)
-        return QueryUtils.query(objconfig, orgconfig, countquery, dataquery, queryrecordprocessor)
+        querytemplate = "SELECT "+ objconfig.get_fields_to_query(orgconfig) +" FROM "+ nsf.unmask(orgconfig, objconfig.objectname) +" where "+ field_name +" in ({})"
+        if condition is not None:
+            querytemplate = querytemplate + " and " + condition
+        field_ids = list(field_ids)
+        results = {}
+        # every value returns at least one record, large value sets go through bulk api 2.0 whose queries
+        # are posted in the request body, so their chunks are only bound by the soql limit
+        if len(field_ids) >= orgconfig.bulk_query_threshold:
+            executor = lambda dataquery, chunk: QueryUtils.bulk_query(objconfig, orgconfig, dataquery, len(chunk), queryrecordprocessor)
+            url_limit = 0
+        else:
+            executor = lambda dataquery, chunk: QueryUtils.query(objconfig, orgconfig, dataquery, queryrecordprocessor)
+            url_limit = None
+        for chunkresults in ChunkPlanner.execute(querytemplate, field_ids, executor, url_limit=url_limit):
+            results.update(chunkresults)
+        return results
 
     @classmethod
-    def query_by_matching_keys(cls, objconfig, orgconfig, matchingkeyrecords, queryrecordprocessor):
-        for i in range(0, len(matchingkeyrecords), 500):
-            matchingkeys_to_query_chunk = matchingkeyrecords[i:i + 500]
-            all_matching_key_conditions = []
-            for matchingkeydetails in matchingkeys_to_query_chunk:
-                matching_key_conditions = []
-                for masked_field_name,value in matchingkeydetails.items():
-                    field_name = nsf.unmask(orgconfig, masked_field_name)
-                    matching_key_conditions.append("{} = {}".format(field_name, "'" + value + "'"))
-                all_matching_key_conditions.append( "(" + ( " ) AND ( ".join(matching_key_conditions) ) + ")" )
-            final_matching_key_condition = "(" + (" ) OR ( ".join(all_matching_key_conditions))  + ")"
-            countquery = "SELECT count() FROM {} where {}".format(nsf.unmask(orgconfig, objconfig.objectname), final_matching_key_condition)
-            dataquery = "SELECT "+ objconfig.getmatchingfieldsstring(orgconfig) +" FROM {} where {}".format(nsf.unmask(orgconfig, objconfig.objectname), final_matching_key_condition)
-            return QueryUtils.query(objconfig, orgconfig, countquery, dataquery, queryrecordprocessor)
+    def query_by_matching_keys(cls, objconfig, orgconfig, matchingkeyrecords, queryrecordprocessor, additionalfields=None):
+        """
+        Looks up every planned chunk of matching keys, chunks are queried concurrently on a pool bounded
+        by max_concurrency of the org. Records are handed to queryrecordprocessor as they arrive.
+        Single field keys are queried with field in (...). Composite keys are prefiltered with an in list
+        on their most selective field and matched exactly on every key field client side.
+        additionalfields are queried along with the matching key fields and the id.
+        """
+        matchingkeyfields = MatchingKeysDTO.getinstance().matching_keys[objconfig.objectname]
+        prefilterfield = QueryUtils.get_most_selective_field(matchingkeyfields, matchingkeyrecords)
+        querytemplate = "SELECT "+ objconfig.getmatchingfieldsstring(orgconfig, additionalfields) +" FROM "+ nsf.unmask(orgconfig, objconfig.objectname) +" where "+ nsf.unmask(orgconfig, prefilterfield) +" in ({})"
+        prefiltervalues = list(dict.fromkeys(matchingkeydetails.get(prefilterfield) for matchingkeydetails in matchingkeyrecords if matchingkeydetails.get(prefilterfield) is not None))
+        if len(matchingkeyfields) > 1:
+            requestedkeys = set(tuple(matchingkeydetails.get(matchingkeyfield) for matchingkeyfield in matchingkeyfields) for matchingkeydetails in matchingkeyrecords)
+            queryrecordprocessor = QueryUtils.exact_matching_key_processor(matchingkeyfields, requestedkeys, queryrecordprocessor)
+        render = quote_soql_value
+        chunks = ChunkPlanner.plan(querytemplate, prefiltervalues, render)
+        if len(chunks) == 0:
+            return {}
+        # progress bars can only be drawn for a single chunk, concurrent chunks report their latency instead
+        show_progress = QueryUtils.show_progress and len(chunks) == 1
+
+        def lookup(chunk):
+            started = time.perf_counter()
+            chunkresults = {}
+            for results in ChunkPlanner.execute(querytemplate, chunk, lambda dataquery, plannedchunk: QueryUtils.query(objconfig, orgconfig, dataquery, queryrecordprocessor, show_progress), render):
+                chunkresults.update(results)
+            return chunkresults, len(chunk), time.perf_counter() - started
+
+        results = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(orgconfig.max_concurrency, len(chunks)))) as pool:
+            for index, (chunkresults, chunksize, latency) in enumerate(pool.map(lookup, chunks)):
+                results.update(chunkresults)
+                if len(chunks) > 1:
+                    print("matching key lookup {} chunk {}/{}: {} keys in {:.2f}s".format(nsf.unmask(orgconfig, objconfig.objectname), index + 1, len(chunks), chunksize, latency))
+        return results
     
+    @staticmethod
+    def get_most_selective_field(matchingkeyfields, matchingkeyrecords):
+        # the key field with the most distinct requested values returns the fewest records that do not match
+        distinctvalues = {matchingkeyfield: set() for matchingkeyfield in matchingkeyfields}
+        for matchingkeydetails in matchingkeyrecords:
+            for matchingkeyfield in matchingkeyfields:
+                distinctvalues[matchingkeyfield].add(matchingkeydetails.get(matchingkeyfield))
+        return max(matchingkeyfields, key=lambda matchingkeyfield: len(distinctvalues[matchingkeyfield]))
+
+    @staticmethod
+    def exact_matching_key_processor(matchingkeyfields, requestedkeys, queryrecordprocessor):
+        def processor(objectname, record, orgconfig, referencefield):
+            maskedrecord = {nsf.mask(orgconfig, fieldname): value for fieldname, value in record.items()}
+            if tuple(maskedrecord.get(matchingkeyfield) for matchingkeyfield in matchingkeyfields) not in requestedkeys:
+                return None
+            return queryrecordprocessor(objectname, record, orgconfig, referencefield)
+        return processor
+
     @classmethod
-    def query(cls, objconfig, orgconfig, countquery, dataquery, queryrecordprocessor):
-        data = orgconfig.org_connector.query(countquery)
-        total_query_result_size = (data["totalSize"])
-        query_result_iterator = orgconfig.org_connector.query_all_iter(dataquery)
+    def query(cls, objconfig, orgconfig, dataquery, queryrecordprocessor, show_progress=None):
+        # the first page already carries totalSize, so the progress bar is sized without a separate count() query
+        show_progress = QueryUtils.show_progress if show_progress is None else show_progress
+        query_result_page = orgconfig.org_connector.query(dataquery)
+        total_query_result_size = (query_result_page["totalSize"])
+        query_api_calls = 1
         results = {}
-        with alive_bar(total_query_result_size, bar = 'classic', title="querying "+nsf.unmask(orgconfig, objconfig.objectname)) as bar:
-            for query_record in query_result_iterator:
-                processedqueryrecord = queryrecordprocessor(objconfig.objectname, query_record, orgconfig, False)
-                if processedqueryrecord is not None:
-                    processedqueryrecordid = processedqueryrecord["fieldresult"]["id"]
-                    results[processedqueryrecordid] = processedqueryrecord
-                bar()
+        record_count = 0
+        with alive_bar(total_query_result_size, bar = 'classic', title="querying "+nsf.unmask(orgconfig, objconfig.objectname), disable = not show_progress) as bar:
+            while True:
+                for query_record in query_result_page['records']:
+                    processedqueryrecord = queryrecordprocessor(objconfig.objectname, query_record, orgconfig, False)
+                    if processedqueryrecord is not None:
+                        processedqueryrecordid = processedqueryrecord["fieldresult"]["id"]
+                        results[processedqueryrecordid] = processedqueryrecord
+                    record_count += 1
+                    bar()
+                if query_result_page['done']:
+                    break
+                query_result_page = orgconfig.org_connector.query_more(query_result_page['nextRecordsUrl'], identifier_is_url=True)
+                query_api_calls += 1
+        with GlobalResultsDTO.lock:
+            GlobalResultsDTO.query_api_calls += query_api_calls
+            GlobalResultsDTO.saved_api_calls += 1
+        if not show_progress:
+            print("queried {} {} records".format(record_count, nsf.unmask(orgconfig, objconfig.objectname)))
         return results
     
+    @classmethod
+    def bulk_query(cls, objconfig, orgconfig, dataquery, total_query_result_size, queryrecordprocessor, show_progress=None):
+        """
+        Runs a query that is too large for rest paging as a bulk 2.0 query. The csv result pages are
+        parsed one page at a time into the record shape of rest queries, so the record processor and
+        the exported results do not change. total_query_result_size is the record count
+        expected from the chunk, it sizes the progress bar.
+        """
+        show_progress = QueryUtils.show_progress if show_progress is None else show_progress
+        objectname = nsf.unmask(orgconfig, objconfig.objectname)
+        print("querying {} {} records with bulk api 2.0".format(total_query_result_size, objectname))
+        fieldconverters = QueryUtils.get_csv_field_converters(objconfig, orgconfig)
+        # job creation and the final job status call
+        query_api_calls = 2
+        results = {}
+        record_count = 0
+        with alive_bar(total_query_result_size, bar = 'classic', title="bulk querying "+objectname, disable = not show_progress) as bar:
+            for csv_page in orgconfig.org_connector.bulk2.__getattr__(objectname).query(dataquery):
+                query_api_calls += 1
+                for query_record in QueryUtils.csv_to_records(csv_page, fieldconverters):
+                    processedqueryrecord = queryrecordprocessor(objconfig.objectname, query_record, orgconfig, False)
+                    if processedqueryrecord is not None:
+                        results[processedqueryrecord["fieldresult"]["id"]] = processedqueryrecord
+                    record_count += 1
+                    bar()
+        with GlobalResultsDTO.lock:
+            GlobalResultsDTO.query_api_calls += query_api_calls
+            GlobalResultsDTO.saved_api_calls += 1
+        if not show_progress:
+            print("queried {} {} records".format(record_count, objectname))
+        return results
+
+    @classmethod
+    def get_org_time(cls, orgconfig):
+        # the Date header of a limits call is the clock of the org, local clocks can drift from it
+        connector = orgconfig.org_connector
+        result = connector._call_salesforce('GET', connector.base_url + 'limits/')
+        with GlobalResultsDTO.lock:
+            GlobalResultsDTO.query_api_calls += 1
+        if 'Date' not in result.headers:
+            return datetime.now(timezone.utc)
+        return parsedate_to_datetime(result.headers['Date']).astimezone(timezone.utc)
+
+    @classmethod
+    def get_csv_field_converters(cls, objconfig, orgconfig):
+        # converters for the columns of the query, keyed by lower case column name, relationship columns as relationship.field
+        converters = {}
+        for masked_field_name, field_type in QueryUtils.get_field_types(orgconfig, objconfig.objectname).items():
+            converters[masked_field_name] = QueryUtils.get_csv_value_converter(field_type)
+        for referencefield in objconfig.referencefields:
+            referencetypes = QueryUtils.get_field_types(orgconfig, referencefield.fieldobject)
+            for referencekey in referencefield.referencekeyslist:
+                converters[referencekey] = QueryUtils.get_csv_value_converter(referencetypes.get(referencekey.split('.', 1)[1], 'string'))
+        relationshiptypes = {nsf.unmask(orgconfig, relationship): nsf.unmask(orgconfig, fieldobject) for relationship, fieldobject in objconfig.referencefieldtoobject.items()}
+        return {nsf.unmask(orgconfig, column): converter for column, converter in converters.items()}, relationshiptypes
+
+    @classmethod
+    def get_field_types(cls, orgconfig, masked_object_name):
+        key = (orgconfig.username, masked_object_name)
+        if key not in QueryUtils.fieldtypes:
+            describe = orgconfig.org_connector.__getattr__(nsf.unmask(orgconfig, masked_object_name)).describe()
+            QueryUtils.fieldtypes[key] = {nsf.mask(orgconfig, field['name']): field['type'] for field in describe['fields']}
+        return QueryUtils.fieldtypes[key]
+
+    @staticmethod
+    def get_csv_value_converter(field_type):
+        # bulk csv has no nulls, booleans or numbers, empty columns are nulls like in rest results
+        if field_type == 'boolean':
+            return lambda value: None if value == '' else value == 'true'
+        if field_type in ('int', 'long'):
+            return lambda value: None if value == '' else int(value)
+        if field_type in ('double', 'currency', 'percent'):
+            return lambda value: None if value == '' else float(value)
+        if field_type == 'datetime':
+            return lambda value: None if value == '' else (value[:-1] + '+0000' if value.endswith('Z') else value)
+        return lambda value: None if value == '' else value
+
+    @staticmethod
+    def csv_to_records(csv_page, fieldconverters):
+        converters, relationshiptypes = fieldconverters
+        reader = csv.reader(io.StringIO(csv_page))
+        header = next(reader, None)
+        if header is None:
+            return
+        columns = []
+        for column in header:
+            relationship, _sep, field = column.rpartition('.')
+            converter = converters.get(column.lower(), None) or QueryUtils.get_csv_value_converter('string')
+            columns.append((relationship, field, converter))
+        for row in reader:
+            record = OrderedDict()
+            record['attributes'] = OrderedDict()
+            relationships = {}
+            for (relationship, field, converter), value in zip(columns, row):
+                if relationship == '':
+                    record[field] = converter(value)
+                    continue
+                if relationship not in relationships:
+                    relationshiprecord = OrderedDict()
+                    relationshiprecord['attributes'] = OrderedDict([('type', relationshiptypes.get(relationship.lower(), relationship))])
+                    relationships[relationship] = relationshiprecord
+                    record[relationship] = relationshiprecord
+                relationships[relationship][field] = converter(value)
+            for relationship, relationshiprecord in relationships.items():
+                # a relationship without any value is an empty lookup, rest returns it as null
+                if all(value is None for key, value in relationshiprecord.items() if key != 'attributes'):
+                    record[relationship] = None
+            yield record
+
     @classmethod
     def generatematchingkeyinfo(cls, objectname, datafields):
         objectmatchingkeysmap = MatchingKeysDTO.getinstance()
@@ -0,0 +1,83 @@
+import json
+from collections import OrderedDict
+from src.cme_data_migration_tool.utils.nsf import nsf
+from src.cme_data_migration_tool.dtos.configurations_dtos.matching_keys_dto import MatchingKeysDTO
+from src.cme_data_migration_tool.dtos.runtime_dtos.global_results_dto import GlobalResultsDTO
+
+class RecordTransformer:
+    """
+    Turns a queried record into the fieldresult/referenceresult structure of the exports.
+    One transformer is compiled per object and org namespace, it keeps the masked name of
+    every field name it has seen and the matching key fields of its object, so the per record
+    work is reduced to dictionary lookups.
+    """
+    instances = {}
+
+    @staticmethod
+    def getinstance(objectname, orgconfig):
+        key = (objectname, orgconfig.namespace)
+        transformer = RecordTransformer.instances.get(key, None)
+        if transformer is None:
+            transformer = RecordTransformer.instances.setdefault(key, RecordTransformer(objectname, orgconfig))
+        return transformer
+
+    def __init__(self, objectname, orgconfig):
+        self.objectname = objectname
+        self.orgconfig = orgconfig
+        self.maskedfieldnames = {}
+        self.maskedobjectnames = {}
+        self.matchingkeyfields = MatchingKeysDTO.getinstance().matching_keys[objectname]
+
+    def maskfieldname(self, fieldname):
+        maskedfieldname = nsf.mask(self.orgconfig, fieldname)
+        self.maskedfieldnames[fieldname] = maskedfieldname
+        return maskedfieldname
+
+    def maskobjectname(self, objectname):
+        maskedobjectname = nsf.mask(self.orgconfig, objectname)
+        self.maskedobjectnames[objectname] = maskedobjectname
+        return maskedobjectname
+
+    def transform(self, record, referencefield):
+        fieldresult = {}
+        referenceresult = {}
+        recordresult = {
+            "fieldresult" : fieldresult
+        }
+        if not referencefield:
+            recordresult["referenceresult"] = referenceresult
+
+        maskedfieldnames = self.maskedfieldnames
+        for recordfieldname, recordfielddata in record.items():
+            if recordfieldname == 'attributes':
+                continue
+            key = maskedfieldnames.get(recordfieldname) or self.maskfieldname(recordfieldname)
+            if isinstance(recordfielddata, OrderedDict):
+                referencetype = recordfielddata.get("attributes").get("type")
+                maskedrefobject = self.maskedobjectnames.get(referencetype) or self.maskobjectname(referencetype)
+                referenceresult[key] = RecordTransformer.getinstance(maskedrefobject, self.orgconfig).transform(recordfielddata, True)
+            else:
+                fieldresult[key] = recordfielddata
+
+        matchingkeydetails = self.extractmatchingkey(fieldresult)
+        GlobalResultsDTO.globalobjectmatchingkeyinfomap.setdefault(self.objectname, {})[matchingkeydetails['matchingkey']] = matchingkeydetails['matchingkeyqueryfieldswithdata']
+        recordresult["matchingkeyinfo"] = matchingkeydetails
+        return recordresult
+
+    def extractmatchingkey(self, datafields):
+        # same result as QueryUtils.generatematchingkeyinfo without looking up the matching keys per record
+        matchingkey = ''
+        matchingkeyqueryfieldswithdata = {}
+        for matchingkeyfield in self.matchingkeyfields:
+            if matchingkeyfield not in datafields:
+                raise KeyError("Matching keys not found for object = {} with id = {} and relevant matching key field is {}".format(self.objectname, datafields["id"], matchingkeyfield))
+            matchingkeyvalue = datafields[matchingkeyfield]
+            if matchingkeyvalue == None:
+                print('matching key missing for object  {} and matching key is {} with complete data fields as {}'.format(self.objectname, matchingkeyfield, json.dumps(datafields)))
+            matchingkey = matchingkeyvalue if matchingkey == '' else matchingkey + '-' + matchingkeyvalue
+            matchingkeyqueryfieldswithdata[matchingkeyfield] = matchingkeyvalue
+        return {
+            'matchingkey' : matchingkey,
+            'matchingkeyqueryfieldswithdata' : matchingkeyqueryfieldswithdata,
+            'object' : self.objectname
+        }
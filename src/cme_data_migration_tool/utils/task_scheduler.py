@@ -0,0 +1,49 @@
+import concurrent.futures
+
+
+class TaskScheduler:
+    """
+    Runs named tasks on a bounded worker pool while honouring the dependencies
+    declared between them. A task is only submitted once every task it depends
+    on has finished, independent tasks run at the same time.
+    """
+
+    def __init__(self, max_workers):
+        self.max_workers = max(1, int(max_workers))
+        self.tasks = {}
+        self.dependencies = {}
+
+    def add_task(self, name, function, dependencies=()):
+        if name in self.tasks:
+            raise ValueError("Task {} is already scheduled".format(name))
+        for dependency in dependencies:
+            # dependencies have to be registered first, so the graph can never contain a cycle
+            if dependency not in self.tasks:
+                raise ValueError("Task {} depends on unknown task {}".format(name, dependency))
+        self.tasks[name] = function
+        self.dependencies[name] = set(dependencies)
+        return name
+
+    def run(self):
+        completed = set()
+        pending = dict(self.dependencies)
+        running = {}
+        failure = None
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                if failure is None:
+                    for name in [name for name, dependencies in pending.items() if dependencies <= completed]:
+                        pending.pop(name)
+                        running[pool.submit(self.tasks[name])] = name
+                if not running:
+                    break
+                done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    if future.exception() is not None:
+                        failure = failure or future.exception()
+                    else:
+                        completed.add(name)
+        if failure is not None:
+            raise failure
+        return completed
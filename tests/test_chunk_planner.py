@@ -0,0 +1,148 @@
+"""Tests for chunk_planner.py"""
+import unittest
+from urllib.parse import quote_plus
+
+from tenacity import RetryError, Future
+
+from src.cme_data_migration_tool.simple_salesforce_dmt.exceptions import SalesforceMalformedRequest
+from src.cme_data_migration_tool.utils.chunk_planner import ChunkPlanner
+
+TEMPLATE = "SELECT Id FROM Product2 WHERE Id IN ({})"
+
+
+def ids(count):
+    return ["01t" + str(index).zfill(15) for index in range(count)]
+
+
+class TestChunkPlannerPlan(unittest.TestCase):
+    """Tests for ChunkPlanner.plan"""
+
+    def test_single_chunk(self):
+        """Values that fit the limits stay in one chunk"""
+        values = ids(10)
+        self.assertEqual([values], ChunkPlanner.plan(TEMPLATE, values))
+
+    def test_empty_values(self):
+        self.assertEqual([], ChunkPlanner.plan(TEMPLATE, []))
+
+    def test_soql_limit(self):
+        """Every chunk renders within the soql limit and the chunks keep every value in order"""
+        values = ids(1000)
+        chunks = ChunkPlanner.plan(TEMPLATE, values, soql_limit=2000, url_limit=0)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(values, [value for chunk in chunks for value in chunk])
+        for chunk in chunks:
+            self.assertLessEqual(len(ChunkPlanner.build(TEMPLATE, chunk)), 2000)
+        # chunks are packed, adding the next value would break the limit
+        for chunk, following in zip(chunks, chunks[1:]):
+            self.assertGreater(len(ChunkPlanner.build(TEMPLATE, chunk + following[:1])), 2000)
+
+    def test_url_limit(self):
+        """REST chunks stay within the url limit once url encoded"""
+        values = ids(3000)
+        chunks = ChunkPlanner.plan(TEMPLATE, values)
+        url_limit = ChunkPlanner.URL_LENGTH_LIMIT - ChunkPlanner.URL_HEADROOM
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(len(quote_plus(ChunkPlanner.build(TEMPLATE, chunk))), url_limit)
+        for chunk, following in zip(chunks, chunks[1:]):
+            self.assertGreater(len(quote_plus(ChunkPlanner.build(TEMPLATE, chunk + following[:1]))), url_limit)
+
+    def test_without_url_limit(self):
+        """Bulk queries ignore the url limit and pack up to the soql limit"""
+        values = ids(3000)
+        rest_chunks = ChunkPlanner.plan(TEMPLATE, values)
+        bulk_chunks = ChunkPlanner.plan(TEMPLATE, values, url_limit=0)
+        self.assertLess(len(bulk_chunks), len(rest_chunks))
+        for chunk in bulk_chunks:
+            self.assertLessEqual(len(ChunkPlanner.build(TEMPLATE, chunk)), ChunkPlanner.SOQL_CHARACTER_LIMIT)
+
+    def test_max_items(self):
+        chunks = ChunkPlanner.plan(TEMPLATE, ids(25), max_items=10)
+        self.assertEqual([10, 10, 5], [len(chunk) for chunk in chunks])
+
+    def test_multiple_placeholders(self):
+        """Every placeholder of the template counts against the limits"""
+        template = "SELECT Id FROM PricebookEntry WHERE Product2Id IN ({}) OR Pricebook2Id IN ({})"
+        values = ids(500)
+        single = ChunkPlanner.plan(TEMPLATE, values, soql_limit=5000, url_limit=0)
+        double = ChunkPlanner.plan(template, values, soql_limit=5000, url_limit=0)
+        self.assertGreater(len(double), len(single))
+        for chunk in double:
+            soql = ChunkPlanner.build(template, chunk)
+            self.assertLessEqual(len(soql), 5000)
+            self.assertEqual(2, soql.count(ChunkPlanner.quote_value(chunk[0])))
+
+    def test_custom_render_and_placeholder(self):
+        template = "SELECT Id FROM Product2 WHERE $where$"
+        chunks = ChunkPlanner.plan(template, ["a", "b"], render=lambda value: "Name = '" + value + "'", separator=" OR ", placeholder="$where$")
+        self.assertEqual([["a", "b"]], chunks)
+        self.assertEqual("SELECT Id FROM Product2 WHERE Name = 'a' OR Name = 'b'",
+                         ChunkPlanner.build(template, chunks[0], render=lambda value: "Name = '" + value + "'", separator=" OR ", placeholder="$where$"))
+
+    def test_oversized_value(self):
+        """A value too long for any chunk still gets a chunk of its own"""
+        chunks = ChunkPlanner.plan(TEMPLATE, ["a", "x" * 200, "b"], soql_limit=100, url_limit=0)
+        self.assertEqual([["a"], ["x" * 200], ["b"]], chunks)
+
+
+def too_long_error():
+    return SalesforceMalformedRequest("url", 400, "query", [{"errorCode": "MALFORMED_QUERY", "message": "Query is too long"}])
+
+
+class TestChunkPlannerExecute(unittest.TestCase):
+    """Tests for ChunkPlanner.execute and ChunkPlanner.is_query_too_long"""
+
+    def test_execute_every_chunk(self):
+        values = ids(25)
+        seen = []
+        results = ChunkPlanner.execute(TEMPLATE, values, lambda soql, chunk: seen.append(chunk) or len(chunk), max_items=10)
+        self.assertEqual([10, 10, 5], results)
+        self.assertEqual(values, [value for chunk in seen for value in chunk])
+
+    def test_halve_and_retry(self):
+        """A chunk rejected as too long is split in half and retried in order"""
+        values = ids(8)
+        calls = []
+
+        def executor(soql, chunk):
+            calls.append(len(chunk))
+            if len(chunk) > 2:
+                raise too_long_error()
+            return chunk
+
+        results = ChunkPlanner.execute(TEMPLATE, values, executor)
+        self.assertEqual([8, 4, 2, 2, 4, 2, 2], calls)
+        self.assertEqual(values, [value for chunk in results for value in chunk])
+
+    def test_single_value_is_not_retried(self):
+        def executor(soql, chunk):
+            raise too_long_error()
+
+        with self.assertRaises(SalesforceMalformedRequest):
+            ChunkPlanner.execute(TEMPLATE, ids(1), executor)
+
+    def test_other_errors_are_raised(self):
+        def executor(soql, chunk):
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            ChunkPlanner.execute(TEMPLATE, ids(4), executor)
+
+    def test_is_query_too_long(self):
+        self.assertTrue(ChunkPlanner.is_query_too_long(too_long_error()))
+        self.assertTrue(ChunkPlanner.is_query_too_long(SalesforceMalformedRequest("url", 400, "query", [{"errorCode": "QUERY_TOO_COMPLICATED", "message": ""}])))
+        uri_too_long = SalesforceMalformedRequest("url", 414, "query", "")
+        self.assertTrue(ChunkPlanner.is_query_too_long(uri_too_long))
+        self.assertFalse(ChunkPlanner.is_query_too_long(SalesforceMalformedRequest("url", 400, "query", [{"errorCode": "MALFORMED_QUERY", "message": "unexpected token"}])))
+        self.assertFalse(ChunkPlanner.is_query_too_long(ValueError("boom")))
+
+    def test_is_query_too_long_after_retries(self):
+        """The last attempt of a tenacity RetryError is inspected"""
+        attempt = Future(3)
+        attempt.set_exception(too_long_error())
+        self.assertTrue(ChunkPlanner.is_query_too_long(RetryError(attempt)))
+
+
+if __name__ == '__main__':
+    unittest.main()
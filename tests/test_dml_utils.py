@@ -0,0 +1,158 @@
+"""Tests for dml_utils.py"""
+import csv
+import io
+import unittest
+from unittest import mock
+
+from src.cme_data_migration_tool.utils.dml_utils import DMLUtils
+
+
+class TestPartitionByParent(unittest.TestCase):
+    """Tests for DMLUtils.partition_by_parent"""
+
+    def setUp(self):
+        patcher = mock.patch.object(DMLUtils, 'BATCH_SIZE', 4)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('builtins.print')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_children_of_a_parent_share_a_batch(self):
+        """Records are grouped on the configured parent reference, not on a near constant one"""
+        records = list(range(6))
+        parent_keys = [{'parentproductid__r': 'parent' + str(index % 3), 'pricelistid__r': 'pricelist'} for index in records]
+        batches = DMLUtils.partition_by_parent(records, parent_keys, 'parentproductid__r')
+        for parent in ['parent0', 'parent1', 'parent2']:
+            children = [record for record in records if parent_keys[record]['parentproductid__r'] == parent]
+            self.assertEqual(1, len([batch for batch in batches if set(children) & set(batch)]))
+        self.assertEqual(sorted(records), sorted(record for batch in batches for record in batch))
+        self.assertTrue(all(len(batch) <= 4 for batch in batches))
+
+    def test_large_parent_fills_full_batches(self):
+        records = list(range(10))
+        parent_keys = [{'parentproductid__r': 'parent'} for _ in records]
+        batches = DMLUtils.partition_by_parent(records, parent_keys, 'parentproductid__r')
+        self.assertEqual([4, 4, 2], [len(batch) for batch in batches])
+
+    def test_records_without_parent(self):
+        records = list(range(3))
+        batches = DMLUtils.partition_by_parent(records, [{}, {}, {}], 'parentproductid__r')
+        self.assertEqual([0, 1, 2], sorted(record for batch in batches for record in batch))
+
+    def test_without_partition_field(self):
+        """Objects without a configured partitionfield are batched in record order"""
+        records = list(range(10))
+        parent_keys = [{'pricelistid__r': 'pricelist' + str(index % 2)} for index in records]
+        self.assertEqual([[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]], DMLUtils.partition_by_parent(records, parent_keys, None))
+
+
+class Bulk2Handler:
+    """Hands out the same bulk 2.0 type for every object"""
+
+    def __init__(self, bulk2type):
+        self.bulk2type = bulk2type
+
+    def __getattr__(self, objectname):
+        return self.bulk2type
+
+
+class Bulk2Type:
+    """Runs bulk 2.0 upsert jobs on the uploaded csv, records whose name is in failing fail. Results come back
+    in reverse order like bulk 2.0, which does not keep the upload order"""
+
+    def __init__(self, failing=()):
+        self.failing = failing
+        self.jobs = []
+
+    def _upload_data(self, operation, data, external_id_field=None):
+        record_count, csv_data = data
+        rows = list(csv.DictReader(io.StringIO(csv_data)))
+        assert len(rows) == record_count
+        self.jobs.append(csv_data)
+        failed = [row for row in rows if row.get('name') in self.failing]
+        return {'job_id': 'job' + str(len(self.jobs)), 'numberRecordsProcessed': len(rows), 'numberRecordsFailed': len(failed)}
+
+    def get_all_ingest_records(self, job_id):
+        rows = list(csv.DictReader(io.StringIO(self.jobs[int(job_id[3:]) - 1])))
+        successful = [dict(row, sf__Id=row['id'] or 'new-' + row['name'], sf__Created=str(row['id'] == '').lower()) for row in rows if row['name'] not in self.failing]
+        failed = [dict(row, sf__Id='', sf__Error='REQUIRED_FIELD_MISSING') for row in rows if row['name'] in self.failing]
+        return {'successfulRecords': successful[::-1], 'failedRecords': failed, 'unprocessedRecords': []}
+
+
+class TestBulkv2(unittest.TestCase):
+    """Tests for the bulk 2.0 csv upload of DMLUtils"""
+
+    def setUp(self):
+        patcher = mock.patch('builtins.print')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def upsert(self, records, bulk2type, max_size, job_callback=None):
+        orgconfig = mock.Mock()
+        orgconfig.org_connector.bulk2 = Bulk2Handler(bulk2type)
+        with mock.patch.object(DMLUtils, 'BULKV2_JOB_SIZE', max_size):
+            return DMLUtils.upsert_bulkv2(orgconfig, 'Product2', records, job_callback)
+
+    def test_csv_values(self):
+        """None clears a field with #N/A, booleans are written the way bulk 2.0 reads them"""
+        self.assertEqual('#N/A', DMLUtils.csv_value(None))
+        self.assertEqual('true', DMLUtils.csv_value(True))
+        self.assertEqual('false', DMLUtils.csv_value(False))
+        self.assertEqual(0, DMLUtils.csv_value(0))
+        self.assertEqual('', DMLUtils.csv_value(''))
+
+    def test_header_is_the_union_of_fields(self):
+        records = [{'id': '01t1', 'name': 'A, "quoted"'}, {'name': 'B', 'isactive': True}, {'description': None}]
+        chunks = list(DMLUtils.records_to_csv(records, 1024))
+        self.assertEqual([(3, 'id,name,isactive,description\n01t1,"A, ""quoted""",,\n,B,true,\n,,,#N/A\n')], chunks)
+
+    def test_split_at_max_size(self):
+        records = [{'id': '', 'name': 'record' + str(index)} for index in range(10)]
+        header_size = len('id,name\n')
+        line_size = len(',record0\n')
+        chunks = list(DMLUtils.records_to_csv(records, header_size + 3 * line_size))
+        self.assertEqual([3, 3, 3, 1], [record_count for record_count, _ in chunks])
+        for record_count, csv_data in chunks:
+            self.assertTrue(csv_data.startswith('id,name\n'))
+            self.assertLessEqual(len(csv_data), header_size + 3 * line_size)
+            self.assertEqual(record_count, len(csv_data.splitlines()) - 1)
+        # a record larger than max_size still gets a job of its own
+        self.assertEqual([1, 1], [record_count for record_count, _ in DMLUtils.records_to_csv(records[:2], 1)])
+
+    def test_jobs_and_callback_slices(self):
+        """Records are split into jobs at the job size and every job hands its own records to the callback"""
+        records = [{'id': '' if index % 2 else '01t' + str(index), 'name': 'record' + str(index)} for index in range(7)]
+        bulk2type = Bulk2Type()
+        job_callback = mock.Mock()
+        line_size = len('01t0,record0\n')
+        result = self.upsert(records, bulk2type, len('id,name\n') + 3 * line_size, job_callback)
+        self.assertEqual(3, len(bulk2type.jobs))
+        self.assertEqual([records[0:3], records[3:6], records[6:7]], [call.args[0] for call in job_callback.call_args_list])
+        self.assertEqual(7, len(result['successfulRecords']))
+        self.assertEqual([], result['failedRecords'])
+
+    def test_callback_results_per_record(self):
+        """Created records get the sf__Id bulk 2.0 returns and jobs with failed records still report their successes"""
+        records = [
+            {'id': '01t0', 'name': 'updated', 'isactive': True, 'description': None},
+            {'id': '', 'name': 'created', 'isactive': False, 'description': 'x'},
+            {'id': '', 'name': 'failing', 'isactive': False, 'description': 'x'},
+            {'id': '', 'name': 'created', 'isactive': False, 'description': 'x'},
+        ]
+        job_callback = mock.Mock()
+        result = self.upsert(records, Bulk2Type(failing=('failing',)), 1024, job_callback)
+        self.assertEqual(1, len(result['failedRecords']))
+        job_callback.assert_called_once_with(records, [
+            {'success': True, 'id': '01t0'},
+            {'success': True, 'id': 'new-created'},
+            {'success': False, 'id': None},
+            {'success': True, 'id': 'new-created'},
+        ])
+
+    def test_no_records(self):
+        self.assertEqual({'successfulRecords': [], 'failedRecords': [], 'unprocessedRecords': []}, self.upsert([], Bulk2Type(), 1024))
+
+
+if __name__ == '__main__':
+    unittest.main()
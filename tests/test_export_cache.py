@@ -0,0 +1,128 @@
+"""Tests for export_cache.py"""
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from src.cme_data_migration_tool.utils.export_cache import ExportCache
+from src.cme_data_migration_tool.utils.query_utils import QueryUtils
+
+
+def record(recordid, modstamp, payload=''):
+    return {
+        'fieldresult': {'id': recordid, 'systemmodstamp': modstamp, 'description': payload},
+        'referenceresult': {},
+        'matchingkeyinfo': {'object': 'product2', 'matchingkey': 'key' + recordid, 'matchingkeyqueryfieldswithdata': {}}
+    }
+
+
+class TestExportCache(unittest.TestCase):
+    """Tests for ExportCache"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'cache', 'export_cache.db')
+        self.clock = iter(range(1, 1000))
+        patcher = mock.patch('src.cme_data_migration_tool.utils.export_cache.time.time', side_effect=lambda: next(self.clock))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('builtins.print')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cache = ExportCache(self.path, 1)
+        self.addCleanup(self.cache.connection.close)
+
+    def sizes(self):
+        return {recordid: size for recordid, size in self.cache.connection.execute("SELECT id, size FROM records")}
+
+    def test_put_and_get(self):
+        self.cache.put('org', 'product2', 'fields', {'01t1': record('01t1', 'm1')})
+        cached = self.cache.get('org', 'product2', 'fields', ['01t1', '01t2'])
+        self.assertEqual(['01t1'], list(cached))
+        self.assertEqual('m1', cached['01t1'][0])
+        self.assertEqual(record('01t1', 'm1'), json.loads(cached['01t1'][1]))
+        # orgs and objects are kept apart
+        self.assertEqual({}, self.cache.get('other', 'product2', 'fields', ['01t1']))
+        self.assertEqual({}, self.cache.get('org', 'pricebookentry', 'fields', ['01t1']))
+        self.assertEqual({}, self.cache.get('org', 'product2', 'other fields', ['01t1']))
+
+    def test_evict_least_recently_used(self):
+        """Records used longest ago are evicted until the cache fits its size"""
+        for recordid in ['01t1', '01t2', '01t3']:
+            self.cache.put('org', 'product2', 'fields', {recordid: record(recordid, 'm1', 'x' * 400000)})
+        # reading the first record makes the second one the least recently used
+        self.cache.get('org', 'product2', 'fields', ['01t1'])
+        self.cache.evict()
+        self.assertEqual({'01t1', '01t3'}, set(self.sizes()))
+        self.assertLessEqual(sum(self.sizes().values()), self.cache.max_size)
+
+    def test_no_eviction_within_size(self):
+        self.cache.put('org', 'product2', 'fields', {'01t1': record('01t1', 'm1'), '01t2': record('01t2', 'm1')})
+        self.cache.evict()
+        self.assertEqual({'01t1', '01t2'}, set(self.sizes()))
+
+    def query_by_id(self, modstamps, fetched, fields='Id,Name,SystemModstamp'):
+        connector = mock.Mock()
+        connector.query_all.return_value = {'records': [{'Id': recordid, 'SystemModstamp': modstamp} for recordid, modstamp in modstamps.items()]}
+        orgconfig = mock.Mock(username='org', org_connector=connector)
+        objconfig = mock.Mock(objectname='product2')
+        objconfig.get_fields_to_query.return_value = fields
+        with mock.patch('src.cme_data_migration_tool.utils.export_cache.nsf.unmask', side_effect=lambda orgconfig, name: name), \
+                mock.patch.object(QueryUtils, 'query_by_field', return_value=fetched) as query_by_field:
+            results = self.cache.query_by_id(objconfig, orgconfig, list(modstamps), None)
+        return results, query_by_field
+
+    def test_query_by_id_serves_unchanged_records(self):
+        """Records whose SystemModstamp did not move are served from the cache, the others are queried and cached"""
+        self.query_by_id({'01t1': 'm1', '01t2': 'm1'}, {'01t1': record('01t1', 'm1'), '01t2': record('01t2', 'm1')})
+        self.cache.hits, self.cache.misses = 0, 0
+        fetched = {'01t2': record('01t2', 'm2'), '01t3': record('01t3', 'm1')}
+        results, query_by_field = self.query_by_id({'01t1': 'm1', '01t2': 'm2', '01t3': 'm1'}, fetched)
+        self.assertEqual(['01t2', '01t3'], query_by_field.call_args.args[3])
+        self.assertEqual({'01t1', '01t2', '01t3'}, set(results))
+        self.assertEqual('m2', results['01t2']['fieldresult']['systemmodstamp'])
+        self.assertEqual((1, 2), (self.cache.hits, self.cache.misses))
+
+    def test_changed_fields_are_stale(self):
+        """Records cached from another field list are queried again"""
+        self.query_by_id({'01t1': 'm1'}, {'01t1': record('01t1', 'm1')})
+        results, query_by_field = self.query_by_id({'01t1': 'm1'}, {'01t1': record('01t1', 'm1', 'new field')}, fields='Id,Name,Description,SystemModstamp')
+        self.assertEqual(['01t1'], query_by_field.call_args.args[3])
+        self.assertEqual('new field', results['01t1']['fieldresult']['description'])
+        results, query_by_field = self.query_by_id({'01t1': 'm1'}, {}, fields='Id,Name,Description,SystemModstamp')
+        query_by_field.assert_not_called()
+        self.assertEqual('new field', results['01t1']['fieldresult']['description'])
+
+    def test_hits_with_records_deleted_meanwhile(self):
+        """Stale records that are gone by the time they are queried do not reduce the hits"""
+        self.query_by_id({'01t1': 'm1'}, {'01t1': record('01t1', 'm1')})
+        self.cache.hits, self.cache.misses = 0, 0
+        results, _query_by_field = self.query_by_id({'01t1': 'm1', '01t2': 'm1', '01t3': 'm1'}, {})
+        self.assertEqual(['01t1'], list(results))
+        self.assertEqual((1, 2), (self.cache.hits, self.cache.misses))
+
+    def test_cache_without_fields_starts_over(self):
+        self.cache.connection.close()
+        os.remove(self.path)
+        connection = sqlite3.connect(self.path)
+        connection.execute("CREATE TABLE records (org TEXT, object TEXT, id TEXT, hash TEXT, systemmodstamp TEXT, record TEXT, size INTEGER, last_used REAL, PRIMARY KEY (org, object, id))")
+        connection.execute("INSERT INTO records VALUES ('org', 'product2', '01t1', 'h', 'm1', '{}', 2, 1)")
+        connection.commit()
+        connection.close()
+        self.cache = ExportCache(self.path, 1)
+        self.addCleanup(self.cache.connection.close)
+        self.assertEqual({}, self.sizes())
+        self.cache.put('org', 'product2', 'fields', {'01t1': record('01t1', 'm1')})
+        self.assertEqual(['01t1'], list(self.cache.get('org', 'product2', 'fields', ['01t1'])))
+
+    def test_open_and_close(self):
+        self.assertIs(ExportCache.open(self.path, 1), ExportCache.open(self.path, 1))
+        ExportCache.close()
+        self.assertIsNone(ExportCache.instance)
+
+
+if __name__ == '__main__':
+    unittest.main()
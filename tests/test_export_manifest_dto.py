@@ -0,0 +1,94 @@
+"""Tests for export_manifest_dto.py"""
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+from src.cme_data_migration_tool.dtos.runtime_dtos.export_manifest_dto import ExportManifestDTO
+
+
+def record(recordid, modstamp, **fields):
+    fieldresult = {'id': recordid, 'systemmodstamp': modstamp}
+    fieldresult.update(fields)
+    return {'fieldresult': fieldresult, 'referenceresult': {}}
+
+
+class TestExportManifestDTO(unittest.TestCase):
+    """Tests for ExportManifestDTO"""
+
+    def setUp(self):
+        ExportManifestDTO.instance = None
+        self.manifest = ExportManifestDTO('user@example.com')
+
+    def test_new_record_has_changed(self):
+        self.assertTrue(self.manifest.haschanged('product2', record('01t1', '2024-01-31T10:15:30.000+0000', name='A')))
+
+    def test_same_content_has_not_changed(self):
+        self.manifest.haschanged('product2', record('01t1', '2024-01-31T10:15:30.000+0000', name='A'))
+        # a moved SystemModstamp alone is not a change
+        self.assertFalse(self.manifest.haschanged('product2', record('01t1', '2024-02-01T08:00:00.000+0000', name='A', lastmodifieddate='2024-02-01')))
+
+    def test_changed_content(self):
+        self.manifest.haschanged('product2', record('01t1', '2024-01-31T10:15:30.000+0000', name='A'))
+        self.assertTrue(self.manifest.haschanged('product2', record('01t1', '2024-02-01T08:00:00.000+0000', name='B')))
+
+    def test_changed_reference(self):
+        self.manifest.haschanged('product2', record('01t1', '2024-01-31T10:15:30.000+0000', name='A'))
+        changed = record('01t1', '2024-01-31T10:15:30.000+0000', name='A')
+        changed['referenceresult'] = {'recordtypeid': 'Product'}
+        self.assertTrue(self.manifest.haschanged('product2', changed))
+
+    def test_watermark_is_the_run_start(self):
+        """The watermark is the org time at the start of the run less the margin, not the highest stamp seen"""
+        self.assertIsNone(self.manifest.getmodstampcondition('product2'))
+        self.manifest.startrun(datetime(2024, 3, 1, 12, 0, tzinfo=timezone.utc))
+        self.manifest.haschanged('product2', record('01t1', '2024-01-31T10:15:30.000+0000'))
+        self.manifest.haschanged('product2', record('01t2', '2024-03-01T12:30:00.000+0000'))
+        self.assertEqual('2024-03-01T11:45:00.000+0000', self.manifest.getobjectmanifest('product2')['watermark'])
+        # objects that were not exported in the run keep their watermark
+        self.assertIsNone(self.manifest.getobjectmanifest('pricebookentry')['watermark'])
+
+    def test_modification_between_two_fetches(self):
+        """A record modified after it was fetched is fetched again by the next run, even when a record
+        fetched later in the run carries a higher stamp"""
+        self.manifest.startrun(datetime(2024, 3, 1, 12, 0, tzinfo=timezone.utc))
+        self.manifest.haschanged('product2', record('01t1', '2024-03-01T11:00:00.000+0000', name='A'))
+        # 01t1 is modified at 12:01, a later chunk fetches 01t2 modified at 12:02
+        self.manifest.haschanged('product2', record('01t2', '2024-03-01T12:02:00.000+0000', name='B'))
+        condition = self.manifest.getmodstampcondition('product2')
+        self.assertEqual('systemmodstamp >= 2024-03-01T11:45:00Z', condition)
+        self.assertLessEqual(condition.split(' >= ')[1], '2024-03-01T12:01:00Z')
+
+    def test_modstamp_condition_in_utc(self):
+        self.manifest.startrun(datetime(2024, 1, 31, 10, 30, 30, tzinfo=timezone.utc).astimezone(timezone(timedelta(hours=2))))
+        self.manifest.haschanged('product2', record('01t1', '2024-01-31T10:15:30.000+0200'))
+        self.assertEqual('systemmodstamp >= 2024-01-31T10:15:30Z', self.manifest.getmodstampcondition('product2'))
+
+    def test_splitids(self):
+        self.manifest.haschanged('product2', record('01t1', '2024-01-31T10:15:30.000+0000'))
+        self.assertEqual((['01t1'], ['01t2']), self.manifest.splitids('product2', ['01t1', '01t2']))
+        # objects and orgs are tracked apart
+        self.assertEqual(([], ['01t1']), self.manifest.splitids('pricebookentry', ['01t1']))
+        other = ExportManifestDTO('other@example.com', orgs=self.manifest.orgs)
+        self.assertEqual(([], ['01t1']), other.splitids('product2', ['01t1']))
+
+    def test_save_and_load(self):
+        self.manifest.startrun(datetime(2024, 1, 31, 10, 30, 30, tzinfo=timezone.utc))
+        self.manifest.haschanged('product2', record('01t1', '2024-01-31T10:15:30.000+0000', name='A'))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'results', 'export_manifest.json')
+            with mock.patch.object(ExportManifestDTO, 'manifest_path', path):
+                self.manifest.save()
+                orgconfig = mock.Mock(username='user@example.com')
+                loaded = ExportManifestDTO.getinstance(orgconfig)
+        self.assertIsNot(self.manifest, loaded)
+        self.assertFalse(loaded.haschanged('product2', record('01t1', '2024-01-31T10:15:30.000+0000', name='A')))
+        self.assertEqual('systemmodstamp >= 2024-01-31T10:15:30Z', loaded.getmodstampcondition('product2'))
+
+    def tearDown(self):
+        ExportManifestDTO.instance = None
+
+
+if __name__ == '__main__':
+    unittest.main()
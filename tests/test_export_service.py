@@ -0,0 +1,79 @@
+"""Tests for export_service.py"""
+import json
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from src.cme_data_migration_tool.dtos.runtime_dtos.global_results_dto import GlobalResultsDTO
+from src.cme_data_migration_tool.services import export_service
+from src.cme_data_migration_tool.services.export_service import ExportService
+
+
+def exportservice(directory, recordids):
+    """ExportService with the results of an export, without querying"""
+    service = ExportService.__new__(ExportService)
+    service.test = False
+    service.printtest = False
+    service.objectnametoquery = 'product2'
+    service.base_object_name = 'product2'
+    service.results_directory_path = Path(directory)
+    service.object_results = {recordid: {'fieldresult': {'id': recordid}, 'matchingkeyinfo': {'matchingkey': 'key' + recordid}} for recordid in recordids}
+    return service
+
+
+class TestSaveNdjsonResults(unittest.TestCase):
+    """Tests for ExportService.save_ndjson_results"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        patchers = [
+            mock.patch.object(GlobalResultsDTO, 'globalndjsonindexmap', {}),
+            mock.patch.object(GlobalResultsDTO, 'globalndjsonlockmap', {}),
+            mock.patch.object(GlobalResultsDTO, 'globalobjectimportfileinfomap', {}),
+            mock.patch.object(GlobalResultsDTO, 'export_run_id', 'run')
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def read(self, matchingkey):
+        ndjsonindex = GlobalResultsDTO.globalndjsonindexmap['product2']
+        offset, length = ndjsonindex['offsets'][matchingkey]
+        with open(Path(self.directory) / ndjsonindex['file'], 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.read(length))
+
+    def test_concurrent_appends(self):
+        """Services of the same object append to one file and every offset points at its record"""
+        services = [exportservice(self.directory, ['01t{}_{}'.format(thread, index) for index in range(200)]) for thread in range(4)]
+        threads = [threading.Thread(target=service.save_ndjson_results) for service in services]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(['product2_run.ndjson'], GlobalResultsDTO.globalobjectimportfileinfomap['product2'])
+        self.assertEqual(800, len(GlobalResultsDTO.globalndjsonindexmap['product2']['offsets']))
+        for service in services:
+            for recordid, record in service.object_results.items():
+                self.assertEqual(record, self.read('key' + recordid))
+
+    def test_global_lock_is_free_while_writing(self):
+        acquired = []
+
+        def dumps(value):
+            # another thread, e.g. a query counting its api calls, takes the global lock during the write
+            thread = threading.Thread(target=lambda: acquired.append(GlobalResultsDTO.lock.acquire(timeout=1) and GlobalResultsDTO.lock.release() is None))
+            thread.start()
+            thread.join()
+            return json.JSONEncoder().encode(value)
+        with mock.patch.object(export_service.json, 'dumps', side_effect=dumps):
+            exportservice(self.directory, ['01t1']).save_ndjson_results()
+        self.assertEqual([True], acquired)
+
+
+if __name__ == '__main__':
+    unittest.main()
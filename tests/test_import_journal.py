@@ -0,0 +1,70 @@
+"""Tests for import_journal.py"""
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from src.cme_data_migration_tool.utils.import_journal import ImportJournal
+
+
+class TestImportJournal(unittest.TestCase):
+    """Tests for ImportJournal"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        patcher = mock.patch.object(ImportJournal, 'JOURNAL_PATH', os.path.join(directory.name, 'import_results', 'journal_{}.jsonl'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch('builtins.print')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def events(self, journal):
+        with open(journal.path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_start_writes_the_import_file(self):
+        journal = ImportJournal.start('epc_import_args_sample')
+        self.assertEqual([{'event': 'start', 'importfile': 'epc_import_args_sample'}], self.events(journal))
+
+    def test_record_batch_keeps_successes_only(self):
+        journal = ImportJournal.start('epc_import_args_sample')
+        journal.record_batch('product2', ['key1', 'key2', 'key3'], [
+            {'success': True, 'id': '01t1'},
+            {'success': False, 'errors': [{'statusCode': 'UNABLE_TO_LOCK_ROW'}]},
+            {'success': True, 'id': '01t3'}
+        ])
+        journal.record_batch('product2', ['key4'], [{'success': False}])
+        self.assertEqual({'key1', 'key3'}, journal.get_completed_keys('product2'))
+        self.assertEqual(2, len(self.events(journal)))
+
+    def test_resume(self):
+        """A resumed run has the objects and records of the interrupted run as complete"""
+        journal = ImportJournal.start('epc_import_args_sample')
+        journal.record_batch('product2', ['key1'], [{'success': True, 'id': '01t1'}])
+        journal.record_object('product2', ['product2', 0, 1])
+        journal.record_batch('pricebookentry', ['key2'], [{'success': True, 'id': '01u2'}])
+
+        resumed = ImportJournal.start(None, journal.run_id)
+        self.assertEqual('epc_import_args_sample', resumed.importfile)
+        self.assertEqual({'product2': ['product2', 0, 1]}, resumed.completed_objects)
+        self.assertEqual({'key2'}, resumed.get_completed_keys('pricebookentry'))
+        self.assertEqual({'key1': '01t1'}, resumed.completed_records['product2'])
+
+    def test_resume_skips_a_torn_last_line(self):
+        journal = ImportJournal.start('epc_import_args_sample')
+        journal.record_batch('product2', ['key1'], [{'success': True, 'id': '01t1'}])
+        with open(journal.path, 'a') as f:
+            f.write('{"event": "batch", "object": "product2", "rec')
+        resumed = ImportJournal.start(None, journal.run_id)
+        self.assertEqual({'key1'}, resumed.get_completed_keys('product2'))
+
+    def test_resume_unknown_run(self):
+        with self.assertRaises(FileNotFoundError):
+            ImportJournal.start(None, 'unknown')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+"""Tests for import_sequence_dto.py"""
+import unittest
+from unittest import mock
+
+from src.cme_data_migration_tool.dtos.configurations_dtos.import_sequence_dto import ImportSequenceDTO
+from src.cme_data_migration_tool.dtos.configurations_dtos.migration_obj_template_dto import MigrationObjTemplateDTO
+
+
+def objectconfigs(references):
+    """getdestinationinstance replacement returning configurations with the given referenced objects"""
+    def getdestinationinstance(objectname):
+        return mock.Mock(referencefields=[mock.Mock(fieldobject=fieldobject) for fieldobject in references.get(objectname, [])])
+    return getdestinationinstance
+
+
+class TestImportSequenceDTO(unittest.TestCase):
+    """Tests for ImportSequenceDTO.getlevels"""
+
+    def setUp(self):
+        patcher = mock.patch('builtins.print')
+        self.print = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def getlevels(self, sequence, references, objects=None, implicitreferences=None, mode="computed"):
+        importsequencedto = ImportSequenceDTO(sequence=sequence, implicitreferences=implicitreferences or {})
+        with mock.patch.object(MigrationObjTemplateDTO, 'getdestinationinstance', side_effect=objectconfigs(references)):
+            return importsequencedto.getlevels(objects if objects is not None else sequence, mode)
+
+    def test_configured_is_the_default(self):
+        importsequencedto = ImportSequenceDTO(sequence=['a', 'b', 'c'])
+        self.assertEqual([['a'], ['b'], ['c']], importsequencedto.getlevels(['c', 'a', 'b']))
+
+    def test_levels_follow_references(self):
+        """Objects only reference objects of earlier levels, a level keeps the configured order"""
+        levels = self.getlevels(['pricebookentry', 'pricebook2', 'product2', 'productchilditem', 'pricelist'],
+                                {'pricebookentry': ['pricebook2', 'product2'], 'productchilditem': ['product2']})
+        self.assertEqual([['pricebook2', 'product2', 'pricelist'], ['pricebookentry', 'productchilditem']], levels)
+
+    def test_only_given_objects(self):
+        """Objects that are not imported neither get a level nor order anything"""
+        levels = self.getlevels(['pricebook2', 'product2', 'pricebookentry'], {'pricebookentry': ['pricebook2', 'product2']}, objects=['pricebookentry', 'product2'])
+        self.assertEqual([['product2'], ['pricebookentry']], levels)
+
+    def test_self_reference(self):
+        levels = self.getlevels(['product2', 'pricelist'], {'pricelist': ['pricelist', 'product2']})
+        self.assertEqual([['product2'], ['pricelist']], levels)
+        self.print.assert_any_call("import sequence self reference: pricelist references itself")
+
+    def test_implicit_references(self):
+        """References that are not referencefields are declared as implicitreferences"""
+        sequence = ['objectclass', 'product2', 'attributeassignment']
+        self.assertEqual([sequence], self.getlevels(sequence, {}))
+        levels = self.getlevels(sequence, {}, implicitreferences={'attributeassignment': ['product2', 'objectclass']})
+        self.assertEqual([['objectclass', 'product2'], ['attributeassignment']], levels)
+        self.print.assert_any_call("import sequence implicit reference: attributeassignment follows product2, objectclass")
+
+    def test_cycle_is_broken_at_the_first_configured_object(self):
+        levels = self.getlevels(['product2', 'a', 'b', 'c'], {'a': ['c'], 'b': ['a'], 'c': ['b', 'product2']})
+        self.assertEqual([['product2'], ['a'], ['b'], ['c']], levels)
+        self.print.assert_any_call("import sequence cycle: a references c, it is imported before them")
+
+    def test_object_behind_a_cycle(self):
+        """An object waiting on a cycle is not picked to break it"""
+        levels = self.getlevels(['d', 'a', 'b'], {'d': ['a'], 'a': ['b'], 'b': ['a']})
+        self.assertEqual([['a'], ['d', 'b']], levels)
+
+    def test_print_levels(self):
+        ImportSequenceDTO.print_levels([['a', 'b'], ['c']])
+        self.print.assert_has_calls([mock.call("import level 1: a, b"), mock.call("import level 2: c")])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+"""Tests for object_results_dto.py and the field hashes of object_matching_keys_dto.py"""
+import unittest
+from unittest import mock
+
+from src.cme_data_migration_tool.dtos.configurations_dtos.org_config_dto import OrgConfigDTO
+from src.cme_data_migration_tool.dtos.runtime_dtos.object_matching_keys_dto import ObjectMatchingKeyDTO
+from src.cme_data_migration_tool.dtos.runtime_dtos.object_results_dto import ObjectResultsDTO
+
+
+class TestFieldHash(unittest.TestCase):
+    """Tests for ObjectMatchingKeyDTO.fieldhash"""
+
+    def test_numbers_are_equal_across_types(self):
+        self.assertEqual(ObjectMatchingKeyDTO.fieldhash(1), ObjectMatchingKeyDTO.fieldhash(1.0))
+        self.assertNotEqual(ObjectMatchingKeyDTO.fieldhash(1), ObjectMatchingKeyDTO.fieldhash(1.5))
+
+    def test_empty_string_is_null(self):
+        self.assertEqual(ObjectMatchingKeyDTO.fieldhash(''), ObjectMatchingKeyDTO.fieldhash(None))
+
+    def test_booleans_are_not_numbers(self):
+        self.assertNotEqual(ObjectMatchingKeyDTO.fieldhash(True), ObjectMatchingKeyDTO.fieldhash(1))
+        self.assertNotEqual(ObjectMatchingKeyDTO.fieldhash(False), ObjectMatchingKeyDTO.fieldhash(None))
+
+    def test_values_of_other_types(self):
+        self.assertNotEqual(ObjectMatchingKeyDTO.fieldhash('1'), ObjectMatchingKeyDTO.fieldhash(1))
+        self.assertEqual(ObjectMatchingKeyDTO.fieldhash({'b': 1, 'a': 2}), ObjectMatchingKeyDTO.fieldhash({'a': 2, 'b': 1}))
+
+
+def objectinfo(matchingkey, fieldresult, parentkey=None):
+    """Exported record of the results files"""
+    info = {'fieldresult': fieldresult, 'matchingkeyinfo': {'matchingkey': matchingkey}}
+    if parentkey is not None:
+        info['referenceresult'] = {'$namespace$__catalogid__c': {'matchingkeyinfo': {'matchingkey': parentkey}}}
+    return info
+
+
+class TestUpdateResults(unittest.TestCase):
+    """Tests for ObjectResultsDTO.update_results with and without the destination field hashes"""
+
+    def setUp(self):
+        patcher = mock.patch.object(OrgConfigDTO, 'getdestinationorg', return_value=mock.Mock(namespace='vlocity_cmt'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.objectconfig = mock.Mock(referencetofieldmapping={}, readonlyfields=['createddate'], createablefields=['$namespace$__code__c'])
+
+    def matchingkeyresults(self, ids, hashes=None):
+        return mock.Mock(matching_key_results=ids, matching_key_hashes=hashes if hashes is not None else {})
+
+    def destination(self, **fields):
+        return {field.replace('ns_', '$namespace$__'): ObjectMatchingKeyDTO.fieldhash(value) for field, value in fields.items()}
+
+    def test_without_hashes(self):
+        """Existing records get the destination id and all updatable fields, new records all writable fields"""
+        results = ObjectResultsDTO(self.objectconfig, self.matchingkeyresults({'key1': '01t1'}), [
+            objectinfo('key1', {'id': '01tsource1', 'name': 'A', 'createddate': 'x', '$namespace$__code__c': 'A1'}, parentkey='catalog'),
+            objectinfo('key2', {'id': '01tsource2', 'name': 'B', '$namespace$__code__c': 'B1'}),
+        ])
+        self.assertEqual([{'id': '01t1', 'name': 'A'}], results.existing_records)
+        self.assertEqual([{'name': 'B', 'vlocity_cmt__code__c': 'B1'}], results.new_records)
+        self.assertEqual([{'$namespace$__catalogid__c': 'catalog'}], results.existing_parent_keys)
+        self.assertEqual((['key1'], ['key2']), (results.existing_matching_keys, results.new_matching_keys))
+        self.assertEqual((1, 1, 0), (results.existing_record_count, results.new_record_count, results.unchanged_record_count))
+
+    def test_unchanged_fields_are_dropped(self):
+        hashes = {'key1': self.destination(name='A', ns_price__c=1, description=None)}
+        results = ObjectResultsDTO(self.objectconfig, self.matchingkeyresults({'key1': '01t1'}, hashes), [
+            objectinfo('key1', {'name': 'A', '$namespace$__price__c': 1.0, 'description': 'changed'}),
+        ])
+        self.assertEqual([{'id': '01t1', 'description': 'changed'}], results.existing_records)
+        self.assertEqual(0, results.unchanged_record_count)
+
+    def test_fields_without_a_hash_are_sent(self):
+        hashes = {'key1': self.destination(name='A')}
+        results = ObjectResultsDTO(self.objectconfig, self.matchingkeyresults({'key1': '01t1'}, hashes), [
+            objectinfo('key1', {'name': 'A', 'description': ''}),
+        ])
+        self.assertEqual([{'id': '01t1', 'description': ''}], results.existing_records)
+
+    def test_unchanged_records_are_skipped(self):
+        """Records without a changed field leave the existing records, parent keys and matching keys together"""
+        hashes = {
+            'key1': self.destination(name='A', description=None),
+            'key2': self.destination(name='B', description=None),
+            'key3': self.destination(name='C', description='old'),
+        }
+        results = ObjectResultsDTO(self.objectconfig, self.matchingkeyresults({'key1': '01t1', 'key2': '01t2', 'key3': '01t3'}, hashes), [
+            objectinfo('key1', {'id': '01tsource1', 'name': 'A', 'description': ''}, parentkey='catalog1'),
+            objectinfo('key2', {'name': 'B2', 'description': None}, parentkey='catalog2'),
+            objectinfo('key3', {'name': 'C', 'description': 'old', 'createddate': 'x'}, parentkey='catalog3'),
+            objectinfo('key4', {'name': 'D'}, parentkey='catalog4'),
+        ])
+        self.assertEqual([{'id': '01t2', 'name': 'B2'}], results.existing_records)
+        self.assertEqual([{'$namespace$__catalogid__c': 'catalog2'}], results.existing_parent_keys)
+        self.assertEqual(['key2'], results.existing_matching_keys)
+        self.assertEqual([{'name': 'D'}], results.new_records)
+        self.assertEqual(['key4'], results.new_matching_keys)
+        self.assertEqual((1, 1, 2), (results.existing_record_count, results.new_record_count, results.unchanged_record_count))
+        self.assertEqual(['key2', 'key4'], results.get_matching_keys())
+        self.assertEqual([{'$namespace$__catalogid__c': 'catalog2'}, {'$namespace$__catalogid__c': 'catalog4'}], results.get_parent_keys())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+"""Tests for org_config_dto.py"""
+import unittest
+from unittest import mock
+
+from src.cme_data_migration_tool.dtos.configurations_dtos import org_config_dto
+from src.cme_data_migration_tool.dtos.configurations_dtos.org_config_dto import OrgConfigDTO
+
+
+class TestOrgConfigDTO(unittest.TestCase):
+    """Tests for the bulk caps of OrgConfigDTO"""
+
+    def setUp(self):
+        patcher = mock.patch.object(org_config_dto, 'Salesforce')
+        patcher.start().return_value.bulk_url = 'https://na15.salesforce.com/services/async/59.0/'
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(org_config_dto.BulkOrchestrator, 'configure')
+        self.configure = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_default_bulk_caps(self):
+        orgconfig = OrgConfigDTO(username='user@example.com', namespace='vlocity_cmt')
+        self.assertEqual((10, 50), (orgconfig.bulk_max_open_jobs, orgconfig.bulk_max_in_flight_batches))
+        self.configure.assert_called_once_with('https://na15.salesforce.com/services/async/59.0/', 10, 50)
+
+    def test_configured_bulk_caps(self):
+        OrgConfigDTO(username='user@example.com', namespace='vlocity_cmt', bulk_max_open_jobs='4', bulk_max_in_flight_batches=20)
+        self.configure.assert_called_once_with('https://na15.salesforce.com/services/async/59.0/', 4, 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
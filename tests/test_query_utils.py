@@ -0,0 +1,231 @@
+"""Tests for query_utils.py"""
+import re
+import unittest
+from collections import OrderedDict
+from datetime import datetime, timezone
+from unittest import mock
+
+from src.cme_data_migration_tool.dtos.configurations_dtos.matching_keys_dto import MatchingKeysDTO
+from src.cme_data_migration_tool.utils.chunk_planner import ChunkPlanner
+from src.cme_data_migration_tool.utils.query_utils import QueryUtils
+
+
+class Bulk2Type:
+    def __init__(self, queries):
+        self.queries = queries
+
+    def query(self, dataquery):
+        self.queries.append(dataquery)
+        yield "Id\n"
+
+
+class Bulk2Handler:
+    def __init__(self, queries):
+        self.queries = queries
+
+    def __getattr__(self, name):
+        return Bulk2Type(self.queries)
+
+
+class Connector:
+    """Records the rest and bulk 2.0 queries made"""
+
+    def __init__(self):
+        self.rest_queries = []
+        self.bulk_queries = []
+        self.bulk2 = Bulk2Handler(self.bulk_queries)
+
+    def query(self, dataquery):
+        self.rest_queries.append(dataquery)
+        return {'totalSize': 0, 'done': True, 'records': []}
+
+
+class TestQueryByField(unittest.TestCase):
+    """Tests for the choice between rest and bulk 2.0 in QueryUtils.query_by_field"""
+
+    def setUp(self):
+        self.connector = Connector()
+        self.orgconfig = mock.Mock(bulk_query_threshold=20000, org_connector=self.connector, username='user@example.com')
+        self.objconfig = mock.Mock(objectname='product2', referencefields=[], referencefieldtoobject={})
+        self.objconfig.get_fields_to_query.return_value = 'Id'
+        patchers = [
+            mock.patch.object(QueryUtils, 'get_csv_field_converters', return_value=({}, {})),
+            mock.patch('src.cme_data_migration_tool.utils.query_utils.nsf.unmask', side_effect=lambda orgconfig, name: name),
+            mock.patch.object(QueryUtils, 'show_progress', False),
+            mock.patch('builtins.print')
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def ids(count):
+        return ["01t" + str(index).zfill(15) for index in range(count)]
+
+    def test_small_id_sets_use_rest(self):
+        QueryUtils.query_by_field(self.objconfig, self.orgconfig, 'id', self.ids(1000), lambda *args: None)
+        self.assertEqual(2, len(self.connector.rest_queries))
+        self.assertEqual([], self.connector.bulk_queries)
+
+    def test_large_id_sets_use_bulk(self):
+        """Id sets at the threshold go to bulk 2.0 in chunks bound by the soql limit only"""
+        ids = self.ids(25000)
+        QueryUtils.query_by_field(self.objconfig, self.orgconfig, 'id', ids, lambda *args: None)
+        self.assertEqual([], self.connector.rest_queries)
+        self.assertEqual(len(ChunkPlanner.plan("SELECT Id FROM product2 where id in ({})", ids, url_limit=0)), len(self.connector.bulk_queries))
+        self.assertLess(len(self.connector.bulk_queries), len(ChunkPlanner.plan("SELECT Id FROM product2 where id in ({})", ids)))
+        self.assertEqual(len(ids), sum(dataquery.count("'") // 2 for dataquery in self.connector.bulk_queries))
+
+
+class Org:
+    """Answers the in list queries of matching key lookups from a list of records"""
+
+    def __init__(self, records):
+        self.records = records
+        self.queries = []
+
+    def query(self, dataquery):
+        self.queries.append(dataquery)
+        field, values = re.search(r" where (\w+) in \((.*)\)$", dataquery).groups()
+        values = set(re.findall(r"'((?:[^'\\]|\\.)*)'", values))
+        records = [record for record in self.records if record.get(field) in values]
+        return {'totalSize': len(records), 'done': True, 'records': records}
+
+
+class TestQueryByMatchingKeys(unittest.TestCase):
+    """Tests for the matching key lookups deciding new and existing records"""
+
+    def setUp(self):
+        self.objconfig = mock.Mock(objectname='pricelistentry')
+        self.objconfig.getmatchingfieldsstring.return_value = 'Id,productcode,pricelistid'
+        patchers = [
+            mock.patch('src.cme_data_migration_tool.utils.query_utils.nsf.unmask', side_effect=lambda orgconfig, name: name),
+            mock.patch('src.cme_data_migration_tool.utils.query_utils.nsf.mask', side_effect=lambda orgconfig, name: name),
+            mock.patch.object(QueryUtils, 'show_progress', False),
+            mock.patch('builtins.print')
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def lookup(self, matchingkeyfields, orgrecords, matchingkeyrecords):
+        self.org = Org(orgrecords)
+        orgconfig = mock.Mock(org_connector=self.org, max_concurrency=4, username='user@example.com')
+        matchingkeysdto = mock.Mock(matching_keys={'pricelistentry': matchingkeyfields})
+        with mock.patch.object(MatchingKeysDTO, 'getinstance', return_value=matchingkeysdto):
+            return QueryUtils.query_by_matching_keys(self.objconfig, orgconfig, matchingkeyrecords,
+                                                     lambda objectname, record, orgconfig, referencefield: {'fieldresult': {'id': record['Id']}})
+
+    def test_single_field_keys(self):
+        orgrecords = [{'Id': '01u1', 'productcode': 'A'}, {'Id': '01u2', 'productcode': 'B'}, {'Id': '01u3', 'productcode': 'C'}]
+        results = self.lookup(['productcode'], orgrecords, [{'productcode': 'A'}, {'productcode': 'B'}, {'productcode': 'A'}])
+        self.assertEqual({'01u1', '01u2'}, set(results))
+        self.assertEqual(["SELECT Id,productcode,pricelistid FROM pricelistentry where productcode in ('A','B')"], self.org.queries)
+
+    def test_composite_keys(self):
+        """Composite keys are prefiltered on the field with the most distinct values, records whose key
+        was not requested are dropped"""
+        orgrecords = [
+            {'Id': '01u1', 'productcode': 'A', 'pricelistid': 'P1'},
+            {'Id': '01u2', 'productcode': 'B', 'pricelistid': 'P1'},
+            {'Id': '01u3', 'productcode': 'A', 'pricelistid': 'P2'},
+            {'Id': '01u4', 'productcode': 'C', 'pricelistid': 'P2'}
+        ]
+        matchingkeyrecords = [
+            {'productcode': 'A', 'pricelistid': 'P1'},
+            {'productcode': 'B', 'pricelistid': 'P1'},
+            {'productcode': 'C', 'pricelistid': 'P2'}
+        ]
+        results = self.lookup(['pricelistid', 'productcode'], orgrecords, matchingkeyrecords)
+        self.assertEqual(1, len(self.org.queries))
+        self.assertIn(" where productcode in ('A','B','C')", self.org.queries[0])
+        # 01u3 matches the productcode prefilter but A-P2 was not requested
+        self.assertEqual({'01u1', '01u2', '01u4'}, set(results))
+
+    def test_results_of_every_chunk(self):
+        """Chunks are looked up concurrently and the records of every chunk are returned"""
+        orgrecords = [{'Id': '01u' + str(index), 'productcode': 'CODE-' + str(index).zfill(4)} for index in range(300)]
+        with mock.patch.object(ChunkPlanner, 'URL_LENGTH_LIMIT', ChunkPlanner.URL_HEADROOM + 1000):
+            results = self.lookup(['productcode'], orgrecords, [{'productcode': record['productcode']} for record in orgrecords])
+        self.assertGreater(len(self.org.queries), 3)
+        self.assertEqual({record['Id'] for record in orgrecords}, set(results))
+
+    def test_no_keys(self):
+        self.assertEqual({}, self.lookup(['productcode'], [], []))
+        self.assertEqual([], self.org.queries)
+
+    def test_most_selective_field(self):
+        matchingkeyrecords = [{'productcode': code, 'pricelistid': 'P1'} for code in ['A', 'B', 'C']]
+        self.assertEqual('productcode', QueryUtils.get_most_selective_field(['pricelistid', 'productcode'], matchingkeyrecords))
+        self.assertEqual('pricelistid', QueryUtils.get_most_selective_field(['pricelistid'], matchingkeyrecords))
+
+    def test_exact_matching_key_processor(self):
+        processor = QueryUtils.exact_matching_key_processor(['pricelistid', 'productcode'], {('P1', 'A')}, lambda objectname, record, orgconfig, referencefield: record['Id'])
+        self.assertEqual('01u1', processor('pricelistentry', {'Id': '01u1', 'pricelistid': 'P1', 'productcode': 'A'}, None, False))
+        self.assertIsNone(processor('pricelistentry', {'Id': '01u2', 'pricelistid': 'P2', 'productcode': 'A'}, None, False))
+
+
+class TestGetOrgTime(unittest.TestCase):
+    """Tests for QueryUtils.get_org_time"""
+
+    def test_org_clock(self):
+        connector = mock.Mock(base_url='https://na15.salesforce.com/services/data/v59.0/')
+        connector._call_salesforce.return_value.headers = {'Date': 'Fri, 01 Mar 2024 12:00:05 GMT'}
+        orgtime = QueryUtils.get_org_time(mock.Mock(org_connector=connector))
+        self.assertEqual(datetime(2024, 3, 1, 12, 0, 5, tzinfo=timezone.utc), orgtime)
+        connector._call_salesforce.assert_called_once_with('GET', 'https://na15.salesforce.com/services/data/v59.0/limits/')
+
+
+class TestCsvToRecords(unittest.TestCase):
+    """Tests for the conversion of bulk 2.0 csv pages to rest shaped records"""
+
+    def setUp(self):
+        self.fieldconverters = ({
+            'isactive': QueryUtils.get_csv_value_converter('boolean'),
+            'quantity': QueryUtils.get_csv_value_converter('int'),
+            'price__c': QueryUtils.get_csv_value_converter('double'),
+            'systemmodstamp': QueryUtils.get_csv_value_converter('datetime'),
+            'catalog__r.isactive': QueryUtils.get_csv_value_converter('boolean'),
+        }, {'catalog__r': 'Catalog__c', 'owner': 'User'})
+
+    def test_value_converters(self):
+        self.assertEqual([True, False, None], [QueryUtils.get_csv_value_converter('boolean')(value) for value in ('true', 'false', '')])
+        self.assertEqual([12, None], [QueryUtils.get_csv_value_converter('long')(value) for value in ('12', '')])
+        self.assertEqual([1.5, 2.0], [QueryUtils.get_csv_value_converter(field_type)(value) for field_type, value in (('currency', '1.5'), ('percent', '2'))])
+        converter = QueryUtils.get_csv_value_converter('datetime')
+        self.assertEqual('2024-05-01T10:00:00.000+0000', converter('2024-05-01T10:00:00.000Z'))
+        self.assertEqual('2024-05-01T10:00:00.000+0000', converter('2024-05-01T10:00:00.000+0000'))
+        self.assertEqual(['text', None], [QueryUtils.get_csv_value_converter('string')(value) for value in ('text', '')])
+
+    def test_typed_columns(self):
+        csv_page = 'Id,IsActive,Quantity,Price__c,SystemModstamp,Name\n' \
+                   '01t1,true,3,9.5,2024-05-01T10:00:00.000Z,"A, b"\n' \
+                   '01t2,false,,,,\n'
+        records = list(QueryUtils.csv_to_records(csv_page, self.fieldconverters))
+        self.assertEqual([
+            {'attributes': {}, 'Id': '01t1', 'IsActive': True, 'Quantity': 3, 'Price__c': 9.5, 'SystemModstamp': '2024-05-01T10:00:00.000+0000', 'Name': 'A, b'},
+            {'attributes': {}, 'Id': '01t2', 'IsActive': False, 'Quantity': None, 'Price__c': None, 'SystemModstamp': None, 'Name': None},
+        ], records)
+        self.assertEqual(['attributes', 'Id', 'IsActive', 'Quantity', 'Price__c', 'SystemModstamp', 'Name'], list(records[0]))
+
+    def test_relationship_columns(self):
+        """Parent__r.Field columns become a nested record with its type, a relationship without values is null"""
+        csv_page = 'Id,Catalog__r.Code__c,Catalog__r.IsActive,Owner.Name,Other__r.Name\n' \
+                   '01t1,C1,true,Admin,X\n' \
+                   '01t2,,,,\n'
+        records = list(QueryUtils.csv_to_records(csv_page, self.fieldconverters))
+        catalog = records[0]['Catalog__r']
+        self.assertIsInstance(catalog, OrderedDict)
+        self.assertEqual(OrderedDict([('attributes', OrderedDict([('type', 'Catalog__c')])), ('Code__c', 'C1'), ('IsActive', True)]), catalog)
+        self.assertEqual({'attributes': {'type': 'User'}, 'Name': 'Admin'}, records[0]['Owner'])
+        # without a known type the relationship name is used
+        self.assertEqual({'attributes': {'type': 'Other__r'}, 'Name': 'X'}, records[0]['Other__r'])
+        self.assertEqual({'attributes': {}, 'Id': '01t2', 'Catalog__r': None, 'Owner': None, 'Other__r': None}, records[1])
+
+    def test_empty_page(self):
+        self.assertEqual([], list(QueryUtils.csv_to_records('', self.fieldconverters)))
+        self.assertEqual([], list(QueryUtils.csv_to_records('Id,Name\n', self.fieldconverters)))
+
+
+if __name__ == '__main__':
+    unittest.main()
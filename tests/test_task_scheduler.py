@@ -0,0 +1,91 @@
+"""Tests for task_scheduler.py"""
+import threading
+import time
+import unittest
+
+from src.cme_data_migration_tool.utils.task_scheduler import TaskScheduler
+
+
+class TestTaskScheduler(unittest.TestCase):
+    """Tests for TaskScheduler"""
+
+    def test_dependencies_run_first(self):
+        """A task starts only after every task it depends on finished"""
+        order = []
+        lock = threading.Lock()
+
+        def task(name, seconds=0):
+            def run():
+                time.sleep(seconds)
+                with lock:
+                    order.append(name)
+            return run
+
+        scheduler = TaskScheduler(4)
+        scheduler.add_task("a", task("a", 0.05))
+        scheduler.add_task("b", task("b"))
+        scheduler.add_task("c", task("c"), ["a", "b"])
+        scheduler.add_task("d", task("d"), ["c"])
+        completed = scheduler.run()
+
+        self.assertEqual({"a", "b", "c", "d"}, completed)
+        self.assertLess(order.index("a"), order.index("c"))
+        self.assertLess(order.index("b"), order.index("c"))
+        self.assertEqual("d", order[-1])
+
+    def test_independent_tasks_run_concurrently(self):
+        """Independent tasks share the worker pool"""
+        barrier = threading.Barrier(3, timeout=5)
+        scheduler = TaskScheduler(3)
+        for name in ["a", "b", "c"]:
+            scheduler.add_task(name, barrier.wait)
+        self.assertEqual({"a", "b", "c"}, scheduler.run())
+
+    def test_max_workers_is_at_least_one(self):
+        """A worker count below one still runs the tasks"""
+        scheduler = TaskScheduler(0)
+        scheduler.add_task("a", lambda: None)
+        self.assertEqual(1, scheduler.max_workers)
+        self.assertEqual({"a"}, scheduler.run())
+
+    def test_unknown_dependency(self):
+        """Dependencies have to be registered before the tasks using them"""
+        scheduler = TaskScheduler(2)
+        with self.assertRaises(ValueError):
+            scheduler.add_task("a", lambda: None, ["b"])
+
+    def test_duplicate_task(self):
+        """A task name can only be scheduled once"""
+        scheduler = TaskScheduler(2)
+        scheduler.add_task("a", lambda: None)
+        with self.assertRaises(ValueError):
+            scheduler.add_task("a", lambda: None)
+
+    def test_failure_skips_dependents(self):
+        """Tasks depending on a failed task never run, the failure is
+        raised once the running tasks finished"""
+        ran = []
+        release = threading.Event()
+
+        def fail():
+            raise RuntimeError("boom")
+
+        def slow():
+            release.wait(5)
+            ran.append("slow")
+
+        scheduler = TaskScheduler(2)
+        scheduler.add_task("fail", fail)
+        scheduler.add_task("slow", slow)
+        scheduler.add_task("dependent", lambda: ran.append("dependent"), ["fail"])
+        scheduler.add_task("after_slow", lambda: ran.append("after_slow"), ["slow"])
+        threading.Timer(0.1, release.set).start()
+
+        with self.assertRaisesRegex(RuntimeError, "boom"):
+            scheduler.run()
+        # the running task finishes, nothing new is submitted after a failure
+        self.assertEqual(["slow"], ran)
+
+
+if __name__ == '__main__':
+    unittest.main()